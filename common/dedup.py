@@ -0,0 +1,56 @@
+"""
+Індекс ідентифікаторів подій для ідемпотентного прийому подарунків
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class DedupIndex:
+    """Обмежений за розміром і часом індекс вже прийнятих подій (найстаріші витісняються першими)
+
+    Перевірка та додавання - O(1); пам'ять обмежена capacity записами, а записи,
+    старші за window секунд, видаляються з голови черги під час перевірок.
+    """
+
+    def __init__(self, capacity: int = 4096, window: float = 300.0):
+        self.capacity = capacity
+        self.window = window
+        self._seen: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'checked': 0, 'duplicates': 0, 'evicted': 0}
+
+    def seen(self, event_id: Optional[str]) -> bool:
+        """Чи вже приймалася подія; нова подія запам'ятовується"""
+        if not event_id:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            self.stats['checked'] += 1
+            self._expire(now)
+
+            if event_id in self._seen:
+                self.stats['duplicates'] += 1
+                return True
+
+            self._seen[event_id] = now
+            if len(self._seen) > self.capacity:
+                self._seen.popitem(last=False)
+                self.stats['evicted'] += 1
+            return False
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу індексу"""
+        with self._lock:
+            return {'size': len(self._seen), 'capacity': self.capacity, 'window': self.window, **self.stats}
+
+    def _expire(self, now: float):
+        # Записи впорядковані за часом додавання, тож застарілі завжди на початку
+        while self._seen:
+            event_id, added = next(iter(self._seen.items()))
+            if now - added < self.window:
+                break
+            del self._seen[event_id]
@@ -0,0 +1,130 @@
+"""
+Налаштування логування сервера та контролера Pi: черга з фоновим записом, ротація файлу, JSON формат та вибірка частих повідомлень
+"""
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Iterable, Optional
+
+try:
+    from pythonjsonlogger import jsonlogger
+    JSON_LOGGER_AVAILABLE = True
+except ImportError:
+    JSON_LOGGER_AVAILABLE = False
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+JSON_FIELDS = '%(asctime)s %(name)s %(levelname)s %(threadName)s %(message)s'
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматування в потоці виклику
+
+    Стандартний QueueHandler форматує повідомлення ще до постановки в чергу;
+    тут запис передається як є, а форматує та пише його потік QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Не більше max_per_second записів на секунду; кількість пропущених додається до наступного"""
+
+    def __init__(self, max_per_second: int = 5):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self._second = 0
+        self._count = 0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        second = int(time.monotonic())
+        with self._lock:
+            if second != self._second:
+                if self._suppressed:
+                    record.suppressed = self._suppressed
+                self._second, self._count, self._suppressed = second, 0, 0
+
+            self._count += 1
+            if self._count > self.max_per_second:
+                self._suppressed += 1
+                return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON рядок на запис (якщо python-json-logger не встановлено)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'asctime': self.formatTime(record),
+            'name': record.name,
+            'levelname': record.levelname,
+            'threadName': record.threadName,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'suppressed', None):
+            data['suppressed'] = record.suppressed
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def create_formatter(log_format: str) -> logging.Formatter:
+    """Форматер для 'json' або 'text'"""
+    if log_format != 'json':
+        return logging.Formatter(TEXT_FORMAT)
+    if JSON_LOGGER_AVAILABLE:
+        return jsonlogger.JsonFormatter(JSON_FIELDS, json_ensure_ascii=False)
+    return JsonFormatter()
+
+
+def setup_logging(level: str = 'INFO', log_file: Optional[str] = None, max_bytes: int = 10485760,
+                  backup_count: int = 5, log_format: str = 'json', sampled_loggers: Iterable[str] = (),
+                  sample_rate: int = 5) -> QueueListener:
+    """Логування через чергу: виклик logger.* лише ставить запис у чергу, решта - у фоновому потоці
+
+    Консоль отримує текстовий формат, файл - log_format з ротацією за розміром.
+    sampled_loggers - логери частих повідомлень (наприклад, кожна команда Arduino),
+    для яких діє обмеження sample_rate записів на секунду.
+    """
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers = [console]
+
+    if log_file:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding='utf-8')
+        file_handler.setFormatter(create_formatter(log_format))
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def flush_on_exit():
+        # Записи, що лишилися в черзі, дописуються перед виходом (якщо listener ще не зупинено)
+        if listener._thread is not None:
+            listener.stop()
+
+    atexit.register(flush_on_exit)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    for name in sampled_loggers:
+        logging.getLogger(name).addFilter(SamplingFilter(sample_rate))
+
+    return listener
@@ -0,0 +1,293 @@
+"""
+Профілювання працюючого сервера чи контролера Pi: вибірковий профайлер потоків, стеки, задачі asyncio, GC та пам'ять
+"""
+
+import gc
+import os
+import sys
+import hmac
+import time
+import asyncio
+import logging
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Межі, що роблять профілювання безпечним під час ефіру
+MIN_INTERVAL = 0.005
+MAX_DURATION = 60.0
+MAX_DEPTH = 64
+# Функції очікування у верхньому кадрі стеку: такий потік простоює
+# (блокуючі виклики C, як SimpleQueue.get у потоці логування, видно лише за кадром, що їх викликає)
+IDLE_MARKERS = (':wait:', ':sleep:', ':select:', ':poll:', ':accept:', ':_wait_for_tstate_lock:', ':dequeue:')
+
+
+def is_authorized(headers: Mapping[str, str], admin_token: Optional[str]) -> bool:
+    """Перевірка адмін-токена з заголовка X-Admin-Token або Authorization: Bearer <токен>"""
+    if not admin_token:
+        return False
+    provided = headers.get('X-Admin-Token')
+    if not provided:
+        authorization = headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            provided = authorization[len('Bearer '):]
+    return bool(provided) and hmac.compare_digest(provided.encode(), admin_token.encode())
+
+
+def frame_label(frame) -> str:
+    """Кадр стеку як 'модуль:функція:рядок' (формат рядків flame graph)"""
+    code = frame.f_code
+    module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+class GcMonitor:
+    """Паузи збирача сміття за поколіннями (через gc.callbacks)"""
+
+    def __init__(self):
+        self.pauses = {generation: {'collections': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'collected': 0}
+                       for generation in range(3)}
+        self._started: Optional[float] = None
+
+    def install(self):
+        if self._callback not in gc.callbacks:
+            gc.callbacks.append(self._callback)
+
+    def uninstall(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+    def get_status(self) -> Dict[int, Dict[str, Any]]:
+        return {generation: {key: round(value, 3) if isinstance(value, float) else value
+                             for key, value in stats.items()}
+                for generation, stats in self.pauses.items()}
+
+    def _callback(self, phase: str, info: Dict[str, int]):
+        if phase == 'start':
+            self._started = time.perf_counter()
+            return
+        if self._started is None:
+            return
+        pause = (time.perf_counter() - self._started) * 1000
+        self._started = None
+        stats = self.pauses[info['generation']]
+        stats['collections'] += 1
+        stats['total_ms'] += pause
+        stats['max_ms'] = max(stats['max_ms'], pause)
+        stats['collected'] += info.get('collected', 0)
+
+
+class SamplingProfiler:
+    """Вибірковий профайлер усіх потоків процесу
+
+    Окремий потік кожні interval секунд знімає стеки всіх потоків (sys._current_frames)
+    і рахує однакові стеки. Профіль обмежений у часі, одночасно працює лише один;
+    власні витрати (частка часу на зняття стеків) повертаються разом з результатом.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.stacks: Counter = Counter()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = 10.0, interval: float = 0.01,
+              idle: bool = False) -> Dict[str, Any]:
+        """Запуск профілю у фоні; ValueError - профіль уже триває
+
+        idle=False пропускає стеки потоків, що чекають (sleep, select, Condition.wait).
+        """
+        duration = min(max(float(duration), 0.1), MAX_DURATION)
+        interval = max(float(interval), MIN_INTERVAL)
+        with self._lock:
+            if self.running:
+                raise ValueError("Профілювання вже триває")
+            self._stop.clear()
+            self.stacks = Counter()
+            self.result = {'status': 'running', 'started_at': time.time(), 'duration': duration,
+                           'interval': interval, 'idle': idle}
+            self._thread = threading.Thread(target=self._run, args=(duration, interval, idle),
+                                            name='sampling-profiler', daemon=True)
+            self._thread.start()
+        logger.info("Профілювання запущено на %.1f с (інтервал %.0f мс)", duration, interval * 1000)
+        return dict(self.result)
+
+    def stop(self):
+        """Дострокове завершення профілю (результат зберігається)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(1.0)
+
+    def folded(self) -> str:
+        """Стеки у форматі folded ('потік;кадр;кадр кількість') для flamegraph.pl, speedscope, inferno"""
+        # Копія: профіль може ще тривати у фоновому потоці
+        return '\n'.join(f"{stack} {count}" for stack, count in Counter(dict(self.stacks)).most_common())
+
+    def report(self, limit: int = 30) -> Dict[str, Any]:
+        """Результат профілю з найгарячішими функціями (власний та загальний час у вибірках)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in dict(self.stacks).items():
+            frames = stack.split(';')[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples = (self.result or {}).get('samples', 0) or 1
+        return {
+            **(self.result or {'status': 'idle'}),
+            'top_own': [{'frame': frame, 'samples': count, 'percent': round(count * 100 / samples, 1)}
+                        for frame, count in own.most_common(limit)],
+            'top_total': [{'frame': frame, 'samples': count, 'percent': round(count * 100 / samples, 1)}
+                          for frame, count in total.most_common(limit)],
+            'stacks': len(self.stacks)
+        }
+
+    def _run(self, duration: float, interval: float, idle: bool):
+        me = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + duration
+        samples = 0
+        sampling = 0.0
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            sample_started = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                if not idle and stack and self._is_idle(stack[0]):
+                    continue
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            samples += 1
+            sampling += time.perf_counter() - sample_started
+            self._stop.wait(interval)
+
+        elapsed = time.perf_counter() - started
+        self.result.update({
+            'status': 'finished',
+            'elapsed': round(elapsed, 3),
+            'samples': samples,
+            # Частка часу, яку профайлер сам займав (під GIL)
+            'overhead_percent': round(sampling * 100 / elapsed, 2) if elapsed else 0.0
+        })
+        logger.info("Профілювання завершено: %d вибірок, накладні витрати %.2f%%",
+                    samples, self.result['overhead_percent'])
+
+    @staticmethod
+    def _is_idle(label: str) -> bool:
+        """Верхній кадр потоку, що чекає (а не працює)"""
+        return any(marker in label for marker in IDLE_MARKERS)
+
+
+def dump_threads() -> List[Dict[str, Any]]:
+    """Поточні стеки всіх потоків"""
+    frames = sys._current_frames()
+    result = []
+    for thread in threading.enumerate():
+        frame = frames.get(thread.ident)
+        result.append({
+            'name': thread.name,
+            'ident': thread.ident,
+            'daemon': thread.daemon,
+            'stack': traceback.format_stack(frame, limit=MAX_DEPTH) if frame else []
+        })
+    return result
+
+
+def describe_tasks(loop: Optional[asyncio.AbstractEventLoop], timeout: float = 2.0,
+                   stack_limit: int = 10) -> List[Dict[str, Any]]:
+    """Стан задач asyncio циклу, що працює в іншому потоці (знімок робиться всередині циклу)"""
+    if loop is None or loop.is_closed() or not loop.is_running():
+        return []
+
+    async def snapshot():
+        tasks = []
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks():
+            if task is current:
+                continue
+            frames = task.get_stack(limit=stack_limit)
+            tasks.append({
+                'name': task.get_name() if hasattr(task, 'get_name') else None,
+                'coro': getattr(task.get_coro(), '__qualname__', repr(task.get_coro())),
+                'done': task.done(),
+                'cancelled': task.cancelled(),
+                'stack': [frame_label(frame) for frame in frames]
+            })
+        return tasks
+
+    try:
+        return asyncio.run_coroutine_threadsafe(snapshot(), loop).result(timeout)
+    except Exception as e:
+        logger.warning(f"Не вдалося отримати задачі asyncio: {e}")
+        return [{'error': str(e)}]
+
+
+def memory_stats(gc_monitor: Optional[GcMonitor] = None, tracemalloc_top: int = 20) -> Dict[str, Any]:
+    """Статистика GC та пам'яті процесу
+
+    Без повного обходу об'єктів: безпечно викликати під навантаженням.
+    """
+    stats: Dict[str, Any] = {
+        'gc': {
+            'enabled': gc.isenabled(),
+            'counts': gc.get_count(),
+            'thresholds': gc.get_threshold(),
+            'generations': gc.get_stats(),
+            'garbage': len(gc.garbage),
+            'pauses': gc_monitor.get_status() if gc_monitor else None
+        },
+        'threads': threading.active_count(),
+        'tracemalloc': tracemalloc.is_tracing()
+    }
+
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss: кілобайти в Linux, байти в macOS
+        stats['max_rss_mb'] = round(usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+        stats['cpu_user_s'] = round(usage.ru_utime, 2)
+        stats['cpu_system_s'] = round(usage.ru_stime, 2)
+    except ImportError:
+        pass
+
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        stats['rss_mb'] = round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics('lineno')[:tracemalloc_top]
+        stats['tracemalloc'] = {
+            'current_mb': round(current / (1024 * 1024), 2),
+            'peak_mb': round(peak / (1024 * 1024), 2),
+            'top': [{'where': str(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                    for stat in top]
+        }
+    return stats
+
+
+def set_tracemalloc(enabled: bool, frames: int = 1) -> bool:
+    """Увімкнення/вимкнення tracemalloc (уповільнює виділення пам'яті, лише на час діагностики)"""
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return tracemalloc.is_tracing()
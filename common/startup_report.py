@@ -0,0 +1,118 @@
+"""
+Звіт про час старту сервера та контролера Pi: імпорт модулів та фази ініціалізації
+
+Облік імпортів підміняє builtins.__import__ лише на час імпортів верхнього рівня при старті
+і вимикається змінною середовища STARTUP_TRACK_IMPORTS=False. Повне дерево імпортів дає
+python -X importtime.
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import builtins
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Як часто перевіряти, чи порт API вже приймає з'єднання, с
+LISTEN_POLL_INTERVAL = 0.05
+
+
+def import_tracking_enabled() -> bool:
+    """Облік імпортів увімкнено за замовчуванням: він триває лише до stop_tracking() при старті"""
+    return os.getenv('STARTUP_TRACK_IMPORTS', 'True').lower() == 'true'
+
+
+def wait_listening(host: str, port: int, sleep: Callable[[float], Any] = time.sleep, timeout: float = 30.0) -> bool:
+    """Очікування, поки порт почне приймати TCP з'єднання"""
+    if host in ('', '0.0.0.0'):
+        host = '127.0.0.1'
+    elif host == '::':
+        host = '::1'
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=LISTEN_POLL_INTERVAL):
+                return True
+        except OSError:
+            sleep(LISTEN_POLL_INTERVAL)
+    return False
+
+
+class StartupReport:
+    """Час від завантаження модуля до готовності API з розбивкою на імпорти та фази"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+        self._original_import = None
+        self._depth = threading.local()
+
+    def track_imports(self):
+        """Початок обліку часу нових імпортів верхнього рівня (якщо не вимкнено STARTUP_TRACK_IMPORTS=False)"""
+        if self._original_import is None and import_tracking_enabled():
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def stop_tracking(self):
+        """Відновлення стандартного імпорту"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Вимірювання однієї фази старту"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def elapsed_ms(self) -> float:
+        """Час від створення звіту, мс"""
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def mark_ready(self):
+        """Порт API відкритий і приймає з'єднання"""
+        if self.ready_ms is None:
+            self.ready_ms = self.elapsed_ms()
+            slowest = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:3]
+            summary = ', '.join(f"{name} {ms} мс" for name, ms in slowest)
+            logger.info(f"API готове за {self.ready_ms} мс (найдовші імпорти: {summary or '-'})")
+
+    def mark_ready_when_listening(self, host: str, port: int, sleep: Callable[[float], Any] = time.sleep):
+        """Позначка готовності, щойно сервер відкриє порт (викликається у фоновому потоці)"""
+        if wait_listening(host, port, sleep):
+            self.mark_ready()
+        else:
+            logger.warning(f"Порт {host}:{port} не відкрився, час готовності API не записано")
+
+    def get_report(self, top: int = 10) -> Dict[str, Any]:
+        """Звіт для /api/status"""
+        imports = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)
+        return {
+            'ready_ms': self.ready_ms,
+            'imports_ms': round(sum(self.imports.values()), 1),
+            'imports': dict(imports[:top]),
+            'phases': dict(self.phases)
+        }
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Вкладені, відносні та вже завантажені імпорти не вимірюються окремо
+        if level or name in sys.modules or getattr(self._depth, 'value', 0):
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._depth.value = 1
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth.value = 0
+            self.imports[name] = round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,220 @@
+"""
+Трасування подарунків: ідентифікатор з моменту прийому та відрізки часу кожного етапу до ефекту
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+# Відрізки зберігаються в наносекундах реального часу, щоб зводити мітки різних процесів і пристроїв
+WALL_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+# Відрізок: (назва, джерело, початок нс, кінець нс, атрибути)
+Span = Tuple[str, str, int, int, Dict[str, Any]]
+
+
+def new_trace_id() -> str:
+    """Короткий випадковий ідентифікатор трасування (16 hex символів)"""
+    return os.urandom(8).hex()
+
+
+def now_ns() -> int:
+    """Поточний реальний час у наносекундах за монотонним годинником"""
+    return time.monotonic_ns() + WALL_OFFSET_NS
+
+
+class Trace:
+    """Усі відрізки одного подарунка"""
+
+    __slots__ = ('trace_id', 'gift', 'started_ns', 'spans', 'sent')
+
+    def __init__(self, trace_id: str, gift: Optional[Dict[str, Any]] = None, started_ns: Optional[int] = None):
+        self.trace_id = trace_id
+        self.gift = gift or {}
+        self.started_ns = now_ns() if started_ns is None else started_ns
+        self.spans: List[Span] = []
+        # Скільки відрізків уже передано далі (take)
+        self.sent = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словник для API: час відрізків у мілісекундах від прийому подарунка"""
+        spans = sorted(self.spans, key=lambda span: span[2])
+        end_ns = max((span[3] for span in spans), default=self.started_ns)
+        return {
+            'trace_id': self.trace_id,
+            'gift': self.gift,
+            'started_at': datetime.fromtimestamp(self.started_ns / 1e9).isoformat(),
+            'duration_ms': round((end_ns - self.started_ns) / 1e6, 3),
+            'spans': [{
+                'name': name,
+                'source': source,
+                'start_ms': round((start - self.started_ns) / 1e6, 3),
+                'duration_ms': round((end - start) / 1e6, 3),
+                **({'attrs': attrs} if attrs else {})
+            } for name, source, start, end, attrs in spans]
+        }
+
+
+class TraceStore:
+    """Останні capacity трасувань у пам'яті (найстаріші витісняються)
+
+    Запис відрізка - O(1) під блокуванням; без trace_id (трасування вимкнене) нічого не робиться.
+    """
+
+    def __init__(self, capacity: int = 1000, source: str = 'server', enabled: bool = True,
+                 max_spans: int = 64, on_publish: Optional[Callable[[str, List[list]], None]] = None):
+        self.capacity = capacity
+        self.source = source
+        self.enabled = enabled
+        self.max_spans = max_spans
+        # Передача відрізків далі (наприклад, з Pi на сервер): on_publish(trace_id, spans)
+        self.on_publish = on_publish
+        self._traces: 'OrderedDict[str, Trace]' = OrderedDict()
+        self._by_event: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.stats = {'traces': 0, 'spans': 0, 'evicted': 0, 'dropped_spans': 0}
+
+    def begin(self, gift: Optional[Dict[str, Any]] = None, trace_id: Optional[str] = None,
+              started_ns: Optional[int] = None) -> Optional[str]:
+        """Нове трасування подарунка; повертає trace_id (None, якщо трасування вимкнене)"""
+        if not self.enabled:
+            return None
+        trace_id = trace_id or new_trace_id()
+        with self._lock:
+            self._open(trace_id, gift, started_ns)
+        return trace_id
+
+    def record(self, trace_id: Optional[str], name: str, start_ns: int, end_ns: Optional[int] = None,
+               **attrs):
+        """Відрізок етапу (час у нс реального часу, див. now_ns)"""
+        if not trace_id or not self.enabled:
+            return
+        end_ns = now_ns() if end_ns is None else end_ns
+        with self._lock:
+            self._add(self._open(trace_id), (name, self.source, start_ns, end_ns, attrs))
+
+    @contextmanager
+    def span(self, trace_id: Optional[str], name: str, **attrs) -> Iterator[Dict[str, Any]]:
+        """Відрізок навколо блоку коду; атрибути можна доповнити всередині блоку"""
+        start_ns = now_ns()
+        try:
+            yield attrs
+        finally:
+            self.record(trace_id, name, start_ns, **attrs)
+
+    def merge(self, trace_id: Optional[str], spans: List[list], offset: Optional[float] = None,
+              source: Optional[str] = None):
+        """Відрізки з іншого процесу чи пристрою: [назва, початок нс, кінець нс, атрибути]
+
+        offset - зсув годинника джерела відносно цього (секунди, як у ClockSync).
+        """
+        if not trace_id or not self.enabled or not spans:
+            return
+        shift = int((offset or 0.0) * 1e9)
+        with self._lock:
+            trace = self._open(trace_id)
+            for name, start, end, *rest in spans:
+                self._add(trace, (name, source or 'remote', int(start) - shift, int(end) - shift,
+                                  rest[0] if rest else {}))
+
+    def take(self, trace_id: Optional[str]) -> List[list]:
+        """Ще не передані відрізки трасування у форматі для merge"""
+        with self._lock:
+            trace = self._traces.get(trace_id) if trace_id else None
+            if trace is None:
+                return []
+            spans = trace.spans[trace.sent:]
+            trace.sent = len(trace.spans)
+        return [[name, start, end, attrs] for name, _, start, end, attrs in spans]
+
+    def publish(self, trace_id: Optional[str]):
+        """Передача нових відрізків через on_publish"""
+        if self.on_publish is None:
+            return
+        spans = self.take(trace_id)
+        if spans:
+            self.on_publish(trace_id, spans)
+
+    def __contains__(self, trace_id: str) -> bool:
+        return trace_id in self._traces
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            return trace.to_dict() if trace else None
+
+    def find(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """Трасування за event_id подарунка"""
+        trace_id = self._by_event.get(event_id)
+        return self.get(trace_id) if trace_id else None
+
+    def recent(self, limit: int = 50, gift_type: Optional[str] = None,
+               sender: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Останні трасування, новіші першими"""
+        result = []
+        with self._lock:
+            for trace in reversed(self._traces.values()):
+                if gift_type and trace.gift.get('type') != gift_type:
+                    continue
+                if sender and trace.gift.get('sender') != sender:
+                    continue
+                result.append(trace.to_dict())
+                if len(result) >= limit:
+                    break
+        return result
+
+    def export(self, traces: List[Dict[str, Any]], format: str = 'json') -> Dict[str, Any]:
+        """Експорт: 'json' - як у API, 'chrome' - Trace Event Format (chrome://tracing, Perfetto)"""
+        if format == 'json':
+            return {'traces': traces}
+        if format != 'chrome':
+            raise ValueError(f"Невідомий формат експорту: {format}")
+
+        events = []
+        for trace in traces:
+            origin = datetime.fromisoformat(trace['started_at']).timestamp() * 1e6
+            for span in trace['spans']:
+                events.append({
+                    'name': span['name'],
+                    'cat': trace['gift'].get('type', 'gift'),
+                    'ph': 'X',
+                    'ts': round(origin + span['start_ms'] * 1000, 1),
+                    'dur': round(span['duration_ms'] * 1000, 1),
+                    # Процес - трасування (подарунок), потік - джерело відрізка
+                    'pid': trace['trace_id'],
+                    'tid': span['source'],
+                    'args': span.get('attrs', {})
+                })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу сховища"""
+        return {'enabled': self.enabled, 'capacity': self.capacity, 'stored': len(self._traces), **self.stats}
+
+    def _open(self, trace_id: str, gift: Optional[Dict[str, Any]] = None, started_ns: Optional[int] = None) -> Trace:
+        """Трасування за id (створюється, якщо його ще немає); викликається під блокуванням"""
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            trace = self._traces[trace_id] = Trace(trace_id, gift, started_ns)
+            self.stats['traces'] += 1
+            while len(self._traces) > self.capacity:
+                _, evicted = self._traces.popitem(last=False)
+                if self._by_event.get(evicted.gift.get('event_id')) == evicted.trace_id:
+                    del self._by_event[evicted.gift['event_id']]
+                self.stats['evicted'] += 1
+        elif gift and not trace.gift:
+            trace.gift = gift
+        if gift and gift.get('event_id'):
+            self._by_event[gift['event_id']] = trace_id
+        return trace
+
+    def _add(self, trace: Trace, span: Span):
+        if len(trace.spans) >= self.max_spans:
+            self.stats['dropped_spans'] += 1
+            return
+        trace.spans.append(span)
+        self.stats['spans'] += 1
@@ -5,50 +5,62 @@ Python версія з Arduino інтеграцією
 """
 
 import os
-import sys
+import atexit
+import time
 import asyncio
 import logging
+import math
+import threading
+import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
 from pathlib import Path
 
+from common.startup_report import StartupReport
+
+# Облік часу старту: фази ініціалізації та імпорти нижче (вимикається STARTUP_TRACK_IMPORTS=False)
+startup = StartupReport()
+startup.track_imports()
+
 # Flask та веб-компоненти
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 
-# Робота з Arduino
-import serial
-import serial.tools.list_ports
-
-# HTTP запити та веб-скрапінг
-import requests
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
+# Важкі інтеграції (pyserial, requests) імпортуються при першому використанні
 
 # Конфігурація
 from dotenv import load_dotenv
 
 # Локальні модулі
 from src.arduino_manager import ArduinoManager
+from src.serial_worker import SerialWorkerClient
+from src.shm_ring import STRONG_ORDERING
+from src.udp_transport import UdpTransport
 from src.tiktok_monitor import TikTokMonitor
 from src.device_manager import DeviceManager
-from src.gift_processor import GiftProcessor
 from src.config import Config
+from src.device_channel import DeviceChannel
+from src.clock_sync import ClockSync
+from common.dedup import DedupIndex
+from src.rate_limit import RateLimiter
+from common.logging_config import setup_logging
+from src.gift_event import GiftEvent
+from src.analytics import GiftAnalytics
+from src.gift_history import GiftHistory
+from common.tracing import TraceStore, WALL_OFFSET_NS, now_ns
+from common import profiler
+
+startup.stop_tracking()
 
 # Завантаження змінних середовища
 load_dotenv()
 
 # Налаштування логування
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/app.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Запис у файл та консоль - у фоновому потоці; команди Arduino логуються вибірково
+setup_logging(Config.LOG_LEVEL, Config.LOG_FILE, Config.LOG_MAX_SIZE, Config.LOG_BACKUP_COUNT,
+              Config.LOG_FORMAT, sampled_loggers=('src.arduino_manager.commands',),
+              sample_rate=Config.LOG_SAMPLE_RATE)
 logger = logging.getLogger(__name__)
 
 # Створення Flask додатку
@@ -58,17 +70,115 @@ CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
 # Глобальні менеджери
-config = Config()
-arduino_manager = ArduinoManager()
-tiktok_monitor = TikTokMonitor()
-device_manager = DeviceManager()
-gift_processor = GiftProcessor()
+with startup.phase('managers'):
+    config = Config()
+    clock_sync = ClockSync()
+    # Трасування кожного подарунка від прийому до ефекту на пристрої
+    tracer = TraceStore(capacity=config.TRACE_CAPACITY, enabled=config.TRACE_ENABLED)
+    if config.SERIAL_WORKER and not STRONG_ORDERING:
+        logger.error("SERIAL_WORKER=true підтримується лише на x86/x86-64; послідовні порти працюють у процесі сервера")
+        config.SERIAL_WORKER = False
+    if config.SERIAL_WORKER:
+        # Годинник Arduino синхронізується всередині процесу-обробника
+        arduino_manager = SerialWorkerClient(config.ARDUINO_BAUDRATE, config.ARDUINO_TIMEOUT, tracer=tracer,
+                                             trace_frames=config.TRACE_SERIAL_IDS,
+                                             ring_size=config.SERIAL_RING_SIZE, log_level=config.LOG_LEVEL)
+    else:
+        arduino_manager = ArduinoManager(clock_sync=clock_sync, tracer=tracer, trace_frames=config.TRACE_SERIAL_IDS)
+    # Команди ESP32/ESP8266 по UDP
+    udp_transport = UdpTransport(bind_port=config.UDP_BIND_PORT, retry_interval=config.UDP_RETRY_MS / 1000,
+                                 max_retries=config.UDP_MAX_RETRIES, tracer=tracer)
+    tiktok_monitor = TikTokMonitor(
+        feed_url=config.TIKTOK_FEED_URL,
+        catalog=config.gift_catalog,
+        timeout=config.TIKTOK_TIMEOUT,
+        reconnect_max=config.TIKTOK_RECONNECT_MAX
+    )
+    # Реєстр пристроїв з індексами та лімітом MAX_DEVICES
+    device_manager = DeviceManager(max_devices=config.MAX_DEVICES, device_types=config.DEVICE_TYPES)
+    device_channel = DeviceChannel(socketio, clock_sync=clock_sync, sync_interval=config.DEVICE_HEARTBEAT_INTERVAL,
+                                   on_link=device_manager.set_link_status, tracer=tracer,
+                                   token=config.DEVICE_TOKEN)
+    # Вже прийняті event_id: повтори після перепідключень та повторів клієнтів відкидаються
+    gift_dedup = DedupIndex(capacity=config.GIFT_DEDUP_SIZE, window=config.GIFT_DEDUP_WINDOW)
+    
+    # Обмеження частоти: запити API від клієнта, подарунки відправника, команди пристрою
+    api_limiter = RateLimiter(
+        config.RATE_LIMIT_REQUESTS / config.RATE_LIMIT_WINDOW,
+        config.RATE_LIMIT_REQUESTS,
+        policy=config.RATE_LIMIT_POLICY,
+        max_delay=config.RATE_LIMIT_MAX_DELAY
+    )
+    sender_limiter = RateLimiter(
+        config.SENDER_GIFT_RATE,
+        config.SENDER_GIFT_BURST,
+        policy=config.SENDER_GIFT_POLICY,
+        max_delay=config.RATE_LIMIT_MAX_DELAY
+    )
+    device_limiter = RateLimiter(
+        config.DEVICE_COMMAND_RATE,
+        config.DEVICE_COMMAND_BURST,
+        policy=config.DEVICE_COMMAND_POLICY,
+        max_delay=config.RATE_LIMIT_MAX_DELAY
+    )
+    # Рейтинги відправників і подарунків за вікнами часу
+    gift_analytics = GiftAnalytics(max_keys=config.ANALYTICS_MAX_KEYS)
+    # Стовпцева історія подарунків для запитів після ефірів
+    gift_history = GiftHistory(config.HISTORY_DIR, flush_interval=config.HISTORY_FLUSH_INTERVAL)
+    # Профілювання на вимогу (/api/admin/*) та облік пауз GC
+    sampling_profiler = profiler.SamplingProfiler()
+    gc_monitor = profiler.GcMonitor()
+
+# Спільна HTTP сесія: keep-alive з'єднання до HTTP/Pi пристроїв (створюється при першому запиті)
+http_session = None
+http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Спільна HTTP сесія з пулом з'єднань"""
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            import requests
+            http_session = requests.Session()
+            http_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=config.MAX_DEVICES,
+                                                                        pool_maxsize=4))
+        return http_session
 
 # Глобальні змінні
-connected_devices: Dict[str, dict] = {}
 gift_actions: Dict[str, dict] = {}
 active_streams: Dict[str, dict] = {}
 
+# Події, об'єднані обмежувачами (політика merge); змінюються лише в циклі asyncio монітора
+merged_gifts: Dict[tuple, dict] = {}
+pending_commands: Dict[str, tuple] = {}
+
+@app.before_request
+def limit_api_requests():
+    """Обмеження частоти змінюючих запитів API для кожного клієнта"""
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or not request.path.startswith('/api/'):
+        return None
+    
+    wait = api_limiter.check(request.remote_addr)
+    if wait is None:
+        retry_after = api_limiter.retry_after(request.remote_addr)
+        response = jsonify({'success': False, 'error': 'Забагато запитів', 'retry_after': round(retry_after, 2)})
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response, 429
+    if wait:
+        time.sleep(wait)
+    return None
+
+@app.before_request
+def require_admin_token():
+    """Діагностичні ендпоінти /api/admin/* - лише з ADMIN_TOKEN (X-Admin-Token або Authorization: Bearer)"""
+    if not request.path.startswith('/api/admin/'):
+        return None
+    if not config.ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Діагностику вимкнено: ADMIN_TOKEN не задано'}), 403
+    if not profiler.is_authorized(request.headers, config.ADMIN_TOKEN):
+        return jsonify({'success': False, 'error': 'Потрібен адмін-токен'}), 401
+    return None
+
 @app.route('/')
 def index():
     """Головна сторінка"""
@@ -80,19 +190,46 @@ def get_status():
     return jsonify({
         'status': 'online',
         'timestamp': datetime.now().isoformat(),
-        'connected_devices': len(connected_devices),
+        'connected_devices': len(device_manager),
+        'devices': device_manager.get_status(),
         'active_streams': len(active_streams),
+        'streams': get_streams_status(),
         'arduino_connected': arduino_manager.is_connected(),
+        'device_links': device_channel.get_status(),
+        'clock_sync': clock_sync.get_status(),
+        'dedup': gift_dedup.get_status(),
+        'history': gift_history.get_status(),
+        'tracing': tracer.get_status(),
+        'serial_worker': arduino_manager.get_status() if config.SERIAL_WORKER else None,
+        'udp': udp_transport.get_status(),
+        'rate_limits': {
+            'api': api_limiter.get_status(),
+            'senders': sender_limiter.get_status(),
+            'devices': device_limiter.get_status()
+        },
+        'startup': startup.get_report(),
         'tiktok_monitoring': tiktok_monitor.is_monitoring()
     })
 
 @app.route('/api/devices', methods=['GET'])
 def get_devices():
-    """Отримання списку пристроїв"""
-    return jsonify({
-        'devices': list(connected_devices.values()),
-        'count': len(connected_devices)
-    })
+    """Список пристроїв з фільтрами type, capability, status та сторінками offset/limit
+
+    Відповідь кешується до зміни реєстру; дашборд з If-None-Match отримує 304 без тіла.
+    """
+    args = request.args
+    body, version = device_manager.view(
+        type=args.get('type'),
+        capability=args.get('capability'),
+        status=args.get('status'),
+        offset=max(args.get('offset', 0, type=int), 0),
+        limit=args.get('limit', type=int)
+    )
+    etag = f'devices-{version}'
+    # if_none_match - множина ETag без лапок
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    return Response(body, mimetype='application/json', headers={'ETag': f'"{etag}"'})
 
 @app.route('/api/devices', methods=['POST'])
 def add_device():
@@ -100,10 +237,6 @@ def add_device():
     try:
         data = request.get_json()
         device_id = device_manager.add_device(data)
-        connected_devices[device_id] = data
-        connected_devices[device_id]['id'] = device_id
-        connected_devices[device_id]['status'] = 'connected'
-        connected_devices[device_id]['last_seen'] = datetime.now().isoformat()
         
         logger.info(f"Додано пристрій: {data.get('name', 'Unknown')}")
         return jsonify({'success': True, 'device_id': device_id})
@@ -115,12 +248,26 @@ def add_device():
 @app.route('/api/devices/<device_id>', methods=['DELETE'])
 def remove_device(device_id):
     """Видалення пристрою"""
-    if device_id in connected_devices:
-        del connected_devices[device_id]
+    if device_manager.remove_device(device_id):
         logger.info(f"Видалено пристрій: {device_id}")
         return jsonify({'success': True})
     return jsonify({'success': False, 'error': 'Пристрій не знайдено'}), 404
 
+@app.route('/api/gifts/catalog', methods=['GET'])
+def get_gift_catalog():
+    """Каталог подарунків TikTok з діями за замовчуванням"""
+    return jsonify({
+        'gifts': config.gift_catalog.describe(),
+        'count': len(config.gift_catalog)
+    })
+
+@app.route('/api/gifts/catalog/reload', methods=['POST'])
+def reload_gift_catalog():
+    """Примусове перечитування файлу каталогу"""
+    if not config.gift_catalog.load():
+        return jsonify({'success': False, 'error': 'Не вдалося завантажити каталог'}), 500
+    return jsonify({'success': True, 'count': len(config.gift_catalog)})
+
 @app.route('/api/gifts/actions', methods=['GET'])
 def get_gift_actions():
     """Отримання налаштувань дій для подарунків"""
@@ -136,18 +283,21 @@ def set_gift_action():
         data = request.get_json()
         gift_type = data.get('gift_type')
         device_id = data.get('device_id')
+        # Синхронний ефект на кількох пристроях
+        device_ids = data.get('device_ids') or ([device_id] if device_id else [])
         action = data.get('action')
         params = data.get('params', {})
         
-        if not all([gift_type, device_id, action]):
+        if not all([gift_type, device_ids, action]):
             return jsonify({'success': False, 'error': 'Необхідні поля: gift_type, device_id, action'}), 400
         
-        if device_id not in connected_devices:
+        if any(device_id not in device_manager for device_id in device_ids):
             return jsonify({'success': False, 'error': 'Пристрій не знайдено'}), 404
         
         gift_actions[gift_type] = {
             'gift_type': gift_type,
-            'device_id': device_id,
+            'device_id': device_ids[0],
+            'device_ids': device_ids,
             'action': action,
             'params': params,
             'enabled': data.get('enabled', True),
@@ -192,6 +342,13 @@ def test_arduino():
         data = request.get_json()
         command = data.get('command', 'test')
         
+        # Тестові команди витрачають той самий бюджет послідовного порту, що й подарунки
+        wait = device_limiter.check('arduino')
+        if wait is None:
+            return jsonify({'success': False, 'error': 'Перевищено бюджет команд Arduino'}), 429
+        if wait:
+            time.sleep(wait)
+        
         result = arduino_manager.send_command(command)
         return jsonify({'success': True, 'result': result})
     
@@ -201,17 +358,36 @@ def test_arduino():
 
 @app.route('/api/tiktok/start_monitoring', methods=['POST'])
 def start_tiktok_monitoring():
-    """Запуск моніторингу TikTok"""
+    """Запуск моніторингу TikTok (повторний виклик оновлює маршрутизацію ефіру)"""
     try:
         data = request.get_json()
-        username = data.get('username')
+        username = (data.get('username') or '').lstrip('@')
         
         if not username:
             return jsonify({'success': False, 'error': 'Ім\'я користувача обов\'язкове'}), 400
         
+        # Група пристроїв та власні правила ефіру
+        device_ids = data.get('device_ids', [])
+        actions = data.get('actions', {})
+        unknown = [device_id for device_id in device_ids if device_id not in device_manager]
+        for rule in actions.values():
+            unknown += [device_id for device_id in rule.get('device_ids', []) if device_id not in device_manager]
+        if unknown:
+            return jsonify({'success': False, 'error': f'Пристрої не знайдено: {", ".join(unknown)}'}), 404
+        
+        if username not in active_streams and len(active_streams) >= config.MAX_STREAMS:
+            return jsonify({'success': False, 'error': 'Досягнуто ліміту ефірів'}), 400
+        
         if tiktok_monitor.start_monitoring(username, on_gift_received):
+            stream = active_streams.setdefault(username, {
+                'username': username,
+                'started_at': datetime.now().isoformat(),
+                'stats': {'gifts': 0, 'actions': 0, 'errors': 0}
+            })
+            stream['device_ids'] = device_ids
+            stream['actions'] = {gift_type: {'enabled': True, **rule} for gift_type, rule in actions.items()}
             logger.info(f"Запущено моніторинг TikTok для {username}")
-            return jsonify({'success': True, 'username': username})
+            return jsonify({'success': True, 'username': username, 'streams': len(active_streams)})
         else:
             return jsonify({'success': False, 'error': 'Не вдалося запустити моніторинг'}), 400
     
@@ -221,16 +397,154 @@ def start_tiktok_monitoring():
 
 @app.route('/api/tiktok/stop_monitoring', methods=['POST'])
 def stop_tiktok_monitoring():
-    """Зупинка моніторингу TikTok"""
+    """Зупинка моніторингу TikTok (без username - усіх ефірів)"""
     try:
-        tiktok_monitor.stop_monitoring()
-        logger.info("Зупинено моніторинг TikTok")
+        username = ((request.get_json(silent=True) or {}).get('username') or '').lstrip('@')
+        tiktok_monitor.stop_monitoring(username or None)
+        stopped = [username] if username else list(active_streams)
+        for name in stopped:
+            active_streams.pop(name, None)
+            # Наступний запуск ефіру почне новий сегмент історії
+            gift_history.end_stream(name)
+        logger.info(f"Зупинено моніторинг TikTok {username or '(усі ефіри)'}")
         return jsonify({'success': True})
     
     except Exception as e:
         logger.error(f"Помилка зупинки моніторингу: {e}")
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/tiktok/streams', methods=['GET'])
+def get_streams():
+    """Ефіри, що відстежуються, з маршрутизацією та статистикою"""
+    return jsonify({
+        'streams': [
+            {**{key: value for key, value in stream.items() if key != 'stats'},
+             'stats': get_streams_status().get(username)}
+            for username, stream in active_streams.items()
+        ],
+        'count': len(active_streams)
+    })
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """Рейтинги відправників та подарунків (window - одне з вікон, limit - довжина рейтингу)"""
+    window = request.args.get('window')
+    if window and window not in GiftAnalytics.WINDOWS:
+        return jsonify({'success': False, 'error': f'Невідоме вікно: {window}',
+                        'windows': list(GiftAnalytics.WINDOWS)}), 400
+    limit = min(request.args.get('limit', 10, type=int), 100)
+    return jsonify(gift_analytics.snapshot(limit, [window] if window else None))
+
+@app.route('/api/history/streams', methods=['GET'])
+def get_history_streams():
+    """Збережені ефіри (сегменти історії) від найновішого"""
+    segments = gift_history.list_segments(request.args.getlist('stream') or None)
+    return jsonify({
+        'segments': [segment.describe() for segment in reversed(segments)],
+        'count': len(segments)
+    })
+
+@app.route('/api/history/query', methods=['GET'])
+def query_history():
+    """Агрегація історії: сума metric за кошиками bucket секунд з розбивкою by
+
+    Наприклад, виручка за хвилинами ефіру за типами подарунків для останніх 50 ефірів:
+    /api/history/query?last=50&bucket=60&by=type&metric=coins
+    """
+    args = request.args
+    try:
+        started = time.perf_counter()
+        result = gift_history.query(
+            streams=args.getlist('stream') or None,
+            last=args.get('last', 50, type=int),
+            bucket=args.get('bucket', 60, type=float),
+            by=args.get('by', 'type'),
+            metric=args.get('metric', 'coins'),
+            align=args.get('align', 'stream'),
+            start=args.get('start', type=float),
+            end=args.get('end', type=float)
+        )
+        result['query_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+@app.route('/api/traces', methods=['GET'])
+def get_traces():
+    """Останні трасування подарунків (фільтри type, sender; event_id - трасування одного подарунка)"""
+    event_id = request.args.get('event_id')
+    if event_id:
+        trace = tracer.find(event_id)
+        return jsonify({'traces': [trace] if trace else []})
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'traces': tracer.recent(limit, request.args.get('type'), request.args.get('sender'))})
+
+@app.route('/api/traces/export', methods=['GET'])
+def export_traces():
+    """Експорт трасувань файлом: format=json або chrome (chrome://tracing, Perfetto)"""
+    limit = min(request.args.get('limit', 1000, type=int), config.TRACE_CAPACITY)
+    try:
+        exported = tracer.export(tracer.recent(limit, request.args.get('type'), request.args.get('sender')),
+                                 request.args.get('format', 'json'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    response = jsonify(exported)
+    response.headers['Content-Disposition'] = f"attachment; filename=traces-{int(time.time())}.json"
+    return response
+
+@app.route('/api/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """Трасування одного подарунка: відрізки сервера, послідовного порту та пристроїв"""
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return jsonify({'success': False, 'error': 'Трасування не знайдено'}), 404
+    return jsonify(trace)
+
+@app.route('/api/admin/profile', methods=['POST'])
+def start_profile():
+    """Запуск вибіркового профілю всіх потоків (duration секунд, не довше 60)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        result = sampling_profiler.start(data.get('duration', 10), data.get('interval', 0.01),
+                                         bool(data.get('idle', False)))
+        return jsonify({'success': True, **result}), 202
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+@app.route('/api/admin/profile', methods=['GET'])
+def get_profile():
+    """Результат останнього профілю: format=json (найгарячіші функції) або folded (для flame graph)"""
+    if request.args.get('format') == 'folded':
+        return Response(sampling_profiler.folded(), mimetype='text/plain')
+    return jsonify(sampling_profiler.report(min(request.args.get('limit', 30, type=int), 200)))
+
+@app.route('/api/admin/profile', methods=['DELETE'])
+def stop_profile():
+    """Дострокова зупинка профілю"""
+    sampling_profiler.stop()
+    return jsonify({'success': True, **sampling_profiler.report(0)})
+
+@app.route('/api/admin/threads', methods=['GET'])
+def get_threads():
+    """Стеки всіх потоків та задачі циклу asyncio моніторингу"""
+    return jsonify({
+        'threads': profiler.dump_threads(),
+        'asyncio_tasks': profiler.describe_tasks(tiktok_monitor.loop)
+    })
+
+@app.route('/api/admin/memory', methods=['GET'])
+def get_memory():
+    """Статистика GC (включно з паузами) та пам'яті процесу"""
+    return jsonify(profiler.memory_stats(gc_monitor, request.args.get('top', 20, type=int)))
+
+@app.route('/api/admin/memory/tracemalloc', methods=['POST'])
+def toggle_tracemalloc():
+    """Увімкнення tracemalloc для розподілу пам'яті за рядками коду (сповільнює виділення)"""
+    data = request.get_json(silent=True) or {}
+    return jsonify({'success': True, 'tracing': profiler.set_tracemalloc(bool(data.get('enabled', True)))})
+
 @app.route('/api/simulate/gift', methods=['POST'])
 def simulate_gift():
     """Симуляція отримання подарунка"""
@@ -239,17 +553,22 @@ def simulate_gift():
         gift_type = data.get('gift_type', 'ROSE')
         sender = data.get('sender', 'Test User')
         
-        gift_event = {
-            'type': gift_type,
-            'sender': sender,
-            'timestamp': datetime.now().isoformat(),
-            'value': config.GIFT_VALUES.get(gift_type, 1)
-        }
+        gift_event = GiftEvent(
+            data.get('event_id') or request.headers.get('Idempotency-Key') or uuid.uuid4().hex,
+            gift_type,
+            sender,
+            config.gift_catalog.value(gift_type),
+            stream=data.get('stream')
+        )
         
-        # Обробка подарунка
-        asyncio.create_task(process_gift_async(gift_event))
+        if gift_dedup.seen(gift_event.event_id):
+            return jsonify({'success': True, 'duplicate': True, 'event_id': gift_event.event_id})
+        begin_trace(gift_event)
+        
+        # Обробка подарунка в циклі asyncio монітора (у потоці Flask циклу немає)
+        tiktok_monitor.run_coroutine(ingest_gift(gift_event))
         
-        return jsonify({'success': True, 'gift': gift_event})
+        return jsonify({'success': True, 'gift': gift_event.to_dict()})
     
     except Exception as e:
         logger.error(f"Помилка симуляції подарунка: {e}")
@@ -278,76 +597,230 @@ def handle_join_room(data):
 async def process_gift_async(gift_event):
     """Асинхронна обробка подарунка"""
     try:
-        # Відправка події через WebSocket
-        socketio.emit('gift_received', gift_event)
+        trace_id = gift_event.trace_id
+        # Очікування від прийому: обмеження частоти відправника та об'єднання подарунків
+        tracer.record(trace_id, 'queue', gift_event.received_ns + WALL_OFFSET_NS, count=gift_event.count)
         
-        # Пошук налаштованої дії
-        gift_type = gift_event['type']
-        if gift_type in gift_actions:
-            action_config = gift_actions[gift_type]
-            
+        # Словник будується лише для Socket.IO; далі подарунок іде об'єктом GiftEvent
+        gift = gift_event.to_dict()
+        socketio.emit('gift_received', gift)
+        gift_analytics.record(gift_event)
+        gift_history.append(gift_event)
+        
+        # Пошук налаштованої дії: правила ефіру мають пріоритет над загальними
+        match_started = now_ns()
+        gift_type = gift_event.type
+        stream = active_streams.get(gift_event.stream)
+        if stream:
+            stream['stats']['gifts'] += gift_event.count
+        stream_rule = stream['actions'].get(gift_type) if stream else None
+        action_config = stream_rule or gift_actions.get(gift_type)
+        tracer.record(trace_id, 'rule_match', match_started, matched=bool(action_config and action_config['enabled']),
+                      stream_rule=stream_rule is not None)
+        
+        if action_config:
             if action_config['enabled']:
-                device_id = action_config['device_id']
-                if device_id in connected_devices:
-                    device = connected_devices[device_id]
-                    action = action_config['action']
-                    params = action_config['params']
-                    
-                    # Виконання дії
-                    result = await execute_device_action(device, action, params, gift_event)
+                action = action_config['action']
+                params = action_config.get('params', {})
+                device_ids = resolve_action_devices(action_config, stream, stream_rule is not None)
+                # Спільний момент запуску для всіх пристроїв, трохи в майбутньому
+                execute_at = time.time() + config.SYNC_LEAD_MS / 1000
+                
+                devices = []
+                for device_id in device_ids:
+                    device = device_manager.get(device_id)
+                    if device is not None:
+                        devices.append(device)
+                    else:
+                        logger.warning("Пристрій %s не знайдено", device_id)
+                
+                # Виконання дії на всіх пристроях одночасно
+                results = await asyncio.gather(*(
+                    dispatch_device_action(device, action, params, gift_event, execute_at) for device in devices
+                ))
+                
+                for device, result in zip(devices, results):
+                    if stream:
+                        stream['stats']['actions'] += 1
+                        if result is None:
+                            stream['stats']['errors'] += 1
                     
-                    # Сповіщення про виконання
+                    # Сповіщення про виконання: той самий словник подарунка, замість другого ISO рядка -
+                    # затримка від прийому подарунка
                     socketio.emit('action_executed', {
-                        'gift': gift_event,
+                        'gift': gift,
                         'action': action_config,
-                        'device': device['name'],
+                        'device': device.name,
                         'result': result,
-                        'timestamp': datetime.now().isoformat()
+                        'latency_ms': round(gift_event.age_ms(), 1)
                     })
                     
-                    logger.info(f"Виконано дію {action} для подарунка {gift_type}")
-                else:
-                    logger.warning(f"Пристрій {device_id} не знайдено")
+                    logger.info("Виконано дію %s для подарунка %s", action, gift_type)
             else:
-                logger.info(f"Дія для подарунка {gift_type} відключена")
+                logger.info("Дія для подарунка %s відключена", gift_type)
         else:
-            logger.info(f"Дія для подарунка {gift_type} не налаштована")
+            logger.info("Дія для подарунка %s не налаштована", gift_type)
     
     except Exception as e:
-        logger.error(f"Помилка обробки подарунка: {e}")
+        logger.error("Помилка обробки подарунка: %s", e)
+
+def resolve_action_devices(action_config, stream=None, stream_rule=False):
+    """Пристрої для дії з урахуванням групи пристроїв ефіру"""
+    device_ids = action_config.get('device_ids')
+    if not device_ids and action_config.get('device_id'):
+        device_ids = [action_config['device_id']]
+    # Загальні правила та правила ефіру без власних пристроїв працюють на групі ефіру
+    if stream and stream['device_ids'] and (not stream_rule or not device_ids):
+        return stream['device_ids']
+    return device_ids or []
+
+async def ingest_gift(gift_event):
+    """Прийом подарунка з обмеженням частоти для кожного відправника"""
+    key = (gift_event.stream, gift_event.sender)
+    wait = sender_limiter.check(key)
+    
+    if wait is None:
+        if sender_limiter.policy == 'merge':
+            merge_gift(key, gift_event)
+        else:
+            logger.info("Подарунок %s від %s відкинуто: перевищено ліміт", gift_event.type, gift_event.sender)
+        return
+    
+    if wait:
+        await asyncio.sleep(wait)
+    await process_gift_async(gift_event)
+
+def merge_gift(key, gift_event):
+    """Подарунки відправника понад ліміт накопичуються в одну подію з лічильником count"""
+    merge_key = (*key, gift_event.type)
+    pending = merged_gifts.get(merge_key)
+    if pending:
+        pending.count += gift_event.count
+        return
+    
+    merged_gifts[merge_key] = gift_event
+    asyncio.get_running_loop().call_later(sender_limiter.retry_after(key), flush_merged_gift, merge_key)
+
+def flush_merged_gift(merge_key):
+    """Обробка об'єднаної події, коли відправник знову вкладається в ліміт"""
+    gift_event = merged_gifts.pop(merge_key, None)
+    if gift_event:
+        asyncio.create_task(process_gift_async(gift_event))
+
+def device_rate_key(device):
+    """Ключ бюджету команд: усі Arduino працюють через один послідовний порт"""
+    return 'arduino' if device.type == 'arduino' else device.id
+
+async def dispatch_device_action(device, action, params, gift_event, execute_at=None):
+    """Виконання дії в межах бюджету команд пристрою"""
+    key = device_rate_key(device)
+    wait = device_limiter.check(key)
+    
+    with tracer.span(gift_event.trace_id, 'dispatch', device=device.id, action=action) as span:
+        if wait is None:
+            if device_limiter.policy == 'merge':
+                # Понад бюджет виконується лише остання команда, що чекає
+                if key not in pending_commands:
+                    asyncio.get_running_loop().call_later(device_limiter.retry_after(key), flush_device_command, key)
+                pending_commands[key] = (device, action, params, gift_event)
+                span['merged'] = True
+                return {'success': True, 'merged': True}
+            logger.warning("Команду %s для %s відкинуто: перевищено бюджет команд", action, device.name)
+            span['dropped'] = True
+            return {'success': False, 'error': 'Перевищено бюджет команд пристрою'}
+        
+        if wait:
+            span['wait_ms'] = round(wait * 1000, 1)
+            await asyncio.sleep(wait)
+        return await execute_device_action(device, action, params, gift_event, execute_at)
+
+def flush_device_command(key):
+    """Виконання останньої об'єднаної команди пристрою"""
+    pending = pending_commands.pop(key, None)
+    if pending:
+        device, action, params, gift_event = pending
+        asyncio.create_task(execute_device_action(device, action, params, gift_event,
+                                                  time.time() + config.SYNC_LEAD_MS / 1000))
+
+async def execute_device_action(device, action, params, gift_event, execute_at=None):
+    """Виконання дії на пристрої (execute_at - час запуску за годинником сервера)
+    
+    gift_event - GiftEvent; словник будується лише для пристроїв, що отримують подарунок (HTTP, канал).
 
-async def execute_device_action(device, action, params, gift_event):
-    """Виконання дії на пристрої"""
+    Блокуючий ввід/вивід виконується в пулі потоків, щоб не зупиняти спільний цикл ефірів.
+    """
     try:
-        device_type = device.get('type', 'arduino')
+        device_type = device.type
+        trace_id = gift_event.trace_id
         
         if device_type == 'arduino':
             # Відправка команди до Arduino
             command = f"{action}:{params.get('value', '')}"
-            result = arduino_manager.send_command(command)
+            result = await asyncio.to_thread(arduino_manager.send_command, command, None, execute_at, trace_id)
             return result
         
-        elif device_type == 'http':
-            # HTTP запит до пристрою
-            url = f"http://{device['ip']}:{device.get('port', 80)}/api/command"
-            response = requests.post(url, json={
+        elif device_type in ('esp32', 'esp8266'):
+            # UDP датаграма: ACK та повтори лише для одноразових ефектів, стан - без підтвердження.
+            # Очікування ACK - future в циклі, а не потік пулу на кожну команду
+            address = (device.ip, device.port or config.UDP_DEVICE_PORT)
+            return await udp_transport.send_async(address, action, params, execute_at, trace_id=trace_id)
+        
+        elif device_type in ('http', 'raspberry_pi'):
+            # Постійний канал, якщо пристрій підключився до сервера
+            link_id = device.channel_id
+            if device_channel.is_connected(link_id):
+                return await asyncio.to_thread(device_channel.send_command, link_id, action, params,
+                                               gift_event.to_dict(), execute_at)
+            
+            # HTTP запит до пристрою (годинник пристрою вважається синхронізованим через NTP)
+            url = f"http://{device.ip}:{device.port or 80}/api/command"
+            request_started = now_ns()
+            response = await asyncio.to_thread(get_http_session().post, url, json={
                 'action': action,
                 'params': params,
-                'gift': gift_event
+                'gift': gift_event.to_dict(),
+                'execute_at': execute_at,
+                'trace_id': trace_id
             }, timeout=5)
-            return response.json()
+            result = response.json()
+            tracer.record(trace_id, 'http_request', request_started, device=device.id, status=response.status_code)
+            if trace_id and isinstance(result, dict):
+                tracer.merge(trace_id, result.pop('spans', None), source=device.id)
+            return result
         
         else:
-            logger.warning(f"Невідомий тип пристрою: {device_type}")
+            logger.warning("Невідомий тип пристрою: %s", device_type)
             return None
     
     except Exception as e:
-        logger.error(f"Помилка виконання дії: {e}")
+        logger.error("Помилка виконання дії: %s", e)
         return None
 
+def get_streams_status():
+    """Статистика кожного ефіру: з'єднання та виконані дії"""
+    connections = tiktok_monitor.get_status()
+    return {
+        username: {**connections.get(username, {}), **stream['stats'],
+                   'device_ids': stream['device_ids'], 'rules': len(stream['actions'])}
+        for username, stream in active_streams.items()
+    }
+
+def begin_trace(gift_event):
+    """Ідентифікатор трасування подарунка в момент прийому"""
+    gift_event.trace_id = tracer.begin({
+        'event_id': gift_event.event_id,
+        'type': gift_event.type,
+        'sender': gift_event.sender,
+        'stream': gift_event.stream
+    }, started_ns=gift_event.received_ns + WALL_OFFSET_NS)
+
 def on_gift_received(gift_event):
-    """Callback для отримання подарунка від TikTok"""
-    asyncio.create_task(process_gift_async(gift_event))
+    """Callback для отримання подарунка від TikTok (викликається в циклі asyncio монітора)"""
+    if gift_dedup.seen(gift_event.event_id):
+        logger.info("Повтор подарунка %s (%s) проігноровано", gift_event.type, gift_event.event_id)
+        return
+    begin_trace(gift_event)
+    asyncio.create_task(ingest_gift(gift_event))
 
 # Ініціалізація
 def init_app():
@@ -361,8 +834,45 @@ def init_app():
     # Створення папки для статичних файлів
     Path('static').mkdir(exist_ok=True)
     
+    gc_monitor.install()
+    
+    # Зміни файлу каталогу подарунків підхоплюються без перезапуску
+    config.gift_catalog.watch(config.GIFT_CATALOG_RELOAD_INTERVAL)
+    gift_history.start()
+    # Буфер історії дописується на диск при завершенні процесу
+    atexit.register(gift_history.stop)
+    if config.SERIAL_WORKER:
+        arduino_manager.start()
+        # Процес-обробник відключає порти та звільняє спільну пам'ять разом з сервером
+        atexit.register(arduino_manager.stop)
+    udp_transport.start()
+    atexit.register(udp_transport.stop)
+    
     logger.info("TT-FizMehdia ініціалізовано")
 
+def push_analytics():
+    """Розсилка рейтингів дашбордам та оверлеям, коли з'явилися нові подарунки"""
+    pushed = None
+    while True:
+        socketio.sleep(config.ANALYTICS_PUSH_INTERVAL)
+        # Нова хвилина теж змінює рейтинги, навіть без подарунків
+        state = (gift_analytics.version, int(time.time() // 60))
+        if state != pushed:
+            pushed = state
+            socketio.emit('analytics', gift_analytics.snapshot(config.ANALYTICS_TOP_SIZE))
+
+def arduino_heartbeat():
+    """Heartbeat та повторна синхронізація годинника Arduino (кварц/резонатор дрейфує на мс за хвилини)"""
+    while True:
+        socketio.sleep(config.DEVICE_HEARTBEAT_INTERVAL)
+        if arduino_manager.is_connected():
+            arduino_manager.heartbeat_check()
+
+def warm_up():
+    """Фонове завантаження інтеграцій, щоб перша дія не чекала на імпорт"""
+    with startup.phase('warm_up'):
+        get_http_session()
+
 if __name__ == '__main__':
     init_app()
     
@@ -371,4 +881,9 @@ if __name__ == '__main__':
     debug = os.getenv('DEBUG', 'False').lower() == 'true'
     
     logger.info(f"Запуск сервера на порту {port}")
+    socketio.start_background_task(warm_up)
+    socketio.start_background_task(push_analytics)
+    socketio.start_background_task(arduino_heartbeat)
+    # Готовність - коли socketio.run відкриє порт, а не перед його викликом
+    socketio.start_background_task(startup.mark_ready_when_listening, '0.0.0.0', port, socketio.sleep)
     socketio.run(app, host='0.0.0.0', port=port, debug=debug)
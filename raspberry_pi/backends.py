@@ -0,0 +1,349 @@
+"""
+Апаратні бекенди контролера: справжнє залізо Raspberry Pi або mock-драйвери в пам'яті
+"""
+
+import time
+import logging
+import threading
+import importlib.util
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HardwareBackend:
+    """Базовий бекенд: набір драйверів, які використовує контролер"""
+
+    name = 'none'
+
+    gpio = None
+    mixer = None
+    gpio_available = False
+    camera_available = False
+    sound_available = False
+    neopixel_available = False
+    mqtt_available = False
+
+    def load_mixer(self):
+        """Звуковий мікшер (може ініціалізуватися при першому виклику)"""
+        return self.mixer
+
+    def create_led_strip(self, count: int, brightness: float):
+        """Створення LED стрічки"""
+        raise NotImplementedError
+
+    def create_camera(self):
+        """Створення камери"""
+        raise NotImplementedError
+
+    def create_mqtt_client(self, client_id: str):
+        """Створення MQTT клієнта"""
+        raise NotImplementedError
+
+
+def _module_available(name: str) -> bool:
+    """Перевірка наявності модуля без його імпорту"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+
+class PiBackend(HardwareBackend):
+    """Справжні драйвери Raspberry Pi (кожен необов'язковий)
+
+    GPIO та LED стрічка імпортуються одразу; камера, звук та MQTT лише перевіряються
+    і імпортуються при першому використанні, щоб не затримувати старт API.
+    """
+
+    name = 'pi'
+
+    def __init__(self):
+        # GPIO для Raspberry Pi
+        try:
+            import RPi.GPIO as GPIO
+            self.gpio = GPIO
+            self.gpio_available = True
+        except ImportError:
+            logger.warning("GPIO не доступний. Встановіть RPi.GPIO для роботи з Raspberry Pi")
+
+        # Камера
+        self.camera_available = _module_available('picamera')
+        if not self.camera_available:
+            logger.warning("PiCamera не доступний. Встановіть picamera для роботи з камерою")
+
+        # Звук
+        self.sound_available = _module_available('pygame')
+        if not self.sound_available:
+            logger.warning("Pygame не доступний. Встановіть pygame для роботи зі звуком")
+        self._mixer_lock = threading.Lock()
+
+        # LED стрічки
+        try:
+            import neopixel
+            import board
+            self._neopixel = neopixel
+            self._board = board
+            self.neopixel_available = True
+        except ImportError:
+            logger.warning("Neopixel не доступний. Встановіть neopixel для роботи з LED стрічками")
+
+        # MQTT для мережевого керування
+        self.mqtt_available = _module_available('paho.mqtt.client')
+        if not self.mqtt_available:
+            logger.warning("MQTT не доступний. Встановіть paho-mqtt для мережевого керування")
+
+    def load_mixer(self):
+        with self._mixer_lock:
+            if self.mixer is None:
+                import pygame
+                pygame.mixer.init()
+                self.mixer = pygame.mixer
+        return self.mixer
+
+    def create_led_strip(self, count: int, brightness: float):
+        return self._neopixel.NeoPixel(
+            self._board.D18,  # GPIO пін
+            count,
+            brightness=brightness,
+            auto_write=False
+        )
+
+    def create_camera(self):
+        from picamera import PiCamera
+        return PiCamera()
+
+    def create_mqtt_client(self, client_id: str):
+        import paho.mqtt.client as mqtt
+        # Постійна сесія, щоб брокер зберігав QoS 1 повідомлення під час відключення
+        return mqtt.Client(client_id=client_id, clean_session=False)
+
+
+class EventRecorder:
+    """Журнал подій mock-драйверів з часовими мітками"""
+
+    def __init__(self, maxlen: int = 100000):
+        self.events: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, device: str, event: str, **data):
+        with self._lock:
+            self.events.append((time.perf_counter(), device, event, data))
+
+    def since(self, started: float, device: Optional[str] = None) -> List[tuple]:
+        """Події після моменту started (time.perf_counter)"""
+        with self._lock:
+            return [e for e in self.events if e[0] >= started and (device is None or e[1] == device)]
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+
+
+class MockPWM:
+    """PWM канал, що записує зміни duty cycle"""
+
+    def __init__(self, recorder: EventRecorder, pin: int, frequency: float):
+        self.recorder = recorder
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0.0
+
+    def start(self, duty: float):
+        self.duty = duty
+        self.recorder.record('pwm', 'start', pin=self.pin, duty=duty)
+
+    def ChangeDutyCycle(self, duty: float):
+        self.duty = duty
+        self.recorder.record('pwm', 'duty', pin=self.pin, duty=duty)
+
+    def stop(self):
+        self.recorder.record('pwm', 'stop', pin=self.pin)
+
+
+class MockGPIO:
+    """Заміна модуля RPi.GPIO"""
+
+    BCM = 'BCM'
+    OUT = 'OUT'
+    IN = 'IN'
+    HIGH = 1
+    LOW = 0
+    PUD_UP = 'PUD_UP'
+    PUD_DOWN = 'PUD_DOWN'
+
+    def __init__(self, recorder: EventRecorder):
+        self.recorder = recorder
+        self.pins: Dict[int, Any] = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin: int, mode, pull_up_down=None):
+        self.pins[pin] = self.LOW
+
+    def output(self, pin: int, value):
+        self.pins[pin] = value
+        self.recorder.record('gpio', 'output', pin=pin, value=value)
+
+    def input(self, pin: int):
+        return self.pins.get(pin, self.LOW)
+
+    def PWM(self, pin: int, frequency: float) -> MockPWM:
+        return MockPWM(self.recorder, pin, frequency)
+
+    def cleanup(self):
+        self.pins.clear()
+
+
+class MockLEDStrip:
+    """Заміна neopixel.NeoPixel, що записує кожен показаний кадр"""
+
+    def __init__(self, recorder: EventRecorder, count: int, brightness: float):
+        self.recorder = recorder
+        self.brightness = brightness
+        self.pixels = [(0, 0, 0)] * count
+        self.frames = 0
+
+    def __len__(self):
+        return len(self.pixels)
+
+    def __getitem__(self, index):
+        return self.pixels[index]
+
+    def __setitem__(self, index, color):
+        self.pixels[index] = tuple(color)
+
+    def fill(self, color):
+        self.pixels = [tuple(color)] * len(self.pixels)
+
+    def show(self):
+        self.frames += 1
+        self.recorder.record('led', 'frame', brightness=self.brightness, pixels=tuple(self.pixels))
+
+
+class MockSound:
+    """Заміна pygame.mixer.Sound"""
+
+    def __init__(self, path: str, length: float = 1.0):
+        self.path = path
+        self.length = length
+
+    def get_length(self) -> float:
+        return self.length
+
+
+class MockChannel:
+    """Заміна pygame.mixer.Channel; зайнятий, поки "грає" звук"""
+
+    def __init__(self, recorder: EventRecorder, index: int):
+        self.recorder = recorder
+        self.index = index
+        self.volume = 1.0
+        self._busy_until = 0.0
+
+    def play(self, sound: MockSound):
+        self._busy_until = time.monotonic() + sound.get_length()
+        self.recorder.record('sound', 'play', channel=self.index, sound=sound.path)
+
+    def stop(self):
+        self._busy_until = 0.0
+        self.recorder.record('sound', 'stop', channel=self.index)
+
+    def set_volume(self, volume: float):
+        self.volume = volume
+
+    def get_busy(self) -> bool:
+        return time.monotonic() < self._busy_until
+
+
+class MockMixer:
+    """Заміна pygame.mixer"""
+
+    def __init__(self, recorder: EventRecorder):
+        self.recorder = recorder
+        self._channels: Dict[int, MockChannel] = {}
+
+    def set_num_channels(self, count: int):
+        self._channels = {i: MockChannel(self.recorder, i) for i in range(count)}
+
+    def Channel(self, index: int) -> MockChannel:
+        return self._channels.setdefault(index, MockChannel(self.recorder, index))
+
+    def Sound(self, path: str) -> MockSound:
+        return MockSound(path)
+
+
+class MockCamera:
+    """Заміна PiCamera з синтетичними кадрами"""
+
+    def __init__(self, recorder: EventRecorder):
+        self.recorder = recorder
+        self.resolution = (640, 480)
+        self.framerate = 30
+        self.closed = False
+
+    def capture_continuous(self, output, format='jpeg', use_video_port=False):
+        width, height = self.resolution
+        padded = ((width + 31) // 32 * 32, (height + 15) // 16 * 16)
+        frame = bytes(padded[0] * padded[1] * 3) if format == 'rgb' else b'\xff\xd8\xff\xd9'
+        while not self.closed:
+            output.write(frame)
+            self.recorder.record('camera', 'frame', format=format)
+            yield output
+            time.sleep(1.0 / self.framerate)
+
+    def capture(self, output, format='jpeg', use_video_port=False):
+        if isinstance(output, str):
+            with open(output, 'wb') as f:
+                f.write(b'\xff\xd8\xff\xd9')
+        self.recorder.record('camera', 'capture', output=str(output))
+
+    def close(self):
+        self.closed = True
+
+
+class MockBackend(HardwareBackend):
+    """Mock-драйвери в пам'яті для роботи та профілювання без заліза"""
+
+    name = 'mock'
+
+    gpio_available = True
+    camera_available = True
+    sound_available = True
+    neopixel_available = True
+    mqtt_available = True
+
+    def __init__(self):
+        self.recorder = EventRecorder()
+        self.gpio = MockGPIO(self.recorder)
+        self.mixer = MockMixer(self.recorder)
+        self.led_strip: Optional[MockLEDStrip] = None
+
+    def create_led_strip(self, count: int, brightness: float) -> MockLEDStrip:
+        self.led_strip = MockLEDStrip(self.recorder, count, brightness)
+        return self.led_strip
+
+    def create_camera(self) -> MockCamera:
+        return MockCamera(self.recorder)
+
+    def create_mqtt_client(self, client_id: str):
+        from mqtt_ingest import LocalMQTTClient
+        return LocalMQTTClient()
+
+
+BACKENDS = {
+    'pi': PiBackend,
+    'mock': MockBackend,
+}
+
+
+def create_backend(name: str) -> HardwareBackend:
+    """Створення бекенду за назвою"""
+    if name not in BACKENDS:
+        raise ValueError(f"Невідомий апаратний бекенд: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк ефектів подарунків на mock-драйверах (без Raspberry Pi)
+
+Запуск:
+    python benchmark_effects.py
+    python benchmark_effects.py --gifts ROSE,DIAMOND --repeat 3 --json
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+from typing import TYPE_CHECKING, Dict, Any, List
+
+from backends import MockBackend
+
+if TYPE_CHECKING:
+    from tt_fizmehdia_pi import TTFizMehdiaPi
+
+
+def benchmark_gift(controller: 'TTFizMehdiaPi', backend: MockBackend, gift_type: str,
+                   settle: float = 1.0) -> Dict[str, Any]:
+    """Виконання одного ефекту та збір метрик з журналу mock-драйверів"""
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    result = controller.process_gift(gift_type, 'benchmark')
+    cpu = time.thread_time() - cpu_started
+    finished = time.perf_counter()
+
+    # Фонові драйвери (сервопривід, камера) продовжують роботу після повернення
+    time.sleep(settle)
+    events = [event for event in backend.recorder.since(started) if event[0] <= finished + settle]
+    frames = [event[0] for event in events if event[1] == 'led']
+    # Безперервні кадри камери не є реакцією на подарунок
+    outputs = [event[0] for event in events if event[1] != 'camera' or event[2] != 'frame']
+    first_output = min(outputs, default=None)
+
+    fps = None
+    if len(frames) > 1 and frames[-1] > frames[0]:
+        fps = (len(frames) - 1) / (frames[-1] - frames[0])
+
+    return {
+        'gift': gift_type,
+        'success': result.get('success', False),
+        'actions': result.get('actions', []),
+        'duration_s': finished - started,
+        'frames': len(frames),
+        'fps': fps,
+        'cpu_ms_per_frame': cpu * 1000 / len(frames) if frames else None,
+        'first_frame_ms': (frames[0] - started) * 1000 if frames else None,
+        'first_output_ms': (first_output - started) * 1000 if first_output is not None else None,
+        'pwm_changes': sum(1 for event in events if event[1] == 'pwm'),
+        'sounds': sum(1 for event in events if event[1] == 'sound' and event[2] == 'play'),
+    }
+
+
+def format_value(value, digits: int = 2) -> str:
+    """Форматування числа для таблиці"""
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return str(value)
+
+
+def print_table(results: List[Dict[str, Any]]):
+    """Вивід результатів таблицею"""
+    columns = [
+        ('gift', 'Подарунок'),
+        ('duration_s', 'Час, с'),
+        ('frames', 'Кадри'),
+        ('fps', 'К/с'),
+        ('cpu_ms_per_frame', 'CPU мс/кадр'),
+        ('first_frame_ms', 'Перший кадр, мс'),
+        ('first_output_ms', 'Перша дія, мс'),
+        ('pwm_changes', 'PWM'),
+        ('sounds', 'Звуки'),
+    ]
+    rows = [[title for _, title in columns]]
+    rows += [[format_value(result[key], 3 if key.endswith('_ms') else 2) for key, _ in columns] for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк ефектів TT-FizMehdia на mock-драйверах')
+    parser.add_argument('--gifts', help='Список подарунків через кому (за замовчуванням усі з effects.json)')
+    parser.add_argument('--repeat', type=int, default=1, help='Кількість повторів кожного ефекту')
+    parser.add_argument('--settle', type=float, default=1.0,
+                        help='Скільки секунд збирати події фонових драйверів після ефекту')
+    parser.add_argument('--json', action='store_true', help='Вивід у форматі JSON')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ.setdefault('MQTT_ENABLED', 'False')
+
+    # Фото, логи та інші файли пишемо у тимчасову папку; контролер імпортується після
+    # переходу, бо вже при імпорті відкриває LOG_FILE за відносним шляхом
+    os.chdir(tempfile.mkdtemp(prefix='tt-fizmehdia-bench-'))
+    from tt_fizmehdia_pi import TTFizMehdiaPi
+
+    backend = MockBackend()
+    controller = TTFizMehdiaPi(backend=backend)
+    controller.wait_ready()
+    try:
+        gifts = args.gifts.split(',') if args.gifts else list(controller.effects.effects)
+        results = [benchmark_gift(controller, backend, gift, args.settle) for gift in gifts for _ in range(args.repeat)]
+    finally:
+        controller.cleanup()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
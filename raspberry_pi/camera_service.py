@@ -0,0 +1,198 @@
+"""
+Фонова служба камери з кільцевим буфером кадрів та записом JPEG в окремому потоці
+"""
+
+import io
+import os
+import time
+import queue
+import bisect
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PhotoJob:
+    """Запит на збереження кадру (та кліпу) для подарунка"""
+    path: str
+    timestamp: float
+    pre_roll: float = 0.0
+    post_roll: float = 0.0
+    # Кадри до моменту подарунка, взяті з буфера при постановці в чергу (до їх витіснення)
+    frames: List[Tuple[float, bytes]] = field(default_factory=list)
+
+
+class CameraService:
+    """Безперервна зйомка в пам'ять та асинхронне збереження фото"""
+
+    def __init__(self, camera, photos_dir: str = 'photos', fps: int = 10,
+                 buffer_seconds: float = 3.0, max_jobs: int = 16):
+        self.camera = camera
+        self.photos_dir = photos_dir
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.resolution: Tuple[int, int] = tuple(camera.resolution)
+        # Без Pillow беремо вже стиснені JPEG з відеопорту камери
+        self.frame_format = 'rgb' if PIL_AVAILABLE else 'jpeg'
+
+        # Кільцевий буфер: (час кадру, байти кадру)
+        self._frames: deque = deque(maxlen=max(1, int(fps * buffer_seconds)))
+        self._frames_lock = threading.Lock()
+        self._jobs: 'queue.Queue[Optional[PhotoJob]]' = queue.Queue(maxsize=max_jobs)
+        self._running = threading.Event()
+        self._capture_thread: Optional[threading.Thread] = None
+        self._writer_thread: Optional[threading.Thread] = None
+
+        self.stats = {'frames': 0, 'photos': 0, 'dropped_jobs': 0}
+
+    def start(self):
+        """Запуск потоків зйомки та запису"""
+        if self._running.is_set():
+            return
+        os.makedirs(self.photos_dir, exist_ok=True)
+        self._running.set()
+        self._capture_thread = threading.Thread(target=self._capture_loop, name='camera-capture', daemon=True)
+        self._writer_thread = threading.Thread(target=self._writer_loop, name='camera-writer', daemon=True)
+        self._capture_thread.start()
+        self._writer_thread.start()
+        logger.info(f"Служба камери запущена ({self.fps} к/с, буфер {self._frames.maxlen} кадрів)")
+
+    def stop(self, timeout: float = 2.0):
+        """Зупинка потоків"""
+        if not self._running.is_set():
+            return
+        self._running.clear()
+        self._jobs.put(None)
+        for thread in (self._capture_thread, self._writer_thread):
+            if thread:
+                thread.join(timeout)
+
+    def snapshot(self, filename: str, timestamp: Optional[float] = None,
+                 pre_roll: float = 0.0, post_roll: float = 0.0) -> Dict[str, Any]:
+        """Постановка фото в чергу запису (повертається одразу)"""
+        if timestamp is None:
+            timestamp = time.time()
+        path = os.path.join(self.photos_dir, filename)
+        # Кадри від timestamp - pre_roll закріплюються зараз: поки запис дочекається post_roll
+        # (чи черги), кільцевий буфер уже може їх витіснити. Копіюються лише посилання
+        with self._frames_lock:
+            frames = self._frames_since(timestamp - max(pre_roll, self.interval))
+        try:
+            self._jobs.put_nowait(PhotoJob(path, timestamp, pre_roll, post_roll, frames))
+        except queue.Full:
+            self.stats['dropped_jobs'] += 1
+            logger.warning(f"Черга фото переповнена, {filename} пропущено")
+            return {'success': False, 'error': 'Черга фото переповнена'}
+
+        return {'success': True, 'photo': path, 'queued': True}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу служби"""
+        return {
+            'running': self._running.is_set(),
+            'buffered_frames': len(self._frames),
+            'pending_photos': self._jobs.qsize(),
+            **self.stats
+        }
+
+    def _capture_loop(self):
+        """Безперервна зйомка кадрів у кільцевий буфер"""
+        stream = io.BytesIO()
+        try:
+            for _ in self.camera.capture_continuous(stream, format=self.frame_format, use_video_port=True):
+                captured_at = time.time()
+                with self._frames_lock:
+                    self._frames.append((captured_at, stream.getvalue()))
+                self.stats['frames'] += 1
+                stream.seek(0)
+                stream.truncate()
+
+                if not self._running.is_set():
+                    break
+                delay = captured_at + self.interval - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        except Exception as e:
+            logger.error(f"Помилка безперервної зйомки: {e}")
+
+    def _writer_loop(self):
+        """Кодування та запис фото"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            # Чекаємо, поки в буфер потраплять кадри після подарунка
+            wait_until = job.timestamp + max(job.post_roll, self.interval)
+            while self._running.is_set() and time.time() < wait_until:
+                time.sleep(max(0.0, min(0.05, wait_until - time.time())))
+
+            try:
+                self._write_job(job)
+            except Exception as e:
+                logger.error(f"Помилка збереження фото {job.path}: {e}")
+
+    def _write_job(self, job: PhotoJob):
+        """Збереження найближчого кадру та кліпу навколо подарунка"""
+        with self._frames_lock:
+            newest = job.frames[-1][0] if job.frames else float('-inf')
+            frames = job.frames + [frame for frame in self._frames if frame[0] > newest]
+        if not frames:
+            logger.warning("Буфер камери порожній, фото не збережено")
+            return
+
+        times = [captured_at for captured_at, _ in frames]
+        self._save_frame(frames[self._nearest(times, job.timestamp)][1], job.path)
+        self.stats['photos'] += 1
+
+        if job.pre_roll > 0 or job.post_roll > 0:
+            start = bisect.bisect_left(times, job.timestamp - job.pre_roll)
+            end = bisect.bisect_right(times, job.timestamp + job.post_roll)
+            base, ext = os.path.splitext(job.path)
+            for number, (_, frame) in enumerate(frames[start:end]):
+                self._save_frame(frame, f"{base}_{number:03d}{ext}")
+
+    def _frames_since(self, since: float) -> List[Tuple[float, bytes]]:
+        """Кадри буфера, зняті не раніше since (під блокуванням буфера)"""
+        frames = self._frames
+        index = len(frames)
+        while index and frames[index - 1][0] >= since:
+            index -= 1
+        return [frames[i] for i in range(index, len(frames))]
+
+    @staticmethod
+    def _nearest(times: List[float], timestamp: float) -> int:
+        """Індекс кадру, найближчого до моменту подарунка"""
+        index = bisect.bisect_left(times, timestamp)
+        if index == 0:
+            return 0
+        if index == len(times):
+            return len(times) - 1
+        before, after = times[index - 1], times[index]
+        return index if after - timestamp < timestamp - before else index - 1
+
+    def _save_frame(self, frame: bytes, path: str):
+        """Кодування кадру в JPEG та запис на диск"""
+        if self.frame_format == 'jpeg':
+            with open(path, 'wb') as f:
+                f.write(frame)
+            return
+
+        # picamera вирівнює RGB кадри до 32x16 пікселів
+        width, height = self.resolution
+        padded = ((width + 31) // 32 * 32, (height + 15) // 16 * 16)
+        image = Image.frombytes('RGB', padded, frame)
+        if padded != (width, height):
+            image = image.crop((0, 0, width, height))
+        image.save(path, 'JPEG', quality=90)
@@ -0,0 +1,201 @@
+"""
+Декларативний реєстр ефектів подарунків з попередньою компіляцією та гарячим перезавантаженням
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ключ ефекту для невідомих типів подарунків
+DEFAULT_EFFECT = 'default'
+
+
+@dataclass(frozen=True)
+class GiftContext:
+    """Дані подарунка, доступні крокам ефекту"""
+    gift_type: str
+    sender: str
+    received_at: float
+
+
+@dataclass(frozen=True)
+class EffectStep:
+    """Скомпільований крок ефекту"""
+    kind: str
+    run: Callable[[GiftContext], Any]
+    at: float = 0.0
+    label: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Effect:
+    """Скомпільований ефект - послідовність кроків"""
+    gift_type: str
+    steps: Tuple[EffectStep, ...]
+
+    def run(self, context: GiftContext, cancel: Optional[threading.Event] = None) -> List[str]:
+        """Виконання кроків з урахуванням їх часу старту
+
+        Якщо встановлено cancel, решта кроків пропускається.
+        """
+        started = time.monotonic()
+        actions = []
+        for step in self.steps:
+            # Крок починається не раніше своєї позначки часу від старту ефекту
+            delay = started + step.at - time.monotonic()
+            if cancel is not None:
+                if cancel.wait(max(0.0, delay)):
+                    break
+            elif delay > 0:
+                time.sleep(delay)
+            step.run(context)
+            if step.label:
+                actions.append(step.label)
+        return actions
+
+
+class EffectRegistry:
+    """Таблиця ефектів: тип подарунка -> скомпільований ефект"""
+
+    def __init__(self, controller, path: str):
+        self.controller = controller
+        self.path = path
+        self.effects: Dict[str, Effect] = {}
+        self.loaded_mtime: Optional[float] = None
+        self._watch_stop = threading.Event()
+        self._watch_thread: Optional[threading.Thread] = None
+
+        self._compilers: Dict[str, Callable[[Dict[str, Any]], Callable[[GiftContext], Any]]] = {
+            'led': self._compile_led,
+            'servo': self._compile_servo,
+            'sound': self._compile_sound,
+            'camera': self._compile_camera,
+        }
+
+    def get(self, gift_type: str) -> Optional[Effect]:
+        """Отримання ефекту для подарунка"""
+        effects = self.effects
+        return effects.get(gift_type) or effects.get(DEFAULT_EFFECT)
+
+    def load(self) -> bool:
+        """Завантаження та компіляція таблиці ефектів з файлу
+
+        При помилці залишається попередня таблиця.
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            effects = self.compile(table)
+        except Exception as e:
+            logger.error(f"Помилка завантаження ефектів з {self.path}: {e}")
+            return False
+
+        # Атомарна заміна всієї таблиці
+        self.effects = effects
+        self.loaded_mtime = mtime
+        logger.info(f"Завантажено {len(effects)} ефектів з {self.path}")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Перезавантаження, якщо файл змінився"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self.loaded_mtime:
+            return False
+        return self.load()
+
+    def watch(self, interval: float = 2.0):
+        """Запуск потоку, який стежить за змінами файлу"""
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+
+        def loop():
+            while not self._watch_stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=loop, name='effects-watch', daemon=True)
+        self._watch_thread.start()
+
+    def stop(self):
+        """Зупинка потоку спостереження"""
+        self._watch_stop.set()
+
+    def describe(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Опис таблиці ефектів для API"""
+        return {
+            gift_type: [{'kind': step.kind, 'at': step.at, 'label': step.label} for step in effect.steps]
+            for gift_type, effect in self.effects.items()
+        }
+
+    def compile(self, table: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Effect]:
+        """Компіляція таблиці в готові до запуску ефекти"""
+        if not isinstance(table, dict):
+            raise ValueError('Таблиця ефектів повинна бути об\'єктом')
+
+        effects = {}
+        for gift_type, steps in table.items():
+            if not isinstance(steps, list):
+                raise ValueError(f"Ефект {gift_type}: очікується список кроків")
+            effects[gift_type] = Effect(gift_type, tuple(self._compile_step(gift_type, step) for step in steps))
+            self._check_camera_order(gift_type, effects[gift_type])
+        return effects
+
+    @staticmethod
+    def _check_camera_order(gift_type: str, effect: Effect):
+        """Кадри до подарунка (pre_roll) живуть у буфері камери лише кілька секунд
+
+        Кроки виконуються по черзі, тож камера після LED чи звуку ставить фото в чергу вже
+        після їх завершення, коли кадрів моменту подарунка в буфері немає.
+        """
+        for index, step in enumerate(effect.steps):
+            if step.kind == 'camera' and index > 0:
+                logger.warning(f"Ефект {gift_type}: крок камери не перший, кадри моменту подарунка "
+                               f"можуть бути вже витіснені з буфера")
+
+    def _compile_step(self, gift_type: str, step: Dict[str, Any]) -> EffectStep:
+        """Компіляція одного кроку"""
+        kind = step.get('kind')
+        compiler = self._compilers.get(kind)
+        if compiler is None:
+            raise ValueError(f"Ефект {gift_type}: невідомий тип кроку {kind}")
+        return EffectStep(kind=kind, run=compiler(step), at=float(step.get('at', 0)), label=step.get('label'))
+
+    def _compile_led(self, step: Dict[str, Any]) -> Callable[[GiftContext], Any]:
+        action = step['action']
+        params = dict(step.get('params', {}))
+        control = self.controller.control_led_strip
+        return lambda context: control(action, params)
+
+    def _compile_servo(self, step: Dict[str, Any]) -> Callable[[GiftContext], Any]:
+        angle = step['angle']
+        speed = step.get('speed')
+        easing = step.get('easing', 'ease_in_out')
+        control = self.controller.control_servo_motor
+        return lambda context: control(angle, speed=speed, easing=easing)
+
+    def _compile_sound(self, step: Dict[str, Any]) -> Callable[[GiftContext], Any]:
+        sound = step['sound']
+        play = self.controller.play_sound_effect
+        return lambda context: play(sound)
+
+    def _compile_camera(self, step: Dict[str, Any]) -> Callable[[GiftContext], Any]:
+        filename = step.get('filename', '{gift_type}_gift_{timestamp}.jpg')
+        pre_roll = float(step.get('pre_roll', 0))
+        post_roll = float(step.get('post_roll', 0))
+        take_photo = self.controller.take_photo
+        return lambda context: take_photo(
+            filename.format(gift_type=context.gift_type.lower(), timestamp=int(context.received_at)),
+            timestamp=context.received_at,
+            pre_roll=pre_roll,
+            post_roll=post_roll
+        )
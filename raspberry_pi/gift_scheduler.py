@@ -0,0 +1,198 @@
+"""
+Планувальник подарунків за вартістю з витісненням та скиданням навантаження
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, List, Optional
+
+from common.tracing import TraceStore, now_ns
+
+logger = logging.getLogger(__name__)
+
+# Найдовше очікування запланованого моменту запуску (захист від хибного зсуву годинника)
+MAX_SCHEDULE_DELAY = 2.0
+
+
+@dataclass
+class GiftJob:
+    """Подарунок, що очікує на виконання ефекту"""
+    gift_type: str
+    sender: str
+    value: int
+    received_at: float
+    count: int = 1
+    senders: List[str] = field(default_factory=list)
+    # Момент запуску ефекту (time.time()) для синхронного шоу на кількох пристроях
+    execute_at: Optional[float] = None
+    # Трасування подарунків, що виконуються цим ефектом (разом з об'єднаними)
+    trace_ids: List[str] = field(default_factory=list)
+
+    @property
+    def display_sender(self) -> str:
+        """Відправник з урахуванням об'єднаних подарунків"""
+        if self.count == 1:
+            return self.sender
+        return f"{self.sender} (+{self.count - 1})"
+
+
+class GiftScheduler:
+    """Черга подарунків з пріоритетом за вартістю та одним потоком виконання ефектів"""
+
+    def __init__(self, handler: Callable[[str, str, float], Dict[str, Any]], gift_values: Dict[str, int],
+                 cancel_event: threading.Event, merge_threshold: int = 10, max_backlog: int = 50,
+                 preempt_ratio: float = 10.0, merge_max_value: int = 10, tracer: Optional[TraceStore] = None):
+        self.handler = handler
+        self.gift_values = gift_values
+        self.cancel_event = cancel_event
+        self.merge_threshold = merge_threshold
+        self.max_backlog = max_backlog
+        self.preempt_ratio = preempt_ratio
+        self.merge_max_value = merge_max_value
+        # Відрізки pi_queue та effect_render для трасування подарунків
+        self.tracer = tracer or TraceStore(enabled=False)
+
+        # Купа: (-вартість, порядковий номер, подарунок)
+        self._heap: List[tuple] = []
+        self._pending_by_type: Dict[str, GiftJob] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running_job: Optional[GiftJob] = None
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {'submitted': 0, 'processed': 0, 'merged': 0, 'dropped': 0, 'preempted': 0}
+
+    def start(self):
+        """Запуск потоку виконання ефектів"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='gift-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Зупинка планувальника"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self.cancel_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, gift_type: str, sender: str, value: Optional[int] = None,
+               execute_at: Optional[float] = None, trace_id: Optional[str] = None) -> Dict[str, Any]:
+        """Додавання подарунка в чергу (повертається одразу)"""
+        if value is None:
+            value = self.gift_values.get(gift_type, 1)
+        job = GiftJob(gift_type, sender, value, time.time(), senders=[sender], execute_at=execute_at,
+                      trace_ids=[trace_id] if trace_id else [])
+
+        with self._condition:
+            self.stats['submitted'] += 1
+            backlog = len(self._heap)
+
+            # Під час шторму дешеві подарунки одного типу об'єднуються в один ефект
+            pending = self._pending_by_type.get(gift_type)
+            if backlog >= self.merge_threshold and value <= self.merge_max_value and pending:
+                pending.count += 1
+                pending.senders.append(sender)
+                if trace_id:
+                    pending.trace_ids.append(trace_id)
+                self.stats['merged'] += 1
+                return {'success': True, 'queued': True, 'merged': True, 'backlog': backlog}
+
+            if backlog >= self.max_backlog and not self._evict_cheaper(value):
+                self.stats['dropped'] += 1
+                logger.warning(f"Черга подарунків переповнена, {gift_type} від {sender} відкинуто")
+                return {'success': False, 'error': 'Черга подарунків переповнена', 'backlog': backlog}
+
+            heapq.heappush(self._heap, (-value, next(self._sequence), job))
+            self._pending_by_type.setdefault(gift_type, job)
+
+            running = self._running_job
+            if running and value >= running.value * self.preempt_ratio:
+                logger.info(f"Подарунок {gift_type} ({value}) перериває {running.gift_type} ({running.value})")
+                self.stats['preempted'] += 1
+                self.cancel_event.set()
+
+            self._condition.notify()
+            return {'success': True, 'queued': True, 'backlog': len(self._heap)}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу черги"""
+        with self._condition:
+            running = self._running_job
+            return {
+                'backlog': len(self._heap),
+                'running': running.gift_type if running else None,
+                **self.stats
+            }
+
+    def _evict_cheaper(self, value: int) -> bool:
+        """Видалення найдешевшого подарунка з черги, якщо він дешевший за новий"""
+        index = max(range(len(self._heap)), key=lambda i: (self._heap[i][0], self._heap[i][1]))
+        cheapest = self._heap[index][2]
+        if cheapest.value >= value:
+            return False
+
+        self._heap[index] = self._heap[-1]
+        self._heap.pop()
+        heapq.heapify(self._heap)
+        self._forget(cheapest)
+        self.stats['dropped'] += cheapest.count
+        logger.warning(f"Подарунок {cheapest.gift_type} від {cheapest.sender} витіснено з черги")
+        return True
+
+    def _forget(self, job: GiftJob):
+        """Видалення подарунка з індексу об'єднання"""
+        if self._pending_by_type.get(job.gift_type) is job:
+            del self._pending_by_type[job.gift_type]
+
+    def _wait_until(self, execute_at: float):
+        """Очікування запланованого моменту запуску (не довше MAX_SCHEDULE_DELAY)"""
+        delay = min(execute_at - time.time(), MAX_SCHEDULE_DELAY)
+        if delay > 0:
+            self.cancel_event.wait(delay)
+
+    def _run(self):
+        """Головний цикл виконання ефектів"""
+        while True:
+            with self._condition:
+                while not self._heap and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    break
+                _, _, job = heapq.heappop(self._heap)
+                self._forget(job)
+                self._running_job = job
+                self.cancel_event.clear()
+
+            if job.execute_at is not None:
+                self._wait_until(job.execute_at)
+
+            started = now_ns()
+            try:
+                # Час надходження, а не вибору з черги: камера шукає кадр моменту подарунка
+                self.handler(job.gift_type, job.display_sender, job.received_at)
+            except Exception as e:
+                logger.error(f"Помилка виконання ефекту {job.gift_type}: {e}")
+            finally:
+                with self._condition:
+                    self._running_job = None
+                    self.stats['processed'] += 1
+                self._trace(job, started)
+
+    def _trace(self, job: GiftJob, started: int):
+        """Відрізки черги та ефекту для кожного подарунка, виконаного цим ефектом"""
+        for trace_id in job.trace_ids:
+            self.tracer.record(trace_id, 'pi_queue', int(job.received_at * 1e9), started,
+                               scheduled=job.execute_at is not None, merged=job.count)
+            self.tracer.record(trace_id, 'effect_render', started, gift_type=job.gift_type,
+                               cancelled=self.cancel_event.is_set())
+            self.tracer.publish(trace_id)
@@ -0,0 +1,179 @@
+"""
+Прийом подарунків через MQTT з пулом обробників поза мережевим потоком paho
+"""
+
+import json
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Callable, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+def parse_gift_payload(payload: bytes) -> List[Dict[str, Any]]:
+    """Розбір одиночного або пакетного повідомлення з подарунками"""
+    data = json.loads(payload.decode('utf-8'))
+
+    # Підтримувані формати: {...}, [{...}, ...], {"gifts": [{...}, ...]}
+    if isinstance(data, dict) and isinstance(data.get('gifts'), list):
+        data = data['gifts']
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise ValueError('Очікується об\'єкт або список подарунків')
+
+    return [gift for gift in data if isinstance(gift, dict) and gift.get('type')]
+
+
+class MQTTGiftIngest:
+    """Підписка на топік подарунків та передача їх у пул потоків"""
+
+    def __init__(self, client, handler: Callable[..., Any], topic: str = 'tt-fizmehdia/gift',
+                 qos: int = 1, workers: int = 4, max_pending: int = 256, backpressure_timeout: float = 5.0):
+        self.client = client
+        self.handler = handler
+        self.topic = topic
+        self.qos = qos
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mqtt-gift')
+        # Обмеження кількості подарунків, що чекають на обробку
+        self._pending = threading.BoundedSemaphore(max_pending)
+        # Скільки мережевий потік чекає на місце в черзі, перш ніж обробити подарунок сам
+        self.backpressure_timeout = backpressure_timeout
+        self.connected = False
+
+        self.stats = {'messages': 0, 'gifts': 0, 'processed': 0, 'backpressure': 0, 'inline': 0, 'errors': 0}
+
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60,
+                username: str = '', password: str = ''):
+        """Асинхронне підключення до брокера та запуск мережевого циклу"""
+        if username:
+            self.client.username_pw_set(username, password or None)
+        self.client.connect_async(host, port, keepalive)
+        self.client.loop_start()
+        logger.info(f"Підключення до MQTT брокера {host}:{port}, топік {self.topic} (QoS {self.qos})")
+
+    def stop(self):
+        """Відключення від брокера та завершення обробників"""
+        try:
+            self.client.disconnect()
+            self.client.loop_stop()
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу прийому"""
+        return {'connected': self.connected, 'topic': self.topic, 'qos': self.qos, **self.stats}
+
+    def on_connect(self, client, userdata, flags, rc):
+        """Callback для MQTT підключення"""
+        self.connected = rc == 0
+        logger.info(f"MQTT підключено з кодом {rc}")
+        if self.connected:
+            # Підписка при кожному підключенні, щоб відновитися після reconnect
+            client.subscribe(self.topic, qos=self.qos)
+
+    def on_disconnect(self, client, userdata, rc):
+        """Callback для MQTT відключення"""
+        self.connected = False
+        if rc != 0:
+            logger.warning(f"MQTT з'єднання втрачено з кодом {rc}, повторне підключення")
+
+    def on_message(self, client, userdata, msg):
+        """Callback для MQTT повідомлень (виконується в мережевому потоці paho)"""
+        self.stats['messages'] += 1
+        try:
+            gifts = parse_gift_payload(msg.payload)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Помилка обробки MQTT повідомлення: {e}")
+            return
+
+        # paho підтверджує QoS 1 (PUBACK) одразу після повернення з callback, тож брокер
+        # більше не доставить повідомлення: жоден подарунок не відкидається. Переповнена черга
+        # притримує мережевий потік (і нові повідомлення від брокера), а після
+        # backpressure_timeout подарунок обробляється прямо тут.
+        for gift in gifts:
+            self.stats['gifts'] += 1
+            if self._pending.acquire(blocking=False):
+                self.executor.submit(self._process, gift)
+                continue
+            self.stats['backpressure'] += 1
+            if self._pending.acquire(timeout=self.backpressure_timeout):
+                self.executor.submit(self._process, gift)
+                continue
+            logger.warning(f"Черга MQTT подарунків переповнена, {gift['type']} обробляється в мережевому потоці")
+            self.stats['inline'] += 1
+            self._process(gift, release=False)
+
+    def _process(self, gift: Dict[str, Any], release: bool = True):
+        """Обробка одного подарунка (у пулі потоків; release - звільнити місце в черзі)"""
+        try:
+            # event_id дозволяє відкинути повторну доставку QoS 1
+            self.handler(gift['type'], gift.get('sender', 'Unknown'), value=gift.get('value'),
+                         event_id=gift.get('event_id'), trace_id=gift.get('trace_id'))
+            self.stats['processed'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Помилка обробки MQTT подарунка: {e}")
+        finally:
+            if release:
+                self._pending.release()
+
+
+class LocalMQTTClient:
+    """Локальна заміна брокера та клієнта paho для перевірки без мережі
+
+    Реалізує ту саму частину API, яку використовує MQTTGiftIngest, і доставляє
+    повідомлення з publish() в окремому "мережевому" потоці, як це робить paho.
+    """
+
+    def __init__(self):
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.subscriptions: Dict[str, int] = {}
+        self.published: Dict[str, List[bytes]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        pass
+
+    def loop_start(self):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions[topic] = qos
+
+    def publish(self, topic, payload, qos=0):
+        """Публікація повідомлення підписнику (як це зробив би брокер)"""
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload)
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        with self._lock:
+            self.published[topic].append(payload)
+
+        if topic in self.subscriptions and self.on_message:
+            msg = SimpleNamespace(topic=topic, payload=payload, qos=min(qos, self.subscriptions[topic]))
+            thread = threading.Thread(target=self.on_message, args=(self, None, msg), daemon=True)
+            thread.start()
+            return thread
+        return None
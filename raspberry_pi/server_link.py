@@ -0,0 +1,140 @@
+"""
+Постійне Socket.IO з'єднання контролера з центральним сервером TT-FizMehdia
+"""
+
+import time
+import logging
+import threading
+import importlib.util
+from typing import Callable, Dict, Any, Optional
+
+# Сам socketio імпортується лише при створенні ServerLink (довгий імпорт на Pi Zero)
+SOCKETIO_AVAILABLE = importlib.util.find_spec('socketio') is not None
+
+logger = logging.getLogger(__name__)
+
+DEVICE_NAMESPACE = '/devices'
+
+
+class ServerLink:
+    """Клієнт постійного каналу: команди від сервера, підтвердження та статус у відповідь"""
+
+    def __init__(self, server_url: str, device_id: str,
+                 command_handler: Callable[[str, Dict[str, Any], Optional[Dict[str, Any]], Optional[float],
+                                            Optional[str]], Dict[str, Any]],
+                 status_provider: Callable[[], Dict[str, Any]], capabilities: Dict[str, Any],
+                 status_interval: float = 30.0, token: str = ''):
+        self.server_url = server_url
+        self.device_id = device_id
+        self.command_handler = command_handler
+        self.status_provider = status_provider
+        self.capabilities = capabilities
+        self.status_interval = status_interval
+        # Спільний токен пристроїв (DEVICE_TOKEN на сервері)
+        self.token = token
+
+        import socketio
+        self.client = socketio.Client(reconnection=True, reconnection_delay=1, reconnection_delay_max=10)
+        self.client.on('connect', self._on_connect, namespace=DEVICE_NAMESPACE)
+        self.client.on('disconnect', self._on_disconnect, namespace=DEVICE_NAMESPACE)
+        self.client.on('command', self._on_command, namespace=DEVICE_NAMESPACE)
+        self.client.on('clock', self._on_clock, namespace=DEVICE_NAMESPACE)
+
+        self.connected = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'commands': 0, 'errors': 0}
+
+    def start(self):
+        """Підключення до сервера у фоновому потоці"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='server-link', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Відключення від сервера"""
+        self._stop.set()
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+    def send_trace(self, trace_id: str, spans: list):
+        """Відрізки трасування, завершені після підтвердження команди (черга, ефект)"""
+        if not self.connected:
+            return
+        try:
+            self.client.emit('device_trace', {'trace_id': trace_id, 'spans': spans}, namespace=DEVICE_NAMESPACE)
+        except Exception as e:
+            logger.debug("Не вдалося надіслати трасування %s: %s", trace_id, e)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу каналу"""
+        return {'server': self.server_url, 'device_id': self.device_id, 'connected': self.connected, **self.stats}
+
+    def _run(self):
+        """Перше підключення з повторами; далі перепідключенням керує socketio"""
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                self.client.connect(self.server_url, namespaces=[DEVICE_NAMESPACE], transports=['websocket'])
+                break
+            except Exception as e:
+                logger.warning(f"Не вдалося підключитися до сервера {self.server_url}: {e}")
+                self._stop.wait(delay)
+                delay = min(delay * 2, 30.0)
+
+        # Періодичний статус по тому ж з'єднанню
+        while not self._stop.wait(self.status_interval):
+            if self.connected:
+                try:
+                    self.client.emit('device_status', self.status_provider(), namespace=DEVICE_NAMESPACE)
+                except Exception as e:
+                    logger.error(f"Помилка відправки статусу: {e}")
+
+    def _on_connect(self):
+        self.connected = True
+        self._send_hello()
+        logger.info(f"Постійний канал до {self.server_url} відкрито")
+
+    def _send_hello(self):
+        if not self.connected:
+            return
+        self.client.emit('device_hello', {
+            'device_id': self.device_id,
+            'capabilities': self.capabilities,
+            'token': self.token
+        }, namespace=DEVICE_NAMESPACE, callback=self._on_hello_reply)
+
+    def _on_hello_reply(self, reply=None):
+        if (reply or {}).get('success'):
+            return
+        logger.error(f"Сервер відхилив реєстрацію пристрою: {(reply or {}).get('error')}")
+        if (reply or {}).get('retry'):
+            # Сервер ще не помітив розрив попереднього з'єднання
+            timer = threading.Timer(5.0, self._send_hello)
+            timer.daemon = True
+            timer.start()
+
+    def _on_disconnect(self):
+        self.connected = False
+        logger.warning("Постійний канал до сервера закрито")
+
+    def _on_command(self, message):
+        """Команда від сервера; повернене значення - підтвердження для сервера"""
+        self.stats['commands'] += 1
+        try:
+            result = self.command_handler(message.get('action'), message.get('params') or {}, message.get('gift'),
+                                          message.get('execute_at'), message.get('trace_id'))
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Помилка виконання команди: {e}")
+            result = {'success': False, 'error': str(e)}
+        return {'id': message.get('id'), 'received_at': time.time(), **result}
+
+    def _on_clock(self, message):
+        """Обмін для оцінки зсуву годинника: час отримання та час відповіді"""
+        received = time.time()
+        return {'t0': (message or {}).get('t0'), 't1': received, 't2': time.time()}
@@ -0,0 +1,157 @@
+"""
+Фоновий контролер сервоприводу з чергою рухів та плавною інтерполяцією
+"""
+
+import math
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Функції згладжування: t в [0, 1] -> прогрес в [0, 1]
+EASINGS: Dict[str, Callable[[float], float]] = {
+    'linear': lambda t: t,
+    'ease_in': lambda t: t * t,
+    'ease_out': lambda t: 1 - (1 - t) * (1 - t),
+    'ease_in_out': lambda t: 0.5 - math.cos(math.pi * t) / 2,
+}
+
+
+@dataclass
+class ServoMove:
+    """Один рух сервоприводу в черзі"""
+    angle: float
+    speed: float
+    easing: str = 'ease_in_out'
+    hold: float = 0.0
+
+
+class ServoController:
+    """Потік керування сервоприводом з чергою рухів"""
+
+    def __init__(self, pwm, default_speed: float = 360.0, step_interval: float = 0.02,
+                 settle_time: float = 0.3, max_queue: int = 32):
+        self.pwm = pwm
+        self.default_speed = default_speed  # градусів за секунду
+        self.step_interval = step_interval
+        self.settle_time = settle_time
+        self.current_angle: Optional[float] = None
+        self.moving = False
+
+        self._queue: 'queue.Queue[Optional[ServoMove]]' = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._abort = threading.Event()
+
+    @staticmethod
+    def angle_to_duty(angle: float) -> float:
+        """Конвертація кута в duty cycle"""
+        return 2 + (angle / 18)
+
+    def start(self):
+        """Запуск фонового потоку"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='servo-controller', daemon=True)
+        self._thread.start()
+        logger.info("Контролер сервоприводу запущено")
+
+    def stop(self, timeout: float = 2.0):
+        """Зупинка фонового потоку"""
+        if not self._thread:
+            return
+        self.clear()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def move(self, angle: float, speed: Optional[float] = None, easing: str = 'ease_in_out',
+             hold: float = 0.0) -> Dict[str, Any]:
+        """Додавання руху в чергу (повертається одразу)"""
+        if easing not in EASINGS:
+            return {'success': False, 'error': f'Невідоме згладжування: {easing}'}
+
+        angle = max(0.0, min(180.0, float(angle)))
+        speed = float(speed) if speed else self.default_speed
+        try:
+            self._queue.put_nowait(ServoMove(angle=angle, speed=speed, easing=easing, hold=hold))
+        except queue.Full:
+            logger.warning("Черга сервоприводу переповнена, рух відкинуто")
+            return {'success': False, 'error': 'Черга сервоприводу переповнена'}
+
+        return {'success': True, 'angle': angle, 'queued': self._queue.qsize()}
+
+    def clear(self):
+        """Очищення черги та переривання поточного руху"""
+        self._abort.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу контролера"""
+        return {
+            'angle': self.current_angle,
+            'moving': self.moving,
+            'queued': self._queue.qsize()
+        }
+
+    def _run(self):
+        """Головний цикл потоку"""
+        while True:
+            try:
+                move = self._queue.get(timeout=self.settle_time)
+            except queue.Empty:
+                if self.moving:
+                    # Зупинка PWM після завершення руху, щоб уникнути тремтіння
+                    self.pwm.ChangeDutyCycle(0)
+                    self.moving = False
+                continue
+
+            if move is None:
+                break
+
+            self._abort.clear()
+            self.moving = True
+            try:
+                self._execute(move)
+            except Exception as e:
+                logger.error(f"Помилка руху сервоприводу: {e}")
+
+        self.pwm.ChangeDutyCycle(0)
+        self.moving = False
+
+    def _execute(self, move: ServoMove):
+        """Виконання руху з інтерполяцією"""
+        start = self.current_angle
+        if start is None:
+            # Положення невідоме - переходимо одразу в ціль
+            self.pwm.ChangeDutyCycle(self.angle_to_duty(move.angle))
+            self.current_angle = move.angle
+            time.sleep(self.settle_time)
+        else:
+            ease = EASINGS[move.easing]
+            delta = move.angle - start
+            duration = abs(delta) / move.speed
+            steps = max(1, int(duration / self.step_interval))
+            started = time.monotonic()
+
+            for step in range(1, steps + 1):
+                if self._abort.is_set():
+                    return
+                angle = start + delta * ease(step / steps)
+                self.pwm.ChangeDutyCycle(self.angle_to_duty(angle))
+                self.current_angle = angle
+
+                # Вирівнювання по таймлайну, щоб не накопичувати затримку
+                delay = started + step * self.step_interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+        if move.hold > 0:
+            self._abort.wait(move.hold)
@@ -0,0 +1,131 @@
+"""
+Банк попередньо завантажених звуків з пулом каналів мікшера
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Політики витіснення голосу, коли всі канали зайняті
+STEAL_POLICIES = ('lowest_priority', 'oldest', 'none')
+
+
+class SoundBank:
+    """Звуки, декодовані в пам'ять при старті, та пул каналів з пріоритетами"""
+
+    def __init__(self, mixer, sound_files: Dict[str, str], channels: int = 8,
+                 priorities: Optional[Dict[str, int]] = None,
+                 voice_limits: Optional[Dict[str, int]] = None,
+                 steal_policy: str = 'lowest_priority'):
+        if steal_policy not in STEAL_POLICIES:
+            raise ValueError(f"Невідома політика витіснення: {steal_policy}")
+
+        self.mixer = mixer
+        self.sound_files = sound_files
+        self.priorities = priorities or {}
+        self.voice_limits = voice_limits or {}
+        self.steal_policy = steal_policy
+
+        self.sounds: Dict[str, Any] = {}
+        self.mixer.set_num_channels(channels)
+        self.channels: List[Any] = [self.mixer.Channel(i) for i in range(channels)]
+        # Що грає на кожному каналі: (назва звуку, пріоритет, час старту)
+        self._voices: List[Optional[tuple]] = [None] * channels
+        self._lock = threading.Lock()
+
+        self.stats = {'played': 0, 'stolen': 0, 'dropped': 0}
+
+    def load(self) -> int:
+        """Декодування всіх звукових файлів у пам'ять"""
+        for name, path in self.sound_files.items():
+            try:
+                self.sounds[name] = self.mixer.Sound(path)
+            except FileNotFoundError:
+                logger.warning(f"Звуковий файл не знайдено: {path}")
+            except Exception as e:
+                logger.error(f"Помилка завантаження звуку {path}: {e}")
+
+        logger.info(f"Завантажено {len(self.sounds)} звуків у {len(self.channels)} каналів")
+        return len(self.sounds)
+
+    def has_sound(self, name: str) -> bool:
+        """Перевірка наявності звуку в банку"""
+        return name in self.sounds
+
+    def play(self, name: str, priority: Optional[int] = None, volume: float = 1.0) -> Dict[str, Any]:
+        """Відтворення звуку на вільному або витісненому каналі"""
+        sound = self.sounds.get(name)
+        if sound is None:
+            return {'success': False, 'error': f'Звук не завантажено: {name}'}
+
+        if priority is None:
+            priority = self.priorities.get(name, 0)
+
+        with self._lock:
+            index = self._pick_channel(name, priority)
+            if index is None:
+                self.stats['dropped'] += 1
+                return {'success': False, 'error': 'Немає вільних каналів', 'sound': name}
+
+            channel = self.channels[index]
+            if channel.get_busy():
+                channel.stop()
+                self.stats['stolen'] += 1
+
+            channel.set_volume(volume)
+            channel.play(sound)
+            self._voices[index] = (name, priority, time.monotonic())
+            self.stats['played'] += 1
+
+        return {'success': True, 'sound': name, 'channel': index}
+
+    def stop_all(self):
+        """Зупинка всіх каналів"""
+        with self._lock:
+            for index, channel in enumerate(self.channels):
+                channel.stop()
+                self._voices[index] = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу банку"""
+        busy = sum(1 for channel in self.channels if channel.get_busy())
+        return {
+            'loaded': sorted(self.sounds),
+            'channels': len(self.channels),
+            'busy': busy,
+            'steal_policy': self.steal_policy,
+            **self.stats
+        }
+
+    def _pick_channel(self, name: str, priority: int) -> Optional[int]:
+        """Вибір каналу для нового голосу"""
+        active = []
+        for index, channel in enumerate(self.channels):
+            if channel.get_busy() and self._voices[index] is not None:
+                active.append((index, self._voices[index]))
+            else:
+                self._voices[index] = None
+
+        # Ліміт голосів на один звук - перезапуск найстарішого з них
+        limit = self.voice_limits.get(name)
+        if limit:
+            same = [(voice[2], index) for index, voice in active if voice[0] == name]
+            if len(same) >= limit:
+                return min(same)[1]
+
+        for index, voice in enumerate(self._voices):
+            if voice is None:
+                return index
+
+        if self.steal_policy == 'oldest':
+            return min(active, key=lambda item: item[1][2])[0]
+
+        if self.steal_policy == 'lowest_priority':
+            index, voice = min(active, key=lambda item: (item[1][1], item[1][2]))
+            if voice[1] <= priority:
+                return index
+
+        return None
@@ -7,72 +7,80 @@ TT-FizMehdia Raspberry Pi Controller
 import os
 import sys
 import time
+import signal
+import socket
 import json
 import logging
 import threading
+import importlib.util
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
+# Модулі, спільні з сервером (common/), лежать у корені репозиторію
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.startup_report import StartupReport
+
+# Облік часу старту: фази ініціалізації та імпорти нижче (вимикається STARTUP_TRACK_IMPORTS=False)
+startup = StartupReport()
+startup.track_imports()
+
 # Flask для веб-сервера
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 
-# GPIO для Raspberry Pi
-try:
-    import RPi.GPIO as GPIO
-    GPIO_AVAILABLE = True
-except ImportError:
-    GPIO_AVAILABLE = False
-    print("GPIO не доступний. Встановіть RPi.GPIO для роботи з Raspberry Pi")
+from servo_controller import ServoController
+from sound_bank import SoundBank
+from camera_service import CameraService
+from mqtt_ingest import MQTTGiftIngest
+from effects import EffectRegistry, GiftContext
+from gift_scheduler import GiftScheduler, MAX_SCHEDULE_DELAY
+from common.dedup import DedupIndex
+from backends import HardwareBackend, create_backend
+from server_link import ServerLink, SOCKETIO_AVAILABLE
+from common.logging_config import setup_logging
+from common.tracing import TraceStore, now_ns
+from common import profiler
 
-# Камера
-try:
-    from picamera import PiCamera
-    CAMERA_AVAILABLE = True
-except ImportError:
-    CAMERA_AVAILABLE = False
-    print("PiCamera не доступний. Встановіть picamera для роботи з камерою")
+# Production WSGI сервер (імпортується в run())
+WAITRESS_AVAILABLE = importlib.util.find_spec('waitress') is not None
 
-# Звук
+# Змінні середовища з .env (створюється setup_pi.sh)
 try:
-    import pygame
-    pygame.mixer.init()
-    SOUND_AVAILABLE = True
+    from dotenv import load_dotenv
+    load_dotenv()
 except ImportError:
-    SOUND_AVAILABLE = False
-    print("Pygame не доступний. Встановіть pygame для роботи зі звуком")
+    pass
 
-# LED стрічки
-try:
-    import neopixel
-    import board
-    NEOPIXEL_AVAILABLE = True
-except ImportError:
-    NEOPIXEL_AVAILABLE = False
-    print("Neopixel не доступний. Встановіть neopixel для роботи з LED стрічками")
-
-# MQTT для мережевого керування
-try:
-    import paho.mqtt.client as mqtt
-    MQTT_AVAILABLE = True
-except ImportError:
-    MQTT_AVAILABLE = False
-    print("MQTT не доступний. Встановіть paho-mqtt для мережевого керування")
+startup.stop_tracking()
 
-# Налаштування логування
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Налаштування логування: запис у фоновому потоці, файл (LOG_FILE) з ротацією
+setup_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FILE', 'logs/pi_controller.log'),
+              int(os.getenv('LOG_MAX_SIZE', 10485760)), int(os.getenv('LOG_BACKUP_COUNT', 5)),
+              os.getenv('LOG_FORMAT', 'json'), sampled_loggers=(f'{__name__}.commands',),
+              sample_rate=int(os.getenv('LOG_SAMPLE_RATE', 5)))
 logger = logging.getLogger(__name__)
+# Окремий логер для кожної команди сервера: на ньому діє вибірка
+command_logger = logging.getLogger(f'{__name__}.commands')
 
 class TTFizMehdiaPi:
     """Головний клас контролера Raspberry Pi"""
     
-    def __init__(self):
+    # Команди окремим компонентам; решта дій з подарунком запускає ефект подарунка
+    DIRECT_COMMANDS = ('neopixel_effect', 'set_color', 'led_rainbow', 'led_clear', 'servo_move',
+                       'sound_play', 'play_sound', 'camera_capture', 'take_photo')
+    
+    def __init__(self, backend: Optional[HardwareBackend] = None):
+        init_started = time.perf_counter()
         self.app = Flask(__name__)
         CORS(self.app)
         
+        # Апаратний бекенд: справжній Raspberry Pi або mock-драйвери
+        self.backend = backend or create_backend(os.getenv('HARDWARE_BACKEND', 'pi'))
+        self.gpio = self.backend.gpio
+        
         # Налаштування GPIO
         self.gpio_pins = {
             'led': 18,
@@ -82,6 +90,9 @@ class TTFizMehdiaPi:
             'motion_sensor': 17
         }
         
+        # Сервопривід керується фоновим потоком з чергою рухів
+        self.servo = None
+        
         # Налаштування LED стрічки
         self.led_strip = None
         self.led_count = 60
@@ -89,6 +100,7 @@ class TTFizMehdiaPi:
         
         # Налаштування камери
         self.camera = None
+        self.camera_service = None
         self.camera_resolution = (640, 480)
         
         # Налаштування звуку
@@ -102,46 +114,162 @@ class TTFizMehdiaPi:
             'unicorn': 'sounds/unicorn.wav'
         }
         
+        # Діагностика на вимогу (/api/admin/*): лише з ADMIN_TOKEN
+        self.admin_token = os.getenv('ADMIN_TOKEN', '')
+        self.profiler = profiler.SamplingProfiler()
+        self.gc_monitor = profiler.GcMonitor()
+        self.gc_monitor.install()
+        
+        # Вартість подарунків (ті самі значення, що в src/gift_catalog.json на сервері)
+        self.gift_values = {
+            'ROSE': 1,
+            'HEART': 5,
+            'STAR': 10,
+            'CROWN': 50,
+            'DIAMOND': 100,
+            'ROCKET': 200,
+            'UNICORN': 500
+        }
+        
+        # Пріоритети звуків (за вартістю подарунка) для витіснення каналів
+        self.sound_priorities = {name.lower(): value for name, value in self.gift_values.items()}
+        self.sound_channels = 8
+        self.sound_bank = None
+        
+        # Налаштування MQTT
+        self.mqtt_config = {
+            'enabled': os.getenv('MQTT_ENABLED', 'True').lower() == 'true',
+            'broker': os.getenv('MQTT_BROKER', 'localhost'),
+            'port': int(os.getenv('MQTT_PORT', 1883)),
+            'topic': os.getenv('MQTT_TOPIC', 'tt-fizmehdia/gift'),
+            'username': os.getenv('MQTT_USERNAME', ''),
+            'password': os.getenv('MQTT_PASSWORD', ''),
+            'client_id': os.getenv('MQTT_CLIENT_ID', 'tt-fizmehdia-pi'),
+            'qos': int(os.getenv('MQTT_QOS', 1)),
+            'workers': int(os.getenv('MQTT_WORKERS', 4))
+        }
+        self.mqtt_ingest = None
+        
+        # Постійний канал до центрального сервера (якщо задано SERVER_URL)
+        self.server_url = os.getenv('SERVER_URL', '')
+        self.device_id = os.getenv('DEVICE_ID', socket.gethostname())
+        self.server_link = None
+        
+        # Трасування подарунків: відрізки Pi повертаються серверу в підтвердженні та подією device_trace
+        self.tracer = TraceStore(
+            capacity=int(os.getenv('TRACE_CAPACITY', 500)),
+            source=self.device_id,
+            enabled=os.getenv('TRACE_ENABLED', 'True').lower() == 'true',
+            on_publish=self._publish_trace
+        )
+        
+        # Таблиця ефектів подарунків
+        self.effects_file = os.getenv(
+            'EFFECTS_FILE',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'effects.json')
+        )
+        self.effects = EffectRegistry(self, self.effects_file)
+        
+        # Вже прийняті event_id: повтори від MQTT, сервера чи клієнтів не запускають ефект вдруге
+        self.dedup = DedupIndex(
+            capacity=int(os.getenv('GIFT_DEDUP_SIZE', 4096)),
+            window=float(os.getenv('GIFT_DEDUP_WINDOW', 300))
+        )
+        
+        # Черга подарунків за вартістю; effect_cancel перериває поточний ефект
+        self.effect_cancel = threading.Event()
+        self.scheduler = GiftScheduler(
+            self.process_gift,
+            self.gift_values,
+            self.effect_cancel,
+            merge_threshold=int(os.getenv('GIFT_MERGE_BACKLOG', 10)),
+            max_backlog=int(os.getenv('GIFT_MAX_BACKLOG', 50)),
+            preempt_ratio=float(os.getenv('GIFT_PREEMPT_RATIO', 10)),
+            tracer=self.tracer
+        )
+        
         # Статус системи
         self.status = {
-            'gpio_available': GPIO_AVAILABLE,
-            'camera_available': CAMERA_AVAILABLE,
-            'sound_available': SOUND_AVAILABLE,
-            'neopixel_available': NEOPIXEL_AVAILABLE,
-            'mqtt_available': MQTT_AVAILABLE,
+            'backend': self.backend.name,
+            'gpio_available': self.backend.gpio_available,
+            'camera_available': self.backend.camera_available,
+            'sound_available': self.backend.sound_available,
+            'neopixel_available': self.backend.neopixel_available,
+            'mqtt_available': self.backend.mqtt_available,
             'connected': False,
             'last_gift': None,
             'gift_count': 0
         }
-        
-        # Ініціалізація компонентів
-        self.init_gpio()
-        self.init_led_strip()
-        self.init_camera()
-        self.init_mqtt()
+        # Останній подарунок: (тип, відправник, time.time())
+        self.last_gift: Optional[tuple] = None
+        
+        # Ініціалізація компонентів, потрібних для прийому подарунків
+        with startup.phase('gpio'):
+            self.init_gpio()
+        with startup.phase('led_strip'):
+            self.init_led_strip()
+        with startup.phase('effects'):
+            self.init_effects()
+        self.scheduler.start()
+        with startup.phase('mqtt'):
+            self.init_mqtt()
         self.setup_routes()
         
-        logger.info("TT-FizMehdia Raspberry Pi Controller ініціалізовано")
+        # Повільні компоненти (камера, звук, канал до сервера) - у фоні, API стартує без них
+        self.hardware_ready = threading.Event()
+        self._warmup_thread = threading.Thread(target=self._warm_up, name='hardware-warmup', daemon=True)
+        self._warmup_thread.start()
+        
+        # Налаштування production сервера
+        self.server = None
+        self.server_config = {
+            'threads': int(os.getenv('SERVER_THREADS', 8)),
+            'connection_limit': int(os.getenv('SERVER_CONNECTION_LIMIT', 100)),
+            # Скільки секунд тримати відкритим неактивне keep-alive з'єднання
+            'channel_timeout': int(os.getenv('SERVER_KEEPALIVE_TIMEOUT', 120))
+        }
+        
+        self.status['init_ms'] = round((time.perf_counter() - init_started) * 1000, 1)
+        logger.info(f"TT-FizMehdia Raspberry Pi Controller ініціалізовано за {self.status['init_ms']} мс")
+    
+    def _warm_up(self):
+        """Фонова ініціалізація компонентів, без яких API вже може працювати"""
+        try:
+            with startup.phase('server_link'):
+                self.init_server_link()
+            with startup.phase('sound'):
+                self.init_sound()
+            with startup.phase('camera'):
+                self.init_camera()
+        finally:
+            self.hardware_ready.set()
+            logger.info(f"Фонова ініціалізація завершена ({startup.elapsed_ms()} мс від старту)")
+    
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Очікування завершення фонової ініціалізації"""
+        return self.hardware_ready.wait(timeout)
     
     def init_gpio(self):
         """Ініціалізація GPIO"""
-        if not GPIO_AVAILABLE:
+        if not self.backend.gpio_available:
             return
         
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setwarnings(False)
+            self.gpio.setmode(self.gpio.BCM)
+            self.gpio.setwarnings(False)
             
             # Налаштування пінів
-            GPIO.setup(self.gpio_pins['led'], GPIO.OUT)
-            GPIO.setup(self.gpio_pins['buzzer'], GPIO.OUT)
-            GPIO.setup(self.gpio_pins['button'], GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.setup(self.gpio_pins['motion_sensor'], GPIO.IN)
+            self.gpio.setup(self.gpio_pins['led'], self.gpio.OUT)
+            self.gpio.setup(self.gpio_pins['buzzer'], self.gpio.OUT)
+            self.gpio.setup(self.gpio_pins['button'], self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+            self.gpio.setup(self.gpio_pins['motion_sensor'], self.gpio.IN)
             
             # PWM для сервоприводу
-            GPIO.setup(self.gpio_pins['servo'], GPIO.OUT)
-            self.servo_pwm = GPIO.PWM(self.gpio_pins['servo'], 50)
+            self.gpio.setup(self.gpio_pins['servo'], self.gpio.OUT)
+            self.servo_pwm = self.gpio.PWM(self.gpio_pins['servo'], 50)
             self.servo_pwm.start(0)
+            self.servo = ServoController(self.servo_pwm)
+            self.servo.start()
             
             logger.info("GPIO ініціалізовано успішно")
             
@@ -150,16 +278,11 @@ class TTFizMehdiaPi:
     
     def init_led_strip(self):
         """Ініціалізація LED стрічки"""
-        if not NEOPIXEL_AVAILABLE:
+        if not self.backend.neopixel_available:
             return
         
         try:
-            self.led_strip = neopixel.NeoPixel(
-                board.D18,  # GPIO пін
-                self.led_count,
-                brightness=self.led_brightness,
-                auto_write=False
-            )
+            self.led_strip = self.backend.create_led_strip(self.led_count, self.led_brightness)
             logger.info("LED стрічка ініціалізована успішно")
             
         except Exception as e:
@@ -167,37 +290,97 @@ class TTFizMehdiaPi:
     
     def init_camera(self):
         """Ініціалізація камери"""
-        if not CAMERA_AVAILABLE:
+        if not self.backend.camera_available:
             return
         
         try:
-            self.camera = PiCamera()
+            self.camera = self.backend.create_camera()
             self.camera.resolution = self.camera_resolution
             self.camera.framerate = 30
+            
+            # Безперервна зйомка в пам'ять, фото записуються фоновим потоком
+            self.camera_service = CameraService(self.camera)
+            self.camera_service.start()
             logger.info("Камера ініціалізована успішно")
             
         except Exception as e:
             logger.error(f"Помилка ініціалізації камери: {e}")
     
+    def init_sound(self):
+        """Ініціалізація банку звуків"""
+        if not self.backend.sound_available:
+            return
+        
+        try:
+            self.sound_bank = SoundBank(
+                self.backend.load_mixer(),
+                self.sound_files,
+                channels=self.sound_channels,
+                priorities=self.sound_priorities,
+                # Дешеві подарунки не повинні займати всі канали під час шторму
+                voice_limits={'rose': 2, 'heart': 2, 'star': 2}
+            )
+            self.sound_bank.load()
+            logger.info("Банк звуків ініціалізовано успішно")
+            
+        except Exception as e:
+            logger.error(f"Помилка ініціалізації звуку: {e}")
+    
+    def init_effects(self):
+        """Завантаження таблиці ефектів"""
+        self.effects.load()
+        # Зміни у файлі підхоплюються без перезапуску
+        self.effects.watch()
+    
     def init_mqtt(self):
         """Ініціалізація MQTT"""
-        if not MQTT_AVAILABLE:
+        if not self.backend.mqtt_available or not self.mqtt_config['enabled']:
             return
         
         try:
-            self.mqtt_client = mqtt.Client()
-            self.mqtt_client.on_connect = self.on_mqtt_connect
-            self.mqtt_client.on_message = self.on_mqtt_message
-            
-            # Підключення до брокера (якщо потрібно)
-            # self.mqtt_client.connect("localhost", 1883, 60)
-            # self.mqtt_client.loop_start()
+            self.mqtt_client = self.backend.create_mqtt_client(self.mqtt_config['client_id'])
+            self.mqtt_ingest = MQTTGiftIngest(
+                self.mqtt_client,
+                self.submit_gift,
+                topic=self.mqtt_config['topic'],
+                qos=self.mqtt_config['qos'],
+                workers=self.mqtt_config['workers']
+            )
+            self.mqtt_ingest.connect(
+                self.mqtt_config['broker'],
+                self.mqtt_config['port'],
+                username=self.mqtt_config['username'],
+                password=self.mqtt_config['password']
+            )
             
             logger.info("MQTT ініціалізовано успішно")
             
         except Exception as e:
             logger.error(f"Помилка ініціалізації MQTT: {e}")
     
+    def init_server_link(self):
+        """Підключення до центрального сервера через постійний канал"""
+        if not self.server_url:
+            return
+        if not SOCKETIO_AVAILABLE:
+            logger.warning("python-socketio не встановлено, постійний канал до сервера вимкнено")
+            return
+        
+        try:
+            self.server_link = ServerLink(
+                self.server_url,
+                self.device_id,
+                self.handle_command,
+                self.get_status,
+                capabilities={key: value for key, value in self.status.items() if key.endswith('_available')},
+                token=os.getenv('DEVICE_TOKEN', '')
+            )
+            self.server_link.start()
+            logger.info(f"Постійний канал до {self.server_url} ініціалізовано")
+            
+        except Exception as e:
+            logger.error(f"Помилка ініціалізації каналу до сервера: {e}")
+    
     def setup_routes(self):
         """Налаштування маршрутів Flask"""
         
@@ -207,17 +390,100 @@ class TTFizMehdiaPi:
         
         @self.app.route('/api/status')
         def get_status():
-            return jsonify(self.status)
+            return jsonify(self.get_status())
         
         @self.app.route('/api/gift', methods=['POST'])
         def handle_gift():
             data = request.get_json()
             gift_type = data.get('type', 'ROSE')
             sender = data.get('sender', 'Unknown')
+            event_id = data.get('event_id') or request.headers.get('Idempotency-Key')
             
-            result = self.process_gift(gift_type, sender)
+            result = self.submit_gift(gift_type, sender, data.get('value'), event_id=event_id,
+                                      trace_id=data.get('trace_id'))
+            return jsonify(result)
+        
+        @self.app.route('/api/effects', methods=['GET'])
+        def get_effects():
+            return jsonify({'file': self.effects_file, 'effects': self.effects.describe()})
+        
+        @self.app.route('/api/effects/reload', methods=['POST'])
+        def reload_effects():
+            success = self.effects.load()
+            return jsonify({'success': success, 'count': len(self.effects.effects)})
+        
+        @self.app.route('/api/command', methods=['POST'])
+        def handle_command():
+            data = request.get_json()
+            result = self.handle_command(data.get('action'), data.get('params', {}), data.get('gift'),
+                                         data.get('execute_at'), data.get('trace_id'))
             return jsonify(result)
         
+        @self.app.route('/api/traces', methods=['GET'])
+        def get_traces():
+            limit = min(request.args.get('limit', 50, type=int), 500)
+            return jsonify({'traces': self.tracer.recent(limit, request.args.get('type'))})
+        
+        @self.app.route('/api/traces/export', methods=['GET'])
+        def export_traces():
+            try:
+                return jsonify(self.tracer.export(self.tracer.recent(self.tracer.capacity),
+                                                  request.args.get('format', 'json')))
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        
+        @self.app.route('/api/traces/<trace_id>', methods=['GET'])
+        def get_trace(trace_id):
+            trace = self.tracer.get(trace_id)
+            if trace is None:
+                return jsonify({'success': False, 'error': 'Трасування не знайдено'}), 404
+            return jsonify(trace)
+        
+        @self.app.route('/api/admin/profile', methods=['POST'])
+        def start_profile():
+            data = request.get_json(silent=True) or {}
+            try:
+                result = self.profiler.start(data.get('duration', 10), data.get('interval', 0.01),
+                                             bool(data.get('idle', False)))
+                return jsonify({'success': True, **result}), 202
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 409
+        
+        @self.app.route('/api/admin/profile', methods=['GET'])
+        def get_profile():
+            if request.args.get('format') == 'folded':
+                return self.app.response_class(self.profiler.folded(), mimetype='text/plain')
+            return jsonify(self.profiler.report(min(request.args.get('limit', 30, type=int), 200)))
+        
+        @self.app.route('/api/admin/profile', methods=['DELETE'])
+        def stop_profile():
+            self.profiler.stop()
+            return jsonify({'success': True, **self.profiler.report(0)})
+        
+        @self.app.route('/api/admin/threads', methods=['GET'])
+        def get_threads():
+            return jsonify({'threads': profiler.dump_threads()})
+        
+        @self.app.route('/api/admin/memory', methods=['GET'])
+        def get_memory():
+            return jsonify(profiler.memory_stats(self.gc_monitor, request.args.get('top', 20, type=int)))
+        
+        @self.app.route('/api/admin/memory/tracemalloc', methods=['POST'])
+        def toggle_tracemalloc():
+            data = request.get_json(silent=True) or {}
+            return jsonify({'success': True, 'tracing': profiler.set_tracemalloc(bool(data.get('enabled', True)))})
+        
+        @self.app.before_request
+        def check_admin():
+            # Діагностичні ендпоінти - лише з адмін-токеном
+            if not request.path.startswith('/api/admin/'):
+                return None
+            if not self.admin_token:
+                return jsonify({'success': False, 'error': 'Діагностику вимкнено: ADMIN_TOKEN не задано'}), 403
+            if not profiler.is_authorized(request.headers, self.admin_token):
+                return jsonify({'success': False, 'error': 'Потрібен адмін-токен'}), 401
+            return None
+        
         @self.app.route('/api/led', methods=['POST'])
         def control_led():
             data = request.get_json()
@@ -231,8 +497,10 @@ class TTFizMehdiaPi:
         def control_servo():
             data = request.get_json()
             angle = data.get('angle', 90)
+            speed = data.get('speed')
+            easing = data.get('easing', 'ease_in_out')
             
-            result = self.control_servo_motor(angle)
+            result = self.control_servo_motor(angle, speed=speed, easing=easing)
             return jsonify(result)
         
         @self.app.route('/api/sound', methods=['POST'])
@@ -247,8 +515,10 @@ class TTFizMehdiaPi:
         def take_photo():
             data = request.get_json()
             filename = data.get('filename', f'gift_photo_{int(time.time())}.jpg')
+            pre_roll = float(data.get('pre_roll', 0))
+            post_roll = float(data.get('post_roll', 0))
             
-            result = self.take_photo(filename)
+            result = self.take_photo(filename, pre_roll=pre_roll, post_roll=post_roll)
             return jsonify(result)
         
         @self.app.route('/api/test', methods=['POST'])
@@ -256,79 +526,129 @@ class TTFizMehdiaPi:
             result = self.test_all_components()
             return jsonify(result)
     
-    def process_gift(self, gift_type: str, sender: str) -> Dict[str, Any]:
-        """Обробка подарунка"""
-        logger.info(f"Отримано подарунок {gift_type} від {sender}")
-        
-        # Оновлення статусу
-        self.status['last_gift'] = {
-            'type': gift_type,
-            'sender': sender,
-            'timestamp': datetime.now().isoformat()
-        }
+    def get_status(self) -> Dict[str, Any]:
+        """Статус контролера та його компонентів"""
+        status = dict(self.status)
+        if self.servo:
+            status['servo'] = self.servo.get_status()
+        if self.sound_bank:
+            status['sound'] = self.sound_bank.get_status()
+        if self.camera_service:
+            status['camera'] = self.camera_service.get_status()
+        if self.mqtt_ingest:
+            status['mqtt'] = self.mqtt_ingest.get_status()
+        if self.server_link:
+            status['server_link'] = self.server_link.get_status()
+        if self.last_gift:
+            gift_type, sender, received_at = self.last_gift
+            status['last_gift'] = {
+                'type': gift_type,
+                'sender': sender,
+                'timestamp': datetime.fromtimestamp(received_at).isoformat()
+            }
+        status['scheduler'] = self.scheduler.get_status()
+        status['dedup'] = self.dedup.get_status()
+        status['tracing'] = self.tracer.get_status()
+        status['startup'] = startup.get_report()
+        return status
+    
+    def handle_command(self, action: str, params: Dict[str, Any],
+                       gift: Optional[Dict[str, Any]] = None,
+                       execute_at: Optional[float] = None, trace_id: Optional[str] = None) -> Dict[str, Any]:
+        """Виконання команди від сервера (HTTP /api/command або постійний канал)
+
+        execute_at - момент запуску за годинником Pi, щоб ефекти на кількох пристроях стартували разом.
+        Для команди з trace_id відповідь містить spans - відрізки Pi, завершені до відповіді.
+        """
+        command_logger.debug("Команда %s %s (подарунок: %s)", action, params, gift)
+        trace_id = trace_id or (gift or {}).get('trace_id')
+        started = now_ns()
+        if trace_id:
+            gift = gift or {}
+            self.tracer.begin({'event_id': gift.get('event_id'), 'type': gift.get('type'),
+                               'sender': gift.get('sender')}, trace_id=trace_id, started_ns=started)
+        result = self._execute_command(action, params, gift, execute_at, trace_id)
+        if trace_id:
+            self.tracer.record(trace_id, 'pi_handle', started, action=action)
+            result['spans'] = self.tracer.take(trace_id)
+        return result
+    
+    def _execute_command(self, action: str, params: Dict[str, Any], gift: Optional[Dict[str, Any]],
+                         execute_at: Optional[float], trace_id: Optional[str]) -> Dict[str, Any]:
+        # Ефекти подарунків чекають свого моменту в планувальнику
+        if gift and gift.get('type') and action not in self.DIRECT_COMMANDS:
+            return self.submit_gift(gift['type'], gift.get('sender', 'Unknown'), gift.get('value'), execute_at,
+                                    gift.get('event_id'), trace_id)
+        
+        if execute_at is not None:
+            delay = min(execute_at - time.time(), MAX_SCHEDULE_DELAY)
+            if delay > 0:
+                time.sleep(delay)
+        
+        if action == 'neopixel_effect':
+            return self.control_led_strip(params.get('effect', 'set_color'), params)
+        
+        if action == 'set_color':
+            return self.control_led_strip('set_color', params)
+        
+        if action == 'led_rainbow':
+            return self.control_led_strip('rainbow', params)
+        
+        if action == 'led_clear':
+            return self.control_led_strip('set_color', {'color': '#000000', 'brightness': 0})
+        
+        if action == 'servo_move':
+            return self.control_servo_motor(params.get('angle', 90), speed=params.get('speed'),
+                                            easing=params.get('easing', 'ease_in_out'))
+        
+        if action in ('sound_play', 'play_sound'):
+            return self.play_sound_effect(params.get('sound', 'beep'))
+        
+        if action in ('camera_capture', 'take_photo'):
+            return self.take_photo(params.get('filename', f'gift_photo_{int(time.time())}.jpg'))
+        
+        return {'success': False, 'error': f'Невідома команда: {action}'}
+    
+    def submit_gift(self, gift_type: str, sender: str, value: Optional[int] = None,
+                    execute_at: Optional[float] = None, event_id: Optional[str] = None,
+                    trace_id: Optional[str] = None) -> Dict[str, Any]:
+        """Постановка подарунка в чергу планувальника (повтор event_id ігнорується)
+
+        Подарунки без trace_id від сервера (MQTT, /api/gift) отримують власне трасування тут.
+        """
+        if self.dedup.seen(event_id):
+            logger.info("Повтор подарунка %s (%s) проігноровано", gift_type, event_id)
+            return {'success': True, 'duplicate': True, 'event_id': event_id}
+        if trace_id is None:
+            trace_id = self.tracer.begin({'event_id': event_id, 'type': gift_type, 'sender': sender})
+        return self.scheduler.submit(gift_type, sender, value, execute_at, trace_id)
+    
+    def _publish_trace(self, trace_id: str, spans: list):
+        """Відрізки, завершені після відповіді серверу, - через постійний канал"""
+        if self.server_link:
+            self.server_link.send_trace(trace_id, spans)
+    
+    def process_gift(self, gift_type: str, sender: str, received_at: Optional[float] = None) -> Dict[str, Any]:
+        """Обробка подарунка (received_at - час надходження в чергу планувальника)"""
+        logger.info("Отримано подарунок %s від %s", gift_type, sender)
+        if received_at is None:
+            received_at = time.time()
+        
+        # Оновлення статусу (словник для API будується лише в get_status)
+        self.last_gift = (gift_type, sender, received_at)
         self.status['gift_count'] += 1
         
-        # Виконання дій для подарунка
+        # Виконання скомпільованого ефекту для подарунка
         result = {'success': True, 'actions': []}
         
         try:
-            if gift_type == 'ROSE':
-                # Роза - м'яке рожеве світло
-                self.control_led_strip('set_color', {'color': '#ff69b4', 'brightness': 0.3})
-                self.play_sound_effect('rose')
-                result['actions'].append('led_color_rose')
-                result['actions'].append('sound_rose')
-                
-            elif gift_type == 'HEART':
-                # Серце - пульсуюче червоне світло
-                self.control_led_strip('pulse', {'color': '#ff0000', 'duration': 3})
-                self.control_servo_motor(45)
-                result['actions'].append('led_pulse_red')
-                result['actions'].append('servo_move')
-                
-            elif gift_type == 'STAR':
-                # Зірка - блимаюче золоте світло
-                self.control_led_strip('twinkle', {'color': '#ffd700', 'duration': 2})
-                self.play_sound_effect('star')
-                result['actions'].append('led_twinkle_gold')
-                result['actions'].append('sound_star')
-                
-            elif gift_type == 'CROWN':
-                # Корона - помаранчеве світло з ефектом
-                self.control_led_strip('rainbow', {'duration': 3})
-                self.control_servo_motor(180)
-                result['actions'].append('led_rainbow')
-                result['actions'].append('servo_full_rotation')
-                
-            elif gift_type == 'DIAMOND':
-                # Діамант - яскраве блакитне світло
-                self.control_led_strip('set_color', {'color': '#00bfff', 'brightness': 1.0})
-                self.take_photo(f'diamond_gift_{int(time.time())}.jpg')
-                result['actions'].append('led_bright_blue')
-                result['actions'].append('photo_taken')
-                
-            elif gift_type == 'ROCKET':
-                # Ракета - червоно-помаранчевий ефект з рухом
-                self.control_led_strip('chase', {'color': '#ff4500', 'duration': 2})
-                self.control_servo_motor(0)
-                time.sleep(0.5)
-                self.control_servo_motor(180)
-                result['actions'].append('led_chase_orange')
-                result['actions'].append('servo_rocket_effect')
-                
-            elif gift_type == 'UNICORN':
-                # Єдиноріг - фіолетовий з радужним ефектом
-                self.control_led_strip('unicorn', {'duration': 5})
-                self.play_sound_effect('unicorn')
-                self.take_photo(f'unicorn_gift_{int(time.time())}.jpg')
-                result['actions'].append('led_unicorn_effect')
-                result['actions'].append('sound_unicorn')
-                result['actions'].append('photo_unicorn')
-            
+            effect = self.effects.get(gift_type)
+            if effect:
+                context = GiftContext(gift_type=gift_type, sender=sender, received_at=received_at)
+                result['actions'] = effect.run(context, cancel=self.effect_cancel)
             else:
-                # Невідомий тип подарунка
-                self.control_led_strip('set_color', {'color': '#ffffff', 'brightness': 0.5})
-                result['actions'].append('led_default_white')
+                result['success'] = False
+                result['error'] = f'Ефект для подарунка {gift_type} не налаштовано'
             
         except Exception as e:
             logger.error(f"Помилка обробки подарунка: {e}")
@@ -373,7 +693,8 @@ class TTFizMehdiaPi:
                         for i in range(self.led_count):
                             self.led_strip[i] = color_rgb
                         self.led_strip.show()
-                        time.sleep(0.1)
+                        if self.effect_cancel.wait(0.1):
+                            return {'success': True, 'action': 'pulse', 'interrupted': True}
                 
                 return {'success': True, 'action': 'pulse', 'color': color}
             
@@ -392,12 +713,14 @@ class TTFizMehdiaPi:
                         else:
                             self.led_strip[i] = (0, 0, 0)
                     self.led_strip.show()
-                    time.sleep(0.2)
+                    if self.effect_cancel.wait(0.2):
+                        return {'success': True, 'action': 'twinkle', 'interrupted': True}
                     
                     # Всі LED вимкнені
                     self.led_strip.fill((0, 0, 0))
                     self.led_strip.show()
-                    time.sleep(0.2)
+                    if self.effect_cancel.wait(0.2):
+                        return {'success': True, 'action': 'twinkle', 'interrupted': True}
                 
                 return {'success': True, 'action': 'twinkle', 'color': color}
             
@@ -411,7 +734,8 @@ class TTFizMehdiaPi:
                         color_rgb = self.hsv_to_rgb(hue, 1.0, 1.0)
                         self.led_strip[i] = color_rgb
                     self.led_strip.show()
-                    time.sleep(0.1)
+                    if self.effect_cancel.wait(0.1):
+                        return {'success': True, 'action': 'rainbow', 'interrupted': True}
                 
                 return {'success': True, 'action': 'rainbow'}
             
@@ -431,7 +755,8 @@ class TTFizMehdiaPi:
                         if pos < self.led_count - 1:
                             self.led_strip[pos+1] = tuple(int(c * 0.5) for c in color_rgb)
                         self.led_strip.show()
-                        time.sleep(0.05)
+                        if self.effect_cancel.wait(0.05):
+                            return {'success': True, 'action': 'chase', 'interrupted': True}
                 
                 return {'success': True, 'action': 'chase', 'color': color}
             
@@ -446,7 +771,8 @@ class TTFizMehdiaPi:
                         color_rgb = self.hsv_to_rgb(hue, 0.8, 1.0)
                         self.led_strip[i] = color_rgb
                     self.led_strip.show()
-                    time.sleep(0.1)
+                    if self.effect_cancel.wait(0.1):
+                        return {'success': True, 'action': 'unicorn', 'interrupted': True}
                 
                 return {'success': True, 'action': 'unicorn'}
             
@@ -457,19 +783,14 @@ class TTFizMehdiaPi:
             logger.error(f"Помилка керування LED стрічкою: {e}")
             return {'success': False, 'error': str(e)}
     
-    def control_servo_motor(self, angle: int) -> Dict[str, Any]:
-        """Керування сервоприводом"""
-        if not GPIO_AVAILABLE:
+    def control_servo_motor(self, angle: int, speed: Optional[float] = None,
+                            easing: str = 'ease_in_out') -> Dict[str, Any]:
+        """Керування сервоприводом (рух ставиться в чергу фонового потоку)"""
+        if not self.backend.gpio_available or not self.servo:
             return {'success': False, 'error': 'GPIO не доступний'}
         
         try:
-            # Конвертація кута в duty cycle
-            duty = 2 + (angle / 18)
-            self.servo_pwm.ChangeDutyCycle(duty)
-            time.sleep(0.5)
-            self.servo_pwm.ChangeDutyCycle(0)  # Зупинка PWM
-            
-            return {'success': True, 'angle': angle}
+            return self.servo.move(angle, speed=speed, easing=easing)
             
         except Exception as e:
             logger.error(f"Помилка керування сервоприводом: {e}")
@@ -477,18 +798,15 @@ class TTFizMehdiaPi:
     
     def play_sound_effect(self, sound_type: str) -> Dict[str, Any]:
         """Відтворення звукового ефекту"""
-        if not SOUND_AVAILABLE:
+        if not self.backend.sound_available:
             return {'success': False, 'error': 'Звук не доступний'}
         
         try:
-            sound_file = self.sound_files.get(sound_type)
-            if sound_file and os.path.exists(sound_file):
-                pygame.mixer.music.load(sound_file)
-                pygame.mixer.music.play()
-                return {'success': True, 'sound': sound_type}
+            if self.sound_bank and self.sound_bank.has_sound(sound_type):
+                return self.sound_bank.play(sound_type)
             else:
                 # Простий звук через GPIO бузер
-                if GPIO_AVAILABLE:
+                if self.backend.gpio_available:
                     self.buzzer_beep()
                 return {'success': True, 'sound': 'beep'}
                 
@@ -498,25 +816,29 @@ class TTFizMehdiaPi:
     
     def buzzer_beep(self):
         """Простий звук через бузер"""
-        if not GPIO_AVAILABLE:
+        if not self.backend.gpio_available:
             return
         
         try:
             # Простий beep
             for _ in range(3):
-                GPIO.output(self.gpio_pins['buzzer'], GPIO.HIGH)
+                self.gpio.output(self.gpio_pins['buzzer'], self.gpio.HIGH)
                 time.sleep(0.1)
-                GPIO.output(self.gpio_pins['buzzer'], GPIO.LOW)
+                self.gpio.output(self.gpio_pins['buzzer'], self.gpio.LOW)
                 time.sleep(0.1)
                 
         except Exception as e:
             logger.error(f"Помилка бузера: {e}")
     
-    def take_photo(self, filename: str) -> Dict[str, Any]:
-        """Зйомка фото"""
+    def take_photo(self, filename: str, timestamp: Optional[float] = None,
+                   pre_roll: float = 0.0, post_roll: float = 0.0) -> Dict[str, Any]:
+        """Зйомка фото (кадр з буфера найближчий до timestamp)"""
         if not self.camera:
             return {'success': False, 'error': 'Камера не доступна'}
         
+        if self.camera_service:
+            return self.camera_service.snapshot(filename, timestamp, pre_roll, post_roll)
+        
         try:
             photo_path = f'photos/{filename}'
             os.makedirs('photos', exist_ok=True)
@@ -545,7 +867,7 @@ class TTFizMehdiaPi:
             results['led'] = {'success': False, 'error': 'LED стрічка не доступна'}
         
         # Тест сервоприводу
-        if GPIO_AVAILABLE:
+        if self.backend.gpio_available:
             try:
                 self.control_servo_motor(90)
                 results['servo'] = {'success': True, 'message': 'Сервопривід працює'}
@@ -555,7 +877,7 @@ class TTFizMehdiaPi:
             results['servo'] = {'success': False, 'error': 'GPIO не доступний'}
         
         # Тест звуку
-        if SOUND_AVAILABLE:
+        if self.backend.sound_available:
             try:
                 self.play_sound_effect('beep')
                 results['sound'] = {'success': True, 'message': 'Звук працює'}
@@ -587,46 +909,85 @@ class TTFizMehdiaPi:
         r, g, b = colorsys.hsv_to_rgb(h/360, s, v)
         return (int(r*255), int(g*255), int(b*255))
     
-    def on_mqtt_connect(self, client, userdata, flags, rc):
-        """Callback для MQTT підключення"""
-        logger.info(f"MQTT підключено з кодом {rc}")
-        client.subscribe("tt-fizmehdia/gift")
-    
-    def on_mqtt_message(self, client, userdata, msg):
-        """Callback для MQTT повідомлень"""
-        try:
-            data = json.loads(msg.payload.decode())
-            gift_type = data.get('type')
-            sender = data.get('sender')
-            
-            if gift_type:
-                self.process_gift(gift_type, sender)
-                
-        except Exception as e:
-            logger.error(f"Помилка обробки MQTT повідомлення: {e}")
-    
     def run(self, host='0.0.0.0', port=5001, debug=False):
         """Запуск сервера"""
         logger.info(f"Запуск TT-FizMehdia Raspberry Pi Controller на {host}:{port}")
-        self.app.run(host=host, port=port, debug=debug)
+        
+        if debug or not WAITRESS_AVAILABLE:
+            if not debug:
+                logger.warning("waitress не встановлено, використовується сервер розробки Flask")
+            # Сервер розробки відкриває порт усередині app.run
+            threading.Thread(target=startup.mark_ready_when_listening, args=(host, port),
+                             name='startup-ready', daemon=True).start()
+            self.app.run(host=host, port=port, debug=debug, use_reloader=False)
+            return
+        
+        from waitress import create_server
+        
+        # Пул потоків фіксованого розміру та keep-alive з'єднання
+        self.server = create_server(
+            self.app,
+            host=host,
+            port=port,
+            threads=self.server_config['threads'],
+            connection_limit=self.server_config['connection_limit'],
+            channel_timeout=self.server_config['channel_timeout'],
+            ident='tt-fizmehdia-pi'
+        )
+        # create_server вже відкрив порт
+        logger.info(f"Сервер waitress слухає {host}:{port} ({self.server_config['threads']} потоків)")
+        startup.mark_ready()
+        self.server.run()
     
     def cleanup(self):
         """Очищення ресурсів"""
-        if GPIO_AVAILABLE:
-            GPIO.cleanup()
+        # Камера та звук могли ще ініціалізуватися у фоні
+        self.wait_ready(5)
+        
+        if self.server_link:
+            self.server_link.stop()
+        
+        if self.server:
+            self.server.close()
+            self.server = None
+        
+        self.effects.stop()
+        self.scheduler.stop()
+        
+        if self.servo:
+            self.servo.stop()
+        
+        if self.backend.gpio_available:
+            self.gpio.cleanup()
+        
+        if self.camera_service:
+            self.camera_service.stop()
         
         if self.camera:
             self.camera.close()
         
-        if MQTT_AVAILABLE and hasattr(self, 'mqtt_client'):
-            self.mqtt_client.disconnect()
+        if self.sound_bank:
+            self.sound_bank.stop_all()
+        
+        if self.mqtt_ingest:
+            self.mqtt_ingest.stop()
         
         logger.info("Ресурси очищено")
 
+def _handle_sigterm(signum, frame):
+    """Зупинка через systemd (SIGTERM) так само, як через Ctrl+C"""
+    raise KeyboardInterrupt
+
+
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, _handle_sigterm)
     try:
         controller = TTFizMehdiaPi()
-        controller.run(debug=True)
+        controller.run(
+            host=os.getenv('HOST', '0.0.0.0'),
+            port=int(os.getenv('PORT', 5001)),
+            debug=os.getenv('DEBUG', 'False').lower() == 'true'
+        )
     except KeyboardInterrupt:
         logger.info("Зупинка контролера...")
     finally:
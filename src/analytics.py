@@ -0,0 +1,219 @@
+"""
+Аналітика подарунків у реальному часі: рейтинги відправників і типів подарунків за вікнами часу
+"""
+
+import time
+import heapq
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.gift_event import GiftEvent, wall_time
+
+# Ключ, під яким рахуються нові відправники, коли вікно вже тримає max_keys ключів
+OTHER_KEY = '__other__'
+
+
+def coins_of(item: Tuple[str, List[int]]) -> Tuple[int, int]:
+    """Порядок рейтингу: монети, потім кількість подарунків"""
+    return item[1][1], item[1][0]
+
+
+class TumblingWindow:
+    """Суми за поточний календарний період (хвилина, година), що обнуляються на його межі
+
+    Значення лише зростають, тож лідер оновлюється за O(1) при кожному додаванні.
+    """
+
+    def __init__(self, period: float, max_keys: int = 10000):
+        self.period = period
+        self.max_keys = max_keys
+        self.epoch = 0
+        self.totals: Dict[str, List[int]] = {}
+        self.leader: Optional[str] = None
+        # Результат попереднього періоду: (початок періоду, лідер, його [подарунки, монети])
+        self.previous: Optional[Tuple[float, Optional[str], Optional[List[int]]]] = None
+
+    def add(self, key: str, gifts: int, coins: int, now: float):
+        self._advance(now)
+        stats = self.totals.get(key)
+        if stats is None:
+            if len(self.totals) >= self.max_keys:
+                key = OTHER_KEY
+            stats = self.totals.setdefault(key, [0, 0])
+        stats[0] += gifts
+        stats[1] += coins
+
+        leader = self.totals.get(self.leader)
+        if leader is None or (stats[1], stats[0]) > (leader[1], leader[0]):
+            self.leader = key
+
+    def get_leader(self, now: float) -> Optional[Tuple[str, List[int]]]:
+        self._advance(now)
+        if self.leader is None:
+            return None
+        return self.leader, self.totals[self.leader]
+
+    def top(self, limit: int, now: float) -> List[Tuple[str, List[int]]]:
+        self._advance(now)
+        return heapq.nlargest(limit, self.totals.items(), key=coins_of)
+
+    def _advance(self, now: float):
+        epoch = int(now // self.period)
+        # Запізнілі події (об'єднані подарунки) зараховуються до поточного періоду
+        if epoch <= self.epoch:
+            return
+        if epoch == self.epoch + 1 and self.totals:
+            self.previous = (self.epoch * self.period, self.leader, self.totals.get(self.leader))
+        else:
+            self.previous = None
+        self.epoch = epoch
+        self.totals = {}
+        self.leader = None
+
+
+class SlidingWindow:
+    """Суми за останні span секунд: кільце з buckets кошиків по span / buckets секунд
+
+    Додавання змінює лише поточний кошик і загальні суми; кошик, що виходить із вікна,
+    віднімається від сум цілком. Пам'ять обмежена кількістю кошиків та max_keys.
+    """
+
+    def __init__(self, span: float, buckets: int = 60, max_keys: int = 10000):
+        self.span = span
+        self.buckets = buckets
+        self.width = span / buckets
+        self.max_keys = max_keys
+        self.epoch = 0
+        self.ring: List[Dict[str, List[int]]] = [{} for _ in range(buckets)]
+        self.totals: Dict[str, List[int]] = {}
+        self.leader: Optional[str] = None
+        # Після виходу кошика з вікна лідер визначається заново при першому запиті
+        self._leader_stale = False
+
+    def add(self, key: str, gifts: int, coins: int, now: float):
+        self._advance(now)
+        stats = self.totals.get(key)
+        if stats is None:
+            if len(self.totals) >= self.max_keys:
+                key = OTHER_KEY
+            stats = self.totals.setdefault(key, [0, 0])
+        stats[0] += gifts
+        stats[1] += coins
+
+        bucket = self.ring[self.epoch % self.buckets].setdefault(key, [0, 0])
+        bucket[0] += gifts
+        bucket[1] += coins
+
+        if not self._leader_stale:
+            leader = self.totals.get(self.leader)
+            if leader is None or (stats[1], stats[0]) > (leader[1], leader[0]):
+                self.leader = key
+
+    def get_leader(self, now: float) -> Optional[Tuple[str, List[int]]]:
+        self._advance(now)
+        if self._leader_stale:
+            self.leader = max(self.totals.items(), key=coins_of)[0] if self.totals else None
+            self._leader_stale = False
+        if self.leader is None:
+            return None
+        return self.leader, self.totals[self.leader]
+
+    def top(self, limit: int, now: float) -> List[Tuple[str, List[int]]]:
+        self._advance(now)
+        return heapq.nlargest(limit, self.totals.items(), key=coins_of)
+
+    def _advance(self, now: float):
+        epoch = int(now // self.width)
+        if epoch <= self.epoch:
+            return
+        # Кошики між старим і новим положенням кільця містять дані, що вийшли з вікна
+        for expired in range(max(self.epoch + 1, epoch - self.buckets + 1), epoch + 1):
+            bucket = self.ring[expired % self.buckets]
+            if not bucket:
+                continue
+            for key, (gifts, coins) in bucket.items():
+                stats = self.totals[key]
+                stats[0] -= gifts
+                stats[1] -= coins
+                if stats[0] <= 0:
+                    del self.totals[key]
+            bucket.clear()
+            self._leader_stale = True
+        self.epoch = epoch
+
+
+class GiftAnalytics:
+    """Рейтинги відправників і типів подарунків за кількома вікнами часу
+
+    Кожен подарунок оновлює всі вікна за сталий час; історія подарунків не зберігається.
+    """
+
+    DIMENSIONS = ('senders', 'gifts')
+    # Календарні хвилина й година та ковзні останні 60 секунд і 60 хвилин
+    WINDOWS = {
+        'minute': (TumblingWindow, (60,)),
+        'hour': (TumblingWindow, (3600,)),
+        'last_1m': (SlidingWindow, (60, 60)),
+        'last_1h': (SlidingWindow, (3600, 60)),
+    }
+
+    def __init__(self, max_keys: int = 10000):
+        self._counters = {(window, dimension): window_class(*args, max_keys=max_keys)
+                          for window, (window_class, args) in self.WINDOWS.items()
+                          for dimension in self.DIMENSIONS}
+        self._lock = threading.Lock()
+        self.totals = {'gifts': 0, 'coins': 0}
+        # Номер зміни: розсилка дашбордам лише коли щось додалося
+        self.version = 0
+
+    def record(self, gift_event: GiftEvent):
+        """Облік подарунка (з process_gift_async)"""
+        now = wall_time(gift_event.received_ns)
+        gifts = gift_event.count
+        coins = gift_event.value * gift_event.count
+        with self._lock:
+            for (_, dimension), counter in self._counters.items():
+                counter.add(gift_event.sender if dimension == 'senders' else gift_event.type, gifts, coins, now)
+            self.totals['gifts'] += gifts
+            self.totals['coins'] += coins
+            self.version += 1
+
+    def leader(self, window: str = 'minute', dimension: str = 'senders',
+               now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Лідер вікна без перебору історії (наприклад, найщедріший відправник цієї хвилини)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._counters[(window, dimension)].get_leader(now)
+        return self._entry(entry) if entry else None
+
+    def top(self, window: str = 'minute', dimension: str = 'senders', limit: int = 10,
+            now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Перші limit ключів вікна за монетами"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = self._counters[(window, dimension)].top(limit, now)
+        return [self._entry(entry) for entry in entries]
+
+    def snapshot(self, limit: int = 10, windows: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Усі рейтинги для API та дашбордів"""
+        now = time.time()
+        result = {}
+        for window in windows or self.WINDOWS:
+            result[window] = {dimension: self.top(window, dimension, limit, now) for dimension in self.DIMENSIONS}
+            result[window]['leader'] = self.leader(window, 'senders', now)
+
+        with self._lock:
+            previous = self._counters[('minute', 'senders')].previous
+        return {
+            'windows': result,
+            'top_gifter_minute': self.leader('minute', now=now),
+            'previous_minute': self._entry(previous[1:]) if previous and previous[1] else None,
+            'totals': dict(self.totals),
+            'version': self.version
+        }
+
+    @staticmethod
+    def _entry(entry: Tuple[str, List[int]]) -> Dict[str, Any]:
+        key, (gifts, coins) = entry
+        return {'name': key, 'gifts': gifts, 'coins': coins}
+
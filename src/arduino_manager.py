@@ -2,35 +2,54 @@
 Менеджер для роботи з Arduino пристроями
 """
 
-import serial
-import serial.tools.list_ports
 import time
 import logging
-from typing import List, Optional, Dict, Any
-from dataclasses import dataclass
+import threading
+from typing import List, Optional, Dict, Any, TYPE_CHECKING
+from dataclasses import dataclass, field
+
+# pyserial імпортується при першій роботі з портами
+if TYPE_CHECKING:
+    import serial
+
+from src.clock_sync import ClockSync
+from common.tracing import TraceStore, now_ns
 
 logger = logging.getLogger(__name__)
+# Окремий логер для кожної команди: на ньому діє вибірка (common/logging_config.py)
+command_logger = logging.getLogger(f'{__name__}.commands')
 
 @dataclass
 class ArduinoDevice:
     """Клас для представлення Arduino пристрою"""
     port: str
     baudrate: int
-    connection: Optional[serial.Serial] = None
+    connection: Optional['serial.Serial'] = None
     last_seen: Optional[float] = None
     status: str = 'disconnected'
+    clock_supported: bool = True
+    # Обмін запит-відповідь з портом: команди з різних потоків не перемежовуються
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
 
 class ArduinoManager:
     """Менеджер для роботи з Arduino пристроями"""
     
-    def __init__(self, default_baudrate: int = 9600, timeout: int = 5):
+    def __init__(self, default_baudrate: int = 9600, timeout: int = 5, clock_sync: Optional[ClockSync] = None,
+                 tracer: Optional[TraceStore] = None, trace_frames: bool = False):
         self.default_baudrate = default_baudrate
         self.timeout = timeout
         self.connected_devices: Dict[str, ArduinoDevice] = {}
         self.retry_count = 3
+        self.clock_sync = clock_sync or ClockSync()
+        # Відрізки serial_write / arduino_ack для трасування подарунків
+        self.tracer = tracer or TraceStore(enabled=False)
+        # Суфікс #<trace_id> у рядку команди (лише для прошивок, що його підтримують)
+        self.trace_frames = trace_frames
         
     def get_available_ports(self) -> List[Dict[str, str]]:
         """Отримання списку доступних портів"""
+        import serial.tools.list_ports
+        
         ports = []
         for port in serial.tools.list_ports.comports():
             port_info = {
@@ -52,6 +71,8 @@ class ArduinoManager:
             baudrate = self.default_baudrate
         
         try:
+            import serial
+            
             # Закриття існуючого з'єднання якщо є
             if port in self.connected_devices:
                 self.disconnect(port)
@@ -77,6 +98,7 @@ class ArduinoManager:
                     status='connected'
                 )
                 self.connected_devices[port] = device
+                self.sync_clock(port)
                 logger.info(f"Підключено до Arduino на порту {port}")
                 return True
             else:
@@ -93,9 +115,11 @@ class ArduinoManager:
         try:
             if port in self.connected_devices:
                 device = self.connected_devices[port]
-                if device.connection and device.connection.is_open:
-                    device.connection.close()
+                with device.lock:
+                    if device.connection and device.connection.is_open:
+                        device.connection.close()
                 del self.connected_devices[port]
+                self.clock_sync.forget(port)
                 logger.info(f"Відключено від Arduino на порту {port}")
                 return True
             return False
@@ -114,8 +138,14 @@ class ArduinoManager:
             return port in self.connected_devices and self.connected_devices[port].status == 'connected'
         return len(self.connected_devices) > 0
     
-    def send_command(self, command: str, port: Optional[str] = None) -> Optional[str]:
-        """Відправка команди до Arduino"""
+    def send_command(self, command: str, port: Optional[str] = None,
+                     execute_at: Optional[float] = None, trace_id: Optional[str] = None) -> Optional[str]:
+        """Відправка команди до Arduino
+
+        Якщо задано execute_at (час сервера, секунди) і зсув годинника відомий,
+        команда надсилається як AT:<millis Arduino>:<команда> для виконання в цей момент.
+        trace_id - трасування подарунка: запис і очікування відповіді стають його відрізками.
+        """
         try:
             # Якщо порт не вказано, використовуємо перший підключений
             if port is None:
@@ -133,28 +163,44 @@ class ArduinoManager:
                 logger.error(f"З'єднання з портом {port} не активне")
                 return None
             
-            # Відправка команди
-            command_bytes = f"{command}\n".encode('utf-8')
-            device.connection.write(command_bytes)
-            device.connection.flush()
+            if execute_at is not None:
+                device_time = self.clock_sync.to_device_time(port, execute_at)
+                if device_time is not None:
+                    command = f"AT:{int(device_time * 1000)}:{command}"
+            if trace_id and self.trace_frames:
+                command = f"{command}#{trace_id}"
             
-            # Очікування відповіді
-            response = device.connection.readline().decode('utf-8').strip()
+            command_bytes = f"{command}\n".encode('utf-8')
+            # Порт один на всі дії: запис і відповідь - одним обміном під блокуванням порту
+            with device.lock:
+                # Відправка команди
+                write_started = now_ns()
+                device.connection.write(command_bytes)
+                device.connection.flush()
+                
+                # Очікування відповіді
+                ack_started = now_ns()
+                response = device.connection.readline().decode('utf-8').strip()
+            if trace_id:
+                self.tracer.record(trace_id, 'serial_write', write_started, ack_started, port=port,
+                                   bytes=len(command_bytes))
+                self.tracer.record(trace_id, 'arduino_ack', ack_started, response=response)
             
             # Оновлення часу останнього звернення
             device.last_seen = time.time()
             
-            logger.info(f"Команда '{command}' відправлена до {port}, відповідь: '{response}'")
+            command_logger.debug("Команда '%s' відправлена до %s, відповідь: '%s'", command, port, response)
             return response
             
         except Exception as e:
             logger.error(f"Помилка відправки команди: {e}")
             return None
     
-    def send_gift_command(self, gift_type: str, port: Optional[str] = None) -> Optional[str]:
+    def send_gift_command(self, gift_type: str, port: Optional[str] = None,
+                          execute_at: Optional[float] = None) -> Optional[str]:
         """Відправка команди для подарунка"""
         command = f"GIFT:{gift_type}"
-        return self.send_command(command, port)
+        return self.send_command(command, port, execute_at)
     
     def send_led_command(self, action: str, params: Dict[str, Any], port: Optional[str] = None) -> Optional[str]:
         """Відправка команди для LED"""
@@ -200,7 +246,8 @@ class ArduinoManager:
             'baudrate': device.baudrate,
             'status': device.status,
             'last_seen': device.last_seen,
-            'connected': device.connection and device.connection.is_open
+            'connected': device.connection and device.connection.is_open,
+            'clock': self.clock_sync.get_status().get(port)
         }
     
     def get_all_devices_status(self) -> Dict[str, Dict[str, Any]]:
@@ -210,7 +257,33 @@ class ArduinoManager:
             status[port] = self.get_device_status(port)
         return status
     
-    def _test_connection(self, connection: serial.Serial) -> bool:
+    def sync_clock(self, port: str) -> Optional[Dict[str, float]]:
+        """Оцінка зсуву годинника Arduino (millis) за обміном TIME"""
+        device = self.connected_devices.get(port)
+        if not device or not device.clock_supported or not device.connection or not device.connection.is_open:
+            return None
+        
+        try:
+            with device.lock:
+                t0 = time.time()
+                device.connection.write(b"TIME\n")
+                device.connection.flush()
+                response = device.connection.readline().decode('utf-8').strip()
+                t3 = time.time()
+            
+            # Arduino відповідає "TIME:<millis>"; стара прошивка - без синхронізації
+            if not response.startswith('TIME:'):
+                device.clock_supported = False
+                logger.info(f"Arduino на {port} не підтримує синхронізацію часу")
+                return None
+            device_time = int(response[5:]) / 1000
+            return self.clock_sync.add_sample(port, t0, device_time, device_time, t3)
+            
+        except Exception as e:
+            logger.error(f"Помилка синхронізації часу з {port}: {e}")
+            return None
+    
+    def _test_connection(self, connection: 'serial.Serial') -> bool:
         """Тестування з'єднання з Arduino"""
         try:
             # Відправка тестової команди
@@ -237,6 +310,7 @@ class ArduinoManager:
                 if response:
                     device.last_seen = current_time
                     device.status = 'connected'
+                    self.sync_clock(port)
                 else:
                     device.status = 'error'
                     logger.warning(f"Heartbeat не пройшов для {port}")
@@ -0,0 +1,120 @@
+"""
+Бенчмарк подій подарунків: словники з ISO рядками проти GiftEvent зі слотами
+
+Запуск:
+    python -m src.benchmark_gift_events
+    python -m src.benchmark_gift_events --count 200000 --json
+"""
+
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, Any, List
+
+from src.gift_event import GiftEvent
+
+
+def dict_queued(i: int) -> Dict[str, Any]:
+    """Подія, як її будував конвеєр раніше: словник з ISO рядком уже при прийомі"""
+    return {
+        'event_id': f"bench:{i}",
+        'type': 'ROSE',
+        'sender': 'benchmark',
+        'timestamp': datetime.now().isoformat(),
+        'value': 1,
+        'count': 1,
+        'stream': 'bench'
+    }
+
+
+def dict_processed(gift_event: Dict[str, Any]) -> Dict[str, Any]:
+    """Виконання дії раніше: action_executed з другим ISO рядком"""
+    return {
+        'gift': gift_event,
+        'action': 'set_color',
+        'device': 'bench',
+        'result': None,
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def slotted_queued(i: int) -> GiftEvent:
+    """Подія зараз: GiftEvent без рядків часу до межі емісії"""
+    return GiftEvent(f"bench:{i}", 'ROSE', 'benchmark', 1, 1, 'bench')
+
+
+def slotted_processed(gift_event: GiftEvent) -> Dict[str, Any]:
+    """Виконання дії зараз, як у process_gift_async: один to_dict() на подарунок"""
+    return {
+        'gift': gift_event.to_dict(),
+        'action': 'set_color',
+        'device': 'bench',
+        'result': None,
+        'latency_ms': round(gift_event.age_ms(), 1)
+    }
+
+
+def measure(name: str, queued: Callable[[int], Any], processed: Callable[[Any], Any], count: int) -> Dict[str, Any]:
+    """Час повного шляху подарунка та пам'ять, яку займають count подій у черзі"""
+    gc.collect()
+    started = time.perf_counter()
+    for i in range(count):
+        processed(queued(i))
+    elapsed = time.perf_counter() - started
+
+    # Пам'ять - для подій, що одночасно чекають у черзі (злиття, відкладені команди);
+    # словники для емісії живуть лише до відправки
+    gc.collect()
+    tracemalloc.start()
+    events = [queued(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+
+    return {
+        'variant': name,
+        'us_per_gift': elapsed * 1e6 / count,
+        'bytes_per_gift': current / count,
+    }
+
+
+def print_table(results: List[Dict[str, Any]]):
+    """Вивід результатів таблицею з порівнянням із першим варіантом"""
+    baseline = results[0]
+    rows = [['Варіант', 'мкс/подарунок', 'байт/подарунок', 'Час', "Пам'ять"]]
+    for result in results:
+        rows.append([
+            result['variant'],
+            f"{result['us_per_gift']:.2f}",
+            f"{result['bytes_per_gift']:.0f}",
+            f"{result['us_per_gift'] / baseline['us_per_gift']:.0%}",
+            f"{result['bytes_per_gift'] / baseline['bytes_per_gift']:.0%}",
+        ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк пам\'яті та часу подій подарунків')
+    parser.add_argument('--count', type=int, default=100000, help='Кількість подарунків')
+    parser.add_argument('--json', action='store_true', help='Вивід у форматі JSON')
+    args = parser.parse_args()
+
+    # Обидва варіанти - повний шлях подарунка з однією дією, як у main.py
+    results = [
+        measure('dict', dict_queued, dict_processed, args.count),
+        measure('GiftEvent', slotted_queued, slotted_processed, args.count),
+    ]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
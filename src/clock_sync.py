@@ -0,0 +1,73 @@
+"""
+Оцінка зсуву годинника пристроїв (як у NTP) для синхронного запуску ефектів
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+
+class ClockSync:
+    """Зсув годинника кожного пристрою відносно сервера
+
+    Для кожного обміну зберігаються чотири мітки часу NTP:
+    t0 - сервер відправив, t1 - пристрій отримав, t2 - пристрій відповів, t3 - сервер отримав.
+    Зсув береться з вибірки з найменшим RTT серед останніх обмінів.
+    """
+
+    def __init__(self, window: int = 8):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def add_sample(self, key: str, t0: float, t1: float, t2: float, t3: float) -> Dict[str, float]:
+        """Додавання результату одного обміну"""
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        rtt = max(0.0, (t3 - t0) - (t2 - t1))
+        sample = {'offset': offset, 'rtt': rtt, 'at': t3}
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(sample)
+        return sample
+
+    def offset(self, key: str) -> Optional[float]:
+        """Зсув годинника пристрою (годинник пристрою - годинник сервера), секунди"""
+        best = self._best(key)
+        return best['offset'] if best else None
+
+    def rtt(self, key: str) -> Optional[float]:
+        """Найкращий RTT до пристрою, секунди"""
+        best = self._best(key)
+        return best['rtt'] if best else None
+
+    def to_device_time(self, key: str, server_time: float) -> Optional[float]:
+        """Переведення часу сервера в час пристрою"""
+        offset = self.offset(key)
+        return server_time + offset if offset is not None else None
+
+    def forget(self, key: str):
+        """Видалення вибірок пристрою"""
+        with self._lock:
+            self._samples.pop(key, None)
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """Поточні оцінки для всіх пристроїв"""
+        with self._lock:
+            keys = list(self._samples)
+        status = {}
+        for key in keys:
+            best = self._best(key)
+            if best:
+                status[key] = {
+                    'offset_ms': round(best['offset'] * 1000, 3),
+                    'rtt_ms': round(best['rtt'] * 1000, 3),
+                    'age_s': round(time.time() - best['at'], 1)
+                }
+        return status
+
+    def _best(self, key: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            samples = self._samples.get(key)
+            if not samples:
+                return None
+            return min(samples, key=lambda sample: sample['rtt'])
@@ -3,9 +3,11 @@
 """
 
 import os
-from typing import Dict, List
+from typing import Any, Mapping, Tuple
 from dataclasses import dataclass
 
+from src.gift_catalog import GiftCatalog, DEFAULT_CATALOG
+
 @dataclass
 class Config:
     """Основна конфігурація системи"""
@@ -20,51 +22,56 @@ class Config:
     ARDUINO_BAUDRATE: int = int(os.getenv('ARDUINO_BAUDRATE', 9600))
     ARDUINO_TIMEOUT: int = int(os.getenv('ARDUINO_TIMEOUT', 5))
     ARDUINO_RETRY_COUNT: int = int(os.getenv('ARDUINO_RETRY_COUNT', 3))
+    # Послідовні порти в окремому процесі (команди через кільця в спільній пам'яті)
+    SERIAL_WORKER: bool = os.getenv('SERIAL_WORKER', 'False').lower() == 'true'
+    SERIAL_RING_SIZE: int = int(os.getenv('SERIAL_RING_SIZE', 262144))
+    
+    # UDP транспорт для ESP32/ESP8266 (порт пристрою - поле port або UDP_DEVICE_PORT)
+    UDP_BIND_PORT: int = int(os.getenv('UDP_BIND_PORT', 0))
+    UDP_DEVICE_PORT: int = int(os.getenv('UDP_DEVICE_PORT', 4210))
+    # Перший повтор одноразового ефекту без ACK, далі інтервал подвоюється
+    UDP_RETRY_MS: int = int(os.getenv('UDP_RETRY_MS', 20))
+    UDP_MAX_RETRIES: int = int(os.getenv('UDP_MAX_RETRIES', 3))
     
     # Налаштування TikTok
-    TIKTOK_MONITORING_INTERVAL: int = int(os.getenv('TIKTOK_MONITORING_INTERVAL', 2))
+    TIKTOK_FEED_URL: str = os.getenv('TIKTOK_FEED_URL', 'tcp://127.0.0.1:8765')
     TIKTOK_TIMEOUT: int = int(os.getenv('TIKTOK_TIMEOUT', 30))
+    TIKTOK_RECONNECT_MAX: int = int(os.getenv('TIKTOK_RECONNECT_MAX', 30))
+    MAX_STREAMS: int = int(os.getenv('MAX_STREAMS', 50))
+    
+    # Відкидання повторно доставлених подарунків за event_id
+    GIFT_DEDUP_SIZE: int = int(os.getenv('GIFT_DEDUP_SIZE', 4096))
+    GIFT_DEDUP_WINDOW: int = int(os.getenv('GIFT_DEDUP_WINDOW', 300))
+    
+    # Аналітика: обмеження кількості відправників у вікні, розсилка рейтингів дашбордам
+    ANALYTICS_MAX_KEYS: int = int(os.getenv('ANALYTICS_MAX_KEYS', 10000))
+    ANALYTICS_PUSH_INTERVAL: float = float(os.getenv('ANALYTICS_PUSH_INTERVAL', 1.0))
+    ANALYTICS_TOP_SIZE: int = int(os.getenv('ANALYTICS_TOP_SIZE', 10))
+    
+    # Історія подарунків (стовпцеві файли по ефірах)
+    HISTORY_DIR: str = os.getenv('HISTORY_DIR', 'data/history')
+    HISTORY_FLUSH_INTERVAL: float = float(os.getenv('HISTORY_FLUSH_INTERVAL', 1.0))
+    
+    # Трасування подарунків: останні TRACE_CAPACITY трасувань у пам'яті
+    TRACE_ENABLED: bool = os.getenv('TRACE_ENABLED', 'True').lower() == 'true'
+    TRACE_CAPACITY: int = int(os.getenv('TRACE_CAPACITY', 1000))
+    # Передавати trace_id у рядках команд Arduino (прошивка має ігнорувати суфікс #<trace_id>)
+    TRACE_SERIAL_IDS: bool = os.getenv('TRACE_SERIAL_IDS', 'False').lower() == 'true'
     
     # Налаштування пристроїв
     DEVICE_HEARTBEAT_INTERVAL: int = int(os.getenv('DEVICE_HEARTBEAT_INTERVAL', 30))
     MAX_DEVICES: int = int(os.getenv('MAX_DEVICES', 10))
+    # Запас часу для синхронного запуску ефекту на кількох пристроях
+    SYNC_LEAD_MS: int = int(os.getenv('SYNC_LEAD_MS', 150))
     
-    # Типи подарунків TikTok та їх вартість
-    GIFT_VALUES: Dict[str, int] = {
-        'ROSE': 1,
-        'HEART': 5,
-        'STAR': 10,
-        'CROWN': 50,
-        'DIAMOND': 100,
-        'ROCKET': 200,
-        'UNICORN': 500
-    }
-    
-    # Кольори подарунків
-    GIFT_COLORS: Dict[str, str] = {
-        'ROSE': '#ff69b4',
-        'HEART': '#ff0000',
-        'STAR': '#ffd700',
-        'CROWN': '#ff8c00',
-        'DIAMOND': '#00bfff',
-        'ROCKET': '#ff4500',
-        'UNICORN': '#9370db'
-    }
-    
-    # Назви подарунків
-    GIFT_NAMES: Dict[str, str] = {
-        'ROSE': 'Роза',
-        'HEART': 'Серце',
-        'STAR': 'Зірка',
-        'CROWN': 'Корона',
-        'DIAMOND': 'Діамант',
-        'ROCKET': 'Ракета',
-        'UNICORN': 'Єдиноріг'
-    }
+    # Каталог подарунків TikTok (перечитується при зміні файлу)
+    GIFT_CATALOG_FILE: str = os.getenv('GIFT_CATALOG_FILE', DEFAULT_CATALOG)
+    GIFT_CATALOG_RELOAD_INTERVAL: float = float(os.getenv('GIFT_CATALOG_RELOAD_INTERVAL', 5))
     
     # Типи пристроїв
-    DEVICE_TYPES: List[str] = [
+    DEVICE_TYPES: Tuple[str, ...] = (
         'arduino',
+        'http',
         'esp32',
         'esp8266',
         'raspberry_pi',
@@ -79,10 +86,10 @@ class Config:
         'buzzer',
         'pir_sensor',
         'custom'
-    ]
+    )
     
     # Дії пристроїв
-    DEVICE_ACTIONS: List[str] = [
+    DEVICE_ACTIONS: Tuple[str, ...] = (
         'turn_on',
         'turn_off',
         'toggle',
@@ -113,17 +120,37 @@ class Config:
         'chase_effect',
         'unicorn_effect',
         'custom'
-    ]
+    )
     
     # Налаштування логування
     LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE: str = os.getenv('LOG_FILE', 'logs/app.log')
     LOG_MAX_SIZE: int = int(os.getenv('LOG_MAX_SIZE', 10485760))  # 10MB
     LOG_BACKUP_COUNT: int = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    # Формат файлу логів: json або text
+    LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'json')
+    # Не більше стількох записів на секунду про окремі команди пристроям
+    LOG_SAMPLE_RATE: int = int(os.getenv('LOG_SAMPLE_RATE', 5))
     
     # Налаштування безпеки
     RATE_LIMIT_REQUESTS: int = int(os.getenv('RATE_LIMIT_REQUESTS', 100))
     RATE_LIMIT_WINDOW: int = int(os.getenv('RATE_LIMIT_WINDOW', 900))  # 15 хвилин
+    # Політики понад ліміт: drop, delay або merge
+    RATE_LIMIT_POLICY: str = os.getenv('RATE_LIMIT_POLICY', 'drop')
+    RATE_LIMIT_MAX_DELAY: float = float(os.getenv('RATE_LIMIT_MAX_DELAY', 2.0))
+    
+    # Подарунки одного відправника (на секунду) та команди одному пристрою (на секунду)
+    SENDER_GIFT_RATE: float = float(os.getenv('SENDER_GIFT_RATE', 2))
+    SENDER_GIFT_BURST: int = int(os.getenv('SENDER_GIFT_BURST', 10))
+    SENDER_GIFT_POLICY: str = os.getenv('SENDER_GIFT_POLICY', 'merge')
+    DEVICE_COMMAND_RATE: float = float(os.getenv('DEVICE_COMMAND_RATE', 20))
+    DEVICE_COMMAND_BURST: int = int(os.getenv('DEVICE_COMMAND_BURST', 10))
+    DEVICE_COMMAND_POLICY: str = os.getenv('DEVICE_COMMAND_POLICY', 'delay')
+    
+    # Адмін-токен для діагностичних ендпоінтів /api/admin/* (без токена вони вимкнені)
+    ADMIN_TOKEN: str = os.getenv('ADMIN_TOKEN', '')
+    # Спільний токен пристроїв постійного каналу /devices (без токена канал вимкнений)
+    DEVICE_TOKEN: str = os.getenv('DEVICE_TOKEN', '')
     
     # Налаштування бази даних (якщо потрібно)
     DATABASE_URL: str = os.getenv('DATABASE_URL', 'sqlite:///tt_fizmehdia.db')
@@ -138,14 +165,13 @@ class Config:
     MQTT_USERNAME: str = os.getenv('MQTT_USERNAME', '')
     MQTT_PASSWORD: str = os.getenv('MQTT_PASSWORD', '')
     
-    def get_gift_info(self, gift_type: str) -> Dict[str, any]:
-        """Отримання інформації про подарунок"""
-        return {
-            'type': gift_type,
-            'name': self.GIFT_NAMES.get(gift_type, gift_type),
-            'value': self.GIFT_VALUES.get(gift_type, 1),
-            'color': self.GIFT_COLORS.get(gift_type, '#ffffff')
-        }
+    def __post_init__(self):
+        self.gift_catalog = GiftCatalog(self.GIFT_CATALOG_FILE)
+        self.gift_catalog.load()
+    
+    def get_gift_info(self, gift_type: str) -> Mapping[str, Any]:
+        """Отримання інформації про подарунок (незмінний словник з каталогу)"""
+        return self.gift_catalog.info(gift_type)
     
     def is_valid_device_type(self, device_type: str) -> bool:
         """Перевірка валідності типу пристрою"""
@@ -155,42 +181,6 @@ class Config:
         """Перевірка валідності дії"""
         return action in self.DEVICE_ACTIONS
     
-    def get_default_gift_action(self, gift_type: str) -> Dict[str, any]:
-        """Отримання дії за замовчуванням для подарунка"""
-        gift_info = self.get_gift_info(gift_type)
-        
-        # Прості дії за замовчуванням
-        if gift_type == 'ROSE':
-            return {
-                'action': 'set_color',
-                'params': {
-                    'color': gift_info['color'],
-                    'brightness': 30,
-                    'duration': 2000
-                }
-            }
-        elif gift_type == 'HEART':
-            return {
-                'action': 'led_rainbow',
-                'params': {
-                    'duration': 3000
-                }
-            }
-        elif gift_type == 'DIAMOND':
-            return {
-                'action': 'set_color',
-                'params': {
-                    'color': gift_info['color'],
-                    'brightness': 100,
-                    'duration': 5000
-                }
-            }
-        else:
-            return {
-                'action': 'set_color',
-                'params': {
-                    'color': gift_info['color'],
-                    'brightness': 50,
-                    'duration': 3000
-                }
-            }
+    def get_default_gift_action(self, gift_type: str) -> Mapping[str, Any]:
+        """Отримання дії за замовчуванням для подарунка (обчислена при завантаженні каталогу)"""
+        return self.gift_catalog.action(gift_type)
@@ -0,0 +1,210 @@
+"""
+Постійний Socket.IO канал між сервером та HTTP/Raspberry Pi пристроями
+"""
+
+import hmac
+import time
+import logging
+import itertools
+from typing import Callable, Dict, Any, Optional
+
+from flask import request
+from flask_socketio import SocketIO, join_room
+
+from src.clock_sync import ClockSync
+from common.tracing import TraceStore, now_ns
+
+logger = logging.getLogger(__name__)
+
+DEVICE_NAMESPACE = '/devices'
+
+
+class DeviceChannel:
+    """Реєстр підключених пристроїв та відправка команд через їх з'єднання"""
+
+    def __init__(self, socketio: SocketIO, namespace: str = DEVICE_NAMESPACE, timeout: float = 5.0,
+                 clock_sync: Optional[ClockSync] = None, sync_interval: float = 30.0,
+                 on_link: Optional[Callable[..., None]] = None, tracer: Optional[TraceStore] = None,
+                 token: str = ''):
+        self.socketio = socketio
+        self.namespace = namespace
+        self.timeout = timeout
+        self.clock_sync = clock_sync or ClockSync()
+        self.sync_interval = sync_interval
+        # Сповіщення про підключення/відключення: on_link(link_id, online, capabilities)
+        self.on_link = on_link
+        # Відрізки з підтверджень і подій device_trace додаються до трасувань подарунків
+        self.tracer = tracer or TraceStore(enabled=False)
+        # Спільний токен пристроїв (DEVICE_TOKEN); без нього канал не приймає жодного пристрою
+        self.token = token
+        self._sync_task = None
+        # link_id пристрою -> інформація про з'єднання
+        self.links: Dict[str, Dict[str, Any]] = {}
+        self._sids: Dict[str, str] = {}
+        self._message_ids = itertools.count(1)
+
+        socketio.on_event('device_hello', self._on_hello, namespace=namespace)
+        socketio.on_event('device_status', self._on_status, namespace=namespace)
+        socketio.on_event('device_trace', self._on_trace, namespace=namespace)
+        socketio.on_event('disconnect', self._on_disconnect, namespace=namespace)
+
+    def is_connected(self, link_id: Optional[str]) -> bool:
+        """Перевірка наявності відкритого з'єднання з пристроєм"""
+        return link_id in self.links
+
+    def send_command(self, link_id: str, action: str, params: Dict[str, Any],
+                     gift: Optional[Dict[str, Any]] = None,
+                     execute_at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Відправка команди та очікування підтвердження від пристрою
+
+        execute_at - момент виконання за часом сервера; пристрою він передається
+        вже в його власному часі з урахуванням зсуву годинника.
+        trace_id подарунка передається в команді; відрізки пристрою з підтвердження
+        переводяться в час сервера та додаються до трасування.
+        """
+        link = self.links.get(link_id)
+        if link is None:
+            return None
+
+        trace_id = gift.get('trace_id') if gift else None
+        message = {
+            'id': next(self._message_ids),
+            'action': action,
+            'params': params,
+            'gift': gift,
+            'trace_id': trace_id
+        }
+        if execute_at is not None:
+            device_time = self.clock_sync.to_device_time(link_id, execute_at)
+            message['execute_at'] = device_time if device_time is not None else execute_at
+        started = now_ns()
+        try:
+            ack = self.socketio.call('command', message, to=link['sid'], namespace=self.namespace,
+                                     timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"Помилка відправки команди до {link_id}: {e}")
+            return None
+
+        link['last_rtt_ms'] = round((now_ns() - started) / 1e6, 2)
+        link['commands'] += 1
+        if trace_id:
+            self.tracer.record(trace_id, 'device_call', started, device=link_id)
+            if isinstance(ack, dict):
+                self.tracer.merge(trace_id, ack.pop('spans', None), self.clock_sync.offset(link_id), link_id)
+        return ack
+
+    def sync_clock(self, link_id: str, samples: int = 3) -> Optional[float]:
+        """Оцінка зсуву годинника пристрою кількома обмінами 'clock'"""
+        link = self.links.get(link_id)
+        if link is None:
+            return None
+
+        for _ in range(samples):
+            t0 = time.time()
+            try:
+                reply = self.socketio.call('clock', {'t0': t0}, to=link['sid'], namespace=self.namespace,
+                                           timeout=self.timeout)
+            except Exception as e:
+                logger.warning(f"Помилка синхронізації часу з {link_id}: {e}")
+                break
+            t3 = time.time()
+            if reply and 't1' in reply and 't2' in reply:
+                self.clock_sync.add_sample(link_id, t0, reply['t1'], reply['t2'], t3)
+
+        return self.clock_sync.offset(link_id)
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """Статус усіх підключених пристроїв"""
+        clocks = self.clock_sync.get_status()
+        return {link_id: {**link, 'clock': clocks.get(link_id)} for link_id, link in self.links.items()}
+
+    def _sync_loop(self):
+        """Періодична синхронізація годинників усіх підключених пристроїв"""
+        while True:
+            for link_id in list(self.links):
+                self.sync_clock(link_id)
+            self.socketio.sleep(self.sync_interval)
+
+    def _on_hello(self, data):
+        """Реєстрація пристрою після підключення"""
+        data = data or {}
+        link_id = data.get('device_id')
+        if not link_id:
+            return {'success': False, 'error': 'device_id обов\'язковий'}
+        if not self._is_authorized(data.get('token')):
+            logger.warning(f"Відхилено підключення пристрою {link_id}: невірний токен")
+            return {'success': False, 'error': 'Невірний токен пристрою'}
+
+        sid = request.sid
+        link = self.links.get(link_id)
+        if link and link['sid'] != sid:
+            # Інше з'єднання не може перехопити команди пристрою, поки старе відкрите
+            if self._sid_connected(link['sid']):
+                logger.warning(f"Відхилено повторне підключення {link_id}: пристрій уже підключений")
+                return {'success': False, 'error': 'Пристрій з таким device_id уже підключений', 'retry': True}
+            self._sids.pop(link['sid'], None)
+
+        join_room(link_id)
+        self._sids[sid] = link_id
+        self.links[link_id] = {
+            'sid': sid,
+            'capabilities': data.get('capabilities', {}),
+            'connected_at': time.time(),
+            'last_seen': time.time(),
+            'last_rtt_ms': None,
+            'commands': 0,
+            'status': None
+        }
+        logger.info(f"Пристрій {link_id} підключено через постійний канал")
+        self._notify(link_id, True, self.links[link_id]['capabilities'])
+
+        # Перша синхронізація - одразу після реєстрації, далі періодично
+        if self._sync_task is None:
+            self._sync_task = self.socketio.start_background_task(self._sync_loop)
+        else:
+            self.socketio.start_background_task(self.sync_clock, link_id)
+        return {'success': True}
+
+    def _on_status(self, data):
+        """Статус, який пристрій надсилає періодично"""
+        link_id = self._sids.get(request.sid)
+        if link_id and link_id in self.links:
+            self.links[link_id]['status'] = data
+            self.links[link_id]['last_seen'] = time.time()
+
+    def _on_trace(self, data):
+        """Відрізки, завершені на пристрої після підтвердження (черга та ефект)"""
+        link_id = self._sids.get(request.sid)
+        trace_id = (data or {}).get('trace_id')
+        # Лише трасування подарунків сервера; власні трасування пристрою лишаються на ньому
+        if link_id and trace_id in self.tracer:
+            self.tracer.merge(trace_id, data.get('spans'), self.clock_sync.offset(link_id), link_id)
+
+    def _on_disconnect(self, *args):
+        """Видалення пристрою після відключення"""
+        link_id = self._sids.pop(request.sid, None)
+        if link_id and self.links.get(link_id, {}).get('sid') == request.sid:
+            del self.links[link_id]
+            self.clock_sync.forget(link_id)
+            logger.info(f"Пристрій {link_id} відключився від постійного каналу")
+            self._notify(link_id, False)
+
+    def _is_authorized(self, token: Optional[str]) -> bool:
+        if not self.token or not isinstance(token, str):
+            return False
+        return hmac.compare_digest(token.encode(), self.token.encode())
+
+    def _sid_connected(self, sid: str) -> bool:
+        """Чи відкрите ще з'єднання (disconnect могли ще не обробити)"""
+        try:
+            return self.socketio.server.manager.is_connected(sid, self.namespace)
+        except Exception:
+            return True
+
+    def _notify(self, link_id: str, online: bool, capabilities: Optional[Dict[str, Any]] = None):
+        if self.on_link is None:
+            return
+        try:
+            self.on_link(link_id, online, capabilities)
+        except Exception as e:
+            logger.error(f"Помилка обробника стану каналу {link_id}: {e}")
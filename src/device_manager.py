@@ -0,0 +1,267 @@
+"""
+Реєстр пристроїв з індексами за типом, можливостями та статусом і кешованими представленнями для API
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Можливості за замовчуванням, якщо пристрій не передав власний список
+TYPE_CAPABILITIES = {
+    'arduino': ('led', 'servo', 'buzzer'),
+    'esp32': ('led', 'wifi'),
+    'esp8266': ('led', 'wifi'),
+    'raspberry_pi': ('led', 'servo', 'sound', 'camera', 'gpio'),
+    'light': ('led',),
+    'neopixel': ('led',),
+    'sound': ('sound',),
+    'buzzer': ('buzzer',),
+    'servo': ('servo',),
+    'motor': ('motor',),
+    'display': ('display',),
+    'camera': ('camera',),
+    'gpio': ('gpio',),
+    'pir_sensor': ('motion',),
+}
+DEVICE_STATUSES = ('connected', 'online', 'offline', 'disabled')
+# Поля запиту, що стають атрибутами запису (решта зберігається в extra)
+DEVICE_FIELDS = ('id', 'name', 'type', 'ip', 'port', 'link_id', 'capabilities', 'status')
+
+
+@dataclass
+class Device:
+    """Запис пристрою в реєстрі"""
+    id: str
+    name: str
+    type: str
+    ip: Optional[str] = None
+    port: Optional[int] = None
+    link_id: Optional[str] = None
+    capabilities: Tuple[str, ...] = ()
+    status: str = 'connected'
+    last_seen: float = field(default_factory=time.time)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def channel_id(self) -> str:
+        """Ідентифікатор пристрою в постійному каналі"""
+        return self.link_id or self.id
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словник для API (сумісний з попереднім форматом запиту пристрою)"""
+        return {
+            **self.extra,
+            'id': self.id,
+            'name': self.name,
+            'type': self.type,
+            'ip': self.ip,
+            'port': self.port,
+            'link_id': self.link_id,
+            'capabilities': list(self.capabilities),
+            'status': self.status,
+            'last_seen': datetime.fromtimestamp(self.last_seen).isoformat()
+        }
+
+
+class DeviceManager:
+    """Пристрої за id з вторинними індексами
+
+    Маршрутизація (get) та вибірка за типом, можливістю чи статусом не перебирають
+    весь реєстр. Серіалізовані сторінки списку кешуються до наступної зміни реєстру.
+    """
+
+    INDEXES = ('type', 'capability', 'status')
+
+    def __init__(self, max_devices: int = 10, device_types: Optional[Iterable[str]] = None, view_cache_size: int = 64):
+        self.max_devices = max_devices
+        self.device_types = tuple(device_types) if device_types else None
+        self.view_cache_size = view_cache_size
+        self.devices: Dict[str, Device] = {}
+        # Індекс -> значення -> id пристроїв (dict як впорядкована множина)
+        self._indexes: Dict[str, Dict[str, Dict[str, None]]] = {name: {} for name in self.INDEXES}
+        self._by_link: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        # Номер версії реєстру: змінюється з кожною зміною, скидає кеш представлень
+        self.version = 0
+        self._views: Dict[tuple, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self.devices
+
+    def get(self, device_id: str) -> Optional[Device]:
+        """Пристрій за id"""
+        return self.devices.get(device_id)
+
+    def get_by_link(self, link_id: str) -> Optional[Device]:
+        """Пристрій за ідентифікатором постійного каналу"""
+        device_id = self._by_link.get(link_id)
+        return self.devices.get(device_id) if device_id else None
+
+    def add_device(self, data: Dict[str, Any]) -> str:
+        """Додавання (або оновлення за id) пристрою з даних запиту; повертає id
+
+        ValueError - невідомий тип пристрою або досягнуто MAX_DEVICES.
+        """
+        device_type = data.get('type', 'arduino')
+        if self.device_types and device_type not in self.device_types:
+            raise ValueError(f"Невідомий тип пристрою: {device_type}")
+        status = data.get('status', 'connected')
+        if status not in DEVICE_STATUSES:
+            raise ValueError(f"Невідомий статус пристрою: {status}")
+
+        capabilities = data.get('capabilities')
+        if isinstance(capabilities, dict):
+            capabilities = [name for name, enabled in capabilities.items() if enabled]
+
+        with self._lock:
+            device_id = data.get('id') or str(uuid.uuid4())
+            if device_id not in self.devices and len(self.devices) >= self.max_devices:
+                raise ValueError(f"Досягнуто ліміту пристроїв ({self.max_devices})")
+
+            device = Device(
+                id=device_id,
+                name=data.get('name', 'Unknown'),
+                type=device_type,
+                ip=data.get('ip'),
+                port=data.get('port'),
+                link_id=data.get('link_id'),
+                capabilities=tuple(capabilities or TYPE_CAPABILITIES.get(device_type, ())),
+                status=status,
+                extra={key: value for key, value in data.items() if key not in DEVICE_FIELDS}
+            )
+            self._unindex(self.devices.get(device_id))
+            self.devices[device_id] = device
+            self._index(device)
+            self._changed()
+        return device_id
+
+    def remove_device(self, device_id: str) -> bool:
+        """Видалення пристрою"""
+        with self._lock:
+            device = self.devices.pop(device_id, None)
+            if device is None:
+                return False
+            self._unindex(device)
+            self._changed()
+        return True
+
+    def set_status(self, device_id: str, status: str) -> bool:
+        """Зміна статусу пристрою з оновленням індексу"""
+        if status not in DEVICE_STATUSES:
+            raise ValueError(f"Невідомий статус пристрою: {status}")
+        with self._lock:
+            device = self.devices.get(device_id)
+            if device is None:
+                return False
+            device.last_seen = time.time()
+            # Лише last_seen (heartbeat, повторний hello) не скидає кеш та ETag
+            if device.status != status:
+                self._unindex(device)
+                device.status = status
+                self._index(device)
+                self._changed()
+        return True
+
+    def set_link_status(self, link_id: str, online: bool, capabilities: Optional[Dict[str, Any]] = None):
+        """Підключення/відключення постійного каналу пристрою (callback DeviceChannel)"""
+        device = self.get_by_link(link_id) or self.get(link_id)
+        if device is None:
+            return
+        if online and capabilities:
+            with self._lock:
+                merged = tuple(sorted(set(device.capabilities) | {
+                    name[:-len('_available')] if name.endswith('_available') else name
+                    for name, enabled in capabilities.items() if enabled}))
+                if merged != device.capabilities:
+                    self._unindex(device)
+                    device.capabilities = merged
+                    self._index(device)
+                    self._changed()
+        self.set_status(device.id, 'online' if online else 'offline')
+
+    def find(self, type: Optional[str] = None, capability: Optional[str] = None,
+             status: Optional[str] = None) -> List[Device]:
+        """Пристрої, що відповідають усім заданим фільтрам (перетин індексів)"""
+        filters = [(name, value) for name, value in (('type', type), ('capability', capability), ('status', status))
+                   if value]
+        with self._lock:
+            if not filters:
+                return list(self.devices.values())
+            # Починаємо з найменшої множини, решту перевіряємо за іншими індексами
+            sets = sorted((self._indexes[name].get(value, {}) for name, value in filters), key=len)
+            return [self.devices[device_id] for device_id in sets[0]
+                    if all(device_id in other for other in sets[1:])]
+
+    def view(self, type: Optional[str] = None, capability: Optional[str] = None, status: Optional[str] = None,
+             offset: int = 0, limit: Optional[int] = None) -> Tuple[str, int]:
+        """Сторінка списку пристроїв у JSON та версія реєстру (для ETag)
+
+        Однаковий запит до наступної зміни реєстру повертає вже серіалізований рядок.
+        """
+        offset = max(offset, 0)
+        if limit is not None:
+            limit = max(limit, 0)
+        key = (type, capability, status, offset, limit)
+        with self._lock:
+            version = self.version
+            body = self._views.get(key)
+            if body is None:
+                devices = self.find(type, capability, status)
+                page = devices[offset:offset + limit] if limit is not None else devices[offset:]
+                body = json.dumps({
+                    'devices': [device.to_dict() for device in page],
+                    'count': len(page),
+                    'total': len(devices),
+                    'offset': offset,
+                    'limit': limit
+                }, ensure_ascii=False)
+                if len(self._views) >= self.view_cache_size:
+                    self._views.clear()
+                self._views[key] = body
+        return body, version
+
+    def get_status(self) -> Dict[str, Any]:
+        """Кількість пристроїв за індексами"""
+        with self._lock:
+            return {
+                'count': len(self.devices),
+                'max_devices': self.max_devices,
+                'version': self.version,
+                **{name: {value: len(ids) for value, ids in index.items()} for name, index in self._indexes.items()}
+            }
+
+    def _index(self, device: Device):
+        self._indexes['type'].setdefault(device.type, {})[device.id] = None
+        self._indexes['status'].setdefault(device.status, {})[device.id] = None
+        for capability in device.capabilities:
+            self._indexes['capability'].setdefault(capability, {})[device.id] = None
+        if device.link_id:
+            self._by_link[device.link_id] = device.id
+
+    def _unindex(self, device: Optional[Device]):
+        if device is None:
+            return
+        entries = [('type', device.type), ('status', device.status)]
+        entries += [('capability', capability) for capability in device.capabilities]
+        for name, value in entries:
+            ids = self._indexes[name].get(value)
+            if ids is not None:
+                ids.pop(device.id, None)
+                if not ids:
+                    del self._indexes[name][value]
+        if device.link_id and self._by_link.get(device.link_id) == device.id:
+            del self._by_link[device.link_id]
+
+    def _changed(self):
+        self.version += 1
+        self._views.clear()
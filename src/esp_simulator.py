@@ -0,0 +1,126 @@
+"""
+Імітація ESP32/ESP8266 з UDP транспортом: прийом пакетів команд, ACK та журнал виконаних ефектів
+
+Запуск:
+    python -m src.esp_simulator
+    python -m src.esp_simulator --port 4210 --loss 0.2 --ack-delay 5
+"""
+
+import time
+import random
+import socket
+import logging
+import argparse
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from src.udp_transport import FLAG_RELIABLE, KIND_COMMANDS, decode_packet, decode_params, encode_ack
+
+logger = logging.getLogger(__name__)
+
+# Скільки останніх seq пам'ятати, щоб не виконати повторно надіслану команду двічі
+SEEN_CAPACITY = 1024
+
+
+class EspSimulator:
+    """UDP вузол, що відповідає як прошивка: підтверджує надійні команди, виконує кожну лише раз
+
+    loss - частка вхідних пакетів і ACK, що «губляться» (для перевірки повторів).
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 4210, loss: float = 0.0, ack_delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.loss = loss
+        self.ack_delay = ack_delay
+        self.sock: Optional[socket.socket] = None
+        self._seen: 'OrderedDict[Tuple[Tuple[str, int], int], None]' = OrderedDict()
+        self.stats = {'packets': 0, 'commands': 0, 'duplicates': 0, 'dropped': 0, 'acks': 0, 'bad_packets': 0}
+
+    def open(self):
+        """Відкриття порту"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((self.host, self.port))
+        self.port = self.sock.getsockname()[1]
+        logger.info(f"Імітація ESP слухає udp://{self.host}:{self.port}")
+
+    def serve_forever(self):
+        if self.sock is None:
+            self.open()
+        while True:
+            data, address = self.sock.recvfrom(2048)
+            self.handle_packet(data, address)
+
+    def handle_packet(self, data: bytes, address: Tuple[str, int]):
+        """Обробка пакета команд: виконання нових команд та один ACK на весь пакет"""
+        if self._lost():
+            self.stats['dropped'] += 1
+            return
+        try:
+            kind, records = decode_packet(data)
+        except ValueError as e:
+            self.stats['bad_packets'] += 1
+            logger.warning(f"Пошкоджений пакет від {address[0]}:{address[1]}: {e}")
+            return
+        if kind != KIND_COMMANDS:
+            return
+
+        self.stats['packets'] += 1
+        acks = []
+        for seq, flags, code, delay_ms, payload in records:
+            if flags & FLAG_RELIABLE:
+                # ACK і на повтор: попередній ACK міг загубитися
+                acks.append(seq)
+            key = (address, seq)
+            if key in self._seen:
+                self.stats['duplicates'] += 1
+                continue
+            self._seen[key] = None
+            if len(self._seen) > SEEN_CAPACITY:
+                self._seen.popitem(last=False)
+            self.stats['commands'] += 1
+            self.execute(seq, code, payload, delay_ms, len(records))
+
+        if acks:
+            if self.ack_delay:
+                time.sleep(self.ack_delay)
+            if self._lost():
+                self.stats['dropped'] += 1
+                return
+            self.sock.sendto(encode_ack(acks), address)
+            self.stats['acks'] += 1
+
+    def execute(self, seq: int, code: int, payload: bytes, delay_ms: int, batch: int):
+        """Замість ефекту - запис у журнал"""
+        try:
+            action, params = decode_params(code, payload)
+        except ValueError as e:
+            logger.warning(f"Команда {seq}: {e}")
+            return
+        logger.info("Команда %s: %s %s (запуск через %d мс, у пакеті %d)", seq, action, params, delay_ms, batch)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {'port': self.port, **self.stats}
+
+    def _lost(self) -> bool:
+        return self.loss > 0 and random.random() < self.loss
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Імітація ESP32/ESP8266 з UDP транспортом')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4210)
+    parser.add_argument('--loss', type=float, default=0.0, help='Частка загублених пакетів (0..1)')
+    parser.add_argument('--ack-delay', type=float, default=0.0, help='Затримка ACK, мс')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    simulator = EspSimulator(args.host, args.port, args.loss, args.ack_delay / 1000)
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Статистика: {simulator.get_status()}")
+
+
+if __name__ == '__main__':
+    main()
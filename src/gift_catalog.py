@@ -0,0 +1,190 @@
+"""
+Каталог подарунків TikTok: незмінні записи, скомпільовані один раз, з гарячим перезавантаженням
+"""
+
+import os
+import json
+import logging
+import threading
+from types import MappingProxyType
+from dataclasses import dataclass
+from typing import Dict, Any, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(__file__), 'gift_catalog.json')
+DEFAULT_COLOR = '#ffffff'
+DEFAULT_ACTION = {'action': 'set_color', 'params': {'brightness': 50, 'duration': 3000}}
+
+
+def gift_type_from_name(name: str) -> str:
+    """Назва подарунка TikTok ("Rose", "Heart Me") -> тип подарунка системи"""
+    return '_'.join(name.upper().split())
+
+
+def freeze(value: Any) -> Any:
+    """Рекурсивно незмінна копія JSON значення (словники - MappingProxyType, списки - кортежі)"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Звичайна JSON-сумісна копія незмінного значення (для відповідей API)"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+@dataclass(frozen=True)
+class GiftInfo:
+    """Скомпільований запис каталогу: все, що потрібно на шляху обробки подарунка"""
+    __slots__ = ('type', 'name', 'value', 'color', 'action', 'info')
+
+    type: str
+    name: str
+    value: int
+    color: str
+    # Дія за замовчуванням ({'action', 'params'}) та опис подарунка - готові незмінні словники
+    action: Mapping[str, Any]
+    info: Mapping[str, Any]
+
+
+def compile_gift(entry: Dict[str, Any], default_action: Dict[str, Any]) -> GiftInfo:
+    """Запис файлу каталогу -> GiftInfo з обчисленою наперед дією"""
+    gift_type = entry.get('type') or gift_type_from_name(entry['name'])
+    name = entry.get('name', gift_type)
+    value = int(entry.get('value', 1))
+    color = entry.get('color', DEFAULT_COLOR)
+
+    action = entry.get('action') or default_action
+    params = action.get('params', {})
+    # Колір подарунка підставляється в дії, що задають колір
+    if action['action'] == 'set_color':
+        params = {'color': color, **params}
+
+    return GiftInfo(
+        type=gift_type,
+        name=name,
+        value=value,
+        color=color,
+        action=freeze({'action': action['action'], 'params': params}),
+        info=freeze({'type': gift_type, 'name': name, 'value': value, 'color': color})
+    )
+
+
+class GiftCatalog:
+    """Таблиця тип подарунка -> GiftInfo
+
+    Таблиця будується з файлу цілком і замінюється одним присвоєнням, тож читачі
+    завжди бачать або стару, або нову версію. Пошук не створює нових об'єктів.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.gifts: Mapping[str, GiftInfo] = MappingProxyType({})
+        self.default_action: Mapping[str, Any] = compile_gift({'type': 'UNKNOWN'}, DEFAULT_ACTION).action
+        self.loaded_mtime: Optional[float] = None
+        # Останній переглянутий стан файлу: файл з помилкою не перечитується, доки не зміниться
+        self._checked_mtime: Optional[float] = None
+        self._watch_stop = threading.Event()
+        self._watch_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self.gifts)
+
+    def __contains__(self, gift_type: str) -> bool:
+        return gift_type in self.gifts
+
+    def get(self, gift_type: str) -> Optional[GiftInfo]:
+        """Запис подарунка або None для невідомого типу"""
+        return self.gifts.get(gift_type)
+
+    def value(self, gift_type: str, default: int = 1) -> int:
+        """Вартість подарунка в монетах"""
+        gift = self.gifts.get(gift_type)
+        return gift.value if gift is not None else default
+
+    def info(self, gift_type: str) -> Mapping[str, Any]:
+        """Опис подарунка (type, name, value, color)"""
+        gift = self.gifts.get(gift_type)
+        if gift is not None:
+            return gift.info
+        return {'type': gift_type, 'name': gift_type, 'value': 1, 'color': DEFAULT_COLOR}
+
+    def action(self, gift_type: str) -> Mapping[str, Any]:
+        """Дія за замовчуванням для подарунка"""
+        gift = self.gifts.get(gift_type)
+        return gift.action if gift is not None else self.default_action
+
+    def load(self) -> bool:
+        """Завантаження та компіляція каталогу з файлу
+
+        При помилці залишається попередня таблиця.
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            gifts, default_action = self.compile(data)
+        except Exception as e:
+            logger.error(f"Помилка завантаження каталогу подарунків з {self.path}: {e}")
+            return False
+
+        # Атомарна заміна всієї таблиці
+        self.gifts = gifts
+        self.default_action = default_action
+        self.loaded_mtime = mtime
+        logger.info(f"Завантажено {len(gifts)} подарунків з {self.path}")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Перезавантаження, якщо файл змінився"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime in (self.loaded_mtime, self._checked_mtime):
+            return False
+        self._checked_mtime = mtime
+        return self.load()
+
+    def watch(self, interval: float = 5.0):
+        """Запуск потоку, який стежить за змінами файлу"""
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+
+        def loop():
+            while not self._watch_stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=loop, name='gift-catalog-watch', daemon=True)
+        self._watch_thread.start()
+
+    def stop(self):
+        """Зупинка потоку спостереження"""
+        self._watch_stop.set()
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Каталог для API: подарунки за зростанням вартості"""
+        return [{**thaw(gift.info), 'action': thaw(gift.action)}
+                for gift in sorted(self.gifts.values(), key=lambda gift: (gift.value, gift.type))]
+
+    @staticmethod
+    def compile(data: Dict[str, Any]):
+        """Побудова незмінної таблиці з вмісту файлу"""
+        default_action = data.get('default_action') or DEFAULT_ACTION
+        gifts = {}
+        for entry in data.get('gifts', []):
+            gift = compile_gift(entry, default_action)
+            if gift.type in gifts:
+                raise ValueError(f"Подарунок {gift.type} описано двічі")
+            gifts[gift.type] = gift
+
+        # Дія для невідомих типів теж обчислюється наперед
+        return MappingProxyType(gifts), compile_gift({'type': 'UNKNOWN'}, default_action).action
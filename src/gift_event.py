@@ -0,0 +1,81 @@
+"""
+Подія подарунка: компактний об'єкт зі слотами та монотонним часом у наносекундах
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# Зсув монотонного годинника відносно реального часу - той самий, що в трасуваннях:
+# всередині системи час події - лише ціле число, ISO рядок будується на межах (Socket.IO, HTTP)
+from common.tracing import WALL_OFFSET_NS
+
+
+def wall_time(monotonic_ns: int) -> float:
+    """Монотонний час у наносекундах -> секунди Unix (як time.time())"""
+    return (monotonic_ns + WALL_OFFSET_NS) / 1e9
+
+
+# Остання секунда та її ISO префікс: подарунки йдуть за часом, тож datetime потрібен раз на секунду
+_last_second = (None, '')
+
+
+def isoformat(monotonic_ns: int) -> str:
+    """Монотонний час у наносекундах -> ISO рядок місцевого часу (як datetime.isoformat())"""
+    global _last_second
+    seconds, rest = divmod(monotonic_ns + WALL_OFFSET_NS, 1_000_000_000)
+    cached = _last_second
+    if cached[0] != seconds:
+        cached = (seconds, datetime.fromtimestamp(seconds).isoformat())
+        _last_second = cached
+    micros = rest // 1000
+    return f"{cached[1]}.{micros:06d}" if micros else cached[1]
+
+
+class GiftEvent:
+    """Подарунок від моменту прийому до виконання дій
+
+    Змінюється лише count (об'єднання подарунків відправника понад ліміт).
+    trace_id присвоюється при прийомі (common/tracing.py) і передається пристроям разом з подарунком.
+    """
+
+    __slots__ = ('event_id', 'type', 'sender', 'value', 'count', 'stream', 'received_ns', 'trace_id', '_iso')
+
+    def __init__(self, event_id: str, gift_type: str, sender: str, value: int = 1, count: int = 1,
+                 stream: Optional[str] = None, received_ns: Optional[int] = None, trace_id: Optional[str] = None):
+        self.event_id = event_id
+        self.type = gift_type
+        self.sender = sender
+        self.value = value
+        self.count = count
+        self.stream = stream
+        self.received_ns = time.monotonic_ns() if received_ns is None else received_ns
+        self.trace_id = trace_id
+        self._iso: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"GiftEvent({self.event_id!r}, {self.type!r}, {self.sender!r}, count={self.count})"
+
+    @property
+    def timestamp(self) -> str:
+        """Момент прийому у форматі ISO (рядок будується один раз на подарунок)"""
+        if self._iso is None:
+            self._iso = isoformat(self.received_ns)
+        return self._iso
+
+    def age_ms(self) -> float:
+        """Скільки мілісекунд минуло від прийому"""
+        return (time.monotonic_ns() - self.received_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словник для JSON (Socket.IO, HTTP відповіді, команди пристроям)"""
+        return {
+            'event_id': self.event_id,
+            'type': self.type,
+            'sender': self.sender,
+            'timestamp': self.timestamp,
+            'value': self.value,
+            'count': self.count,
+            'stream': self.stream,
+            'trace_id': self.trace_id
+        }
@@ -0,0 +1,306 @@
+"""
+Стовпцева історія подарунків по ефірах: запис у фоновому потоці, запити через memory-mapped NumPy масиви
+"""
+
+import re
+import json
+import time
+import queue
+import logging
+import threading
+import importlib.util
+from array import array
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+
+from src.gift_event import GiftEvent, WALL_OFFSET_NS
+
+if TYPE_CHECKING:
+    import numpy
+
+logger = logging.getLogger(__name__)
+
+# NumPy потрібен лише для запитів і імпортується при першому запиті
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+# Стовпці: тип array для запису та відповідний dtype NumPy для читання (нативний порядок байтів)
+UINT32 = 'I' if array('I').itemsize == 4 else 'L'
+COLUMNS = {
+    'ts': ('q', 'i8'),          # реальний час прийому, нс
+    'type': (UINT32, 'u4'),     # код типу подарунка (словник types.jsonl)
+    'sender': (UINT32, 'u4'),   # код відправника (словник senders.jsonl)
+    'value': (UINT32, 'u4'),    # вартість одного подарунка в монетах
+    'count': (UINT32, 'u4'),
+}
+# Стовпці зі словниковим кодуванням -> файл словника
+DICTIONARIES = {'type': 'types.jsonl', 'sender': 'senders.jsonl'}
+METRICS = ('coins', 'gifts')
+MAX_QUERY_CELLS = 10_000_000
+
+
+class HistorySegment:
+    """Один ефір (від запуску моніторингу до зупинки): каталог із файлом на кожен стовпець"""
+
+    def __init__(self, path: Path, stream: str, started_ns: int):
+        self.path = path
+        self.stream = stream
+        self.started_ns = started_ns
+        # Словники запису: значення -> код
+        self.codes: Dict[str, Dict[str, int]] = {column: {} for column in DICTIONARIES}
+        self.buffer: Dict[str, array] = {column: array(code) for column, (code, _) in COLUMNS.items()}
+
+    @classmethod
+    def create(cls, root: Path, stream: str, started_ns: int) -> 'HistorySegment':
+        """Новий сегмент; started_ns - час першого подарунка"""
+        safe = re.sub(r'[^\w.-]', '_', stream) or 'stream'
+        path = root / f"{safe}-{datetime.fromtimestamp(started_ns / 1e9).strftime('%Y%m%dT%H%M%S%f')}"
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump({'stream': stream, 'started_ns': started_ns}, f, ensure_ascii=False)
+        return cls(path, stream, started_ns)
+
+    @classmethod
+    def open(cls, path: Path) -> Optional['HistorySegment']:
+        try:
+            with open(path / 'meta.json', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(path, meta['stream'], meta['started_ns'])
+
+    def append(self, received_ns: int, gift_type: str, sender: str, value: int, count: int):
+        """Рядок у буфер запису (словники поповнюються тут же)"""
+        buffer = self.buffer
+        buffer['ts'].append(received_ns)
+        buffer['type'].append(self._encode('type', gift_type))
+        buffer['sender'].append(self._encode('sender', sender))
+        buffer['value'].append(value)
+        buffer['count'].append(count)
+
+    def flush(self) -> int:
+        """Дописування буфера в кінець файлів стовпців"""
+        rows = len(self.buffer['ts'])
+        if not rows:
+            return 0
+        for column, values in self.buffer.items():
+            with open(self.path / f"{column}.bin", 'ab') as f:
+                values.tofile(f)
+            del values[:]
+        return rows
+
+    def names(self, column: str) -> List[str]:
+        """Словник стовпця: код -> значення"""
+        try:
+            with open(self.path / DICTIONARIES[column], encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def columns(self, np) -> Dict[str, 'numpy.ndarray']:
+        """Стовпці як memory-mapped масиви однакової довжини"""
+        sizes = {}
+        for column, (_, dtype) in COLUMNS.items():
+            path = self.path / f"{column}.bin"
+            sizes[column] = path.stat().st_size // np.dtype(dtype).itemsize if path.exists() else 0
+        # Запис триває: читаємо лише рядки, вже дописані в усі стовпці
+        rows = min(sizes.values())
+        if rows == 0:
+            return {}
+        return {column: np.memmap(self.path / f"{column}.bin", dtype=dtype, mode='r', shape=(rows,))
+                for column, (_, dtype) in COLUMNS.items()}
+
+    def describe(self) -> Dict[str, Any]:
+        path = self.path / 'ts.bin'
+        return {
+            'segment': self.path.name,
+            'stream': self.stream,
+            'started_at': datetime.fromtimestamp(self.started_ns / 1e9).isoformat(),
+            'rows': path.stat().st_size // 8 if path.exists() else 0
+        }
+
+    def _encode(self, column: str, value: str) -> int:
+        codes = self.codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            # Словник дописується раніше за стовпці, тож читач завжди знає кожен код
+            with open(self.path / DICTIONARIES[column], 'a', encoding='utf-8') as f:
+                f.write(json.dumps(value, ensure_ascii=False) + '\n')
+        return code
+
+
+class GiftHistory:
+    """Історія подарунків: append з циклу обробки подарунків, запис і запити - поза ним
+
+    append лише ставить подію в чергу; потік запису групує рядки та раз на
+    flush_interval секунд дописує їх у файли стовпців сегмента ефіру.
+    """
+
+    def __init__(self, root: str = 'data/history', flush_interval: float = 1.0, batch_size: int = 4096):
+        self.root = Path(root)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: 'queue.SimpleQueue[Optional[Tuple]]' = queue.SimpleQueue()
+        self._segments: Dict[str, HistorySegment] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'appended': 0, 'written': 0, 'flushes': 0, 'errors': 0}
+
+    def start(self):
+        """Запуск потоку запису"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='gift-history', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Дописування черги та зупинка потоку"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def append(self, gift_event: GiftEvent):
+        """Подарунок в історію (O(1), без вводу/виводу)"""
+        self._queue.put(('gift', gift_event.stream or 'simulated', gift_event.received_ns + WALL_OFFSET_NS,
+                         gift_event.type, gift_event.sender, gift_event.value, gift_event.count))
+        self.stats['appended'] += 1
+
+    def end_stream(self, stream: str):
+        """Завершення сегмента: наступні подарунки ефіру підуть у новий сегмент"""
+        self._queue.put(('end', stream))
+
+    def list_segments(self, streams: Optional[List[str]] = None) -> List[HistorySegment]:
+        """Сегменти від найстарішого до найновішого"""
+        if not self.root.exists():
+            return []
+        segments = [HistorySegment.open(path) for path in self.root.iterdir() if path.is_dir()]
+        segments = [segment for segment in segments
+                    if segment and (not streams or segment.stream in streams)]
+        return sorted(segments, key=lambda segment: segment.started_ns)
+
+    def query(self, streams: Optional[List[str]] = None, last: int = 50, bucket: float = 60.0,
+              by: str = 'type', metric: str = 'coins', align: str = 'stream',
+              start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+        """Сума metric за кошиками по bucket секунд з розбивкою by (type або sender)
+
+        align='stream' - час від початку кожного ефіру (хвилина ефіру), 'time' - реальний час.
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("Для запитів до історії потрібен numpy")
+        if by not in DICTIONARIES or metric not in METRICS or align not in ('stream', 'time'):
+            raise ValueError(f"Некоректний запит: by={by}, metric={metric}, align={align}")
+        import numpy as np
+
+        bucket_ns = int(bucket * 1e9)
+        names: Dict[str, int] = {}
+        times, keys, weights = [], [], []
+        segments = self.list_segments(streams)[-last:] if last else self.list_segments(streams)
+
+        for segment in segments:
+            columns = segment.columns(np)
+            if not columns:
+                continue
+            ts = columns['ts']
+            rows = slice(None)
+            if start is not None or end is not None:
+                rows = np.ones(len(ts), dtype=bool)
+                if start is not None:
+                    rows &= ts >= int(start * 1e9)
+                if end is not None:
+                    rows &= ts < int(end * 1e9)
+
+            # Локальні коди сегмента -> спільні коди запиту
+            lookup = np.array([names.setdefault(name, len(names)) for name in segment.names(by)], dtype=np.int64)
+            codes = columns[by][rows]
+            if len(lookup) <= int(codes.max(initial=0)):
+                continue
+            keys.append(lookup[codes])
+            if align == 'stream':
+                times.append(np.maximum(ts[rows] - segment.started_ns, 0))
+            else:
+                times.append(ts[rows])
+            if metric == 'coins':
+                weights.append(columns['value'][rows].astype(np.int64) * columns['count'][rows])
+            else:
+                weights.append(columns['count'][rows])
+
+        result = {'bucket': bucket, 'by': by, 'metric': metric, 'align': align,
+                  'segments': len(segments), 'start': None, 'keys': [], 'series': {}, 'totals': {}}
+        if not times or not sum(len(part) for part in times):
+            return result
+
+        ts = np.concatenate(times)
+        key = np.concatenate(keys)
+        weight = np.concatenate(weights)
+
+        origin = 0 if align == 'stream' else int(ts.min()) // bucket_ns * bucket_ns
+        index = (ts - origin) // bucket_ns
+        buckets = int(index.max()) + 1
+        if buckets * len(names) > MAX_QUERY_CELLS:
+            raise ValueError("Забагато кошиків: збільште bucket або звузьте діапазон")
+
+        # Одна векторна агрегація: комірка = кошик * кількість ключів + ключ
+        grid = np.bincount(index * len(names) + key, weights=weight,
+                           minlength=buckets * len(names)).reshape(buckets, len(names))
+        labels = sorted(names, key=names.get)
+        totals = grid.sum(axis=0)
+
+        result.update({
+            'start': datetime.fromtimestamp(origin / 1e9).isoformat() if align == 'time' else None,
+            'buckets': buckets,
+            'keys': labels,
+            'series': {label: grid[:, code].astype(np.int64).tolist() for label, code in names.items()},
+            'totals': {label: int(totals[code]) for label, code in names.items()}
+        })
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу запису"""
+        return {'root': str(self.root), 'open_segments': len(self._segments),
+                'numpy_available': NUMPY_AVAILABLE, **self.stats}
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        pending = 0
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is None:
+                    self._flush()
+                    return
+                pending += self._handle(item)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Помилка запису історії подарунків: {e}")
+
+            if pending >= self.batch_size or time.monotonic() >= deadline:
+                self._flush()
+                pending = 0
+                deadline = time.monotonic() + self.flush_interval
+
+    def _handle(self, item: Tuple) -> int:
+        if item[0] == 'end':
+            segment = self._segments.pop(item[1], None)
+            if segment:
+                self.stats['written'] += segment.flush()
+            return 0
+
+        _, stream, received_ns, gift_type, sender, value, count = item
+        segment = self._segments.get(stream)
+        if segment is None:
+            segment = self._segments[stream] = HistorySegment.create(self.root, stream, received_ns)
+        segment.append(received_ns, gift_type, sender, value, count)
+        return 1
+
+    def _flush(self):
+        for segment in list(self._segments.values()):
+            try:
+                self.stats['written'] += segment.flush()
+            except OSError as e:
+                self.stats['errors'] += 1
+                logger.error(f"Помилка запису сегмента {segment.path}: {e}")
+        self.stats['flushes'] += 1
@@ -0,0 +1,101 @@
+"""
+Обмеження частоти запитів, подарунків та команд пристроям (token bucket)
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Hashable
+
+# Що робити з подією понад ліміт
+RATE_POLICIES = ('drop', 'delay', 'merge')
+
+
+class TokenBucket:
+    """Відро токенів: rate токенів за секунду, не більше burst накопичених"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def reserve(self, now: float, max_wait: float = 0.0) -> Optional[float]:
+        """Резервування токена: 0 - одразу, >0 - через скільки секунд, None - не раніше max_wait"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        # Токен може "позичатися" наперед - наступні події чекатимуть довше
+        self.tokens -= 1
+        return wait
+
+    def retry_after(self, now: float) -> float:
+        """Через скільки секунд з'явиться токен"""
+        tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        return max(0.0, (1 - tokens) / self.rate)
+
+
+class RateLimiter:
+    """Окреме відро для кожного ключа (клієнт, відправник, пристрій)
+
+    Кількість відер обмежена max_keys: найдовше не використовувані видаляються.
+    """
+
+    def __init__(self, rate: float, burst: float, policy: str = 'drop', max_delay: float = 2.0,
+                 max_keys: int = 10000):
+        if policy not in RATE_POLICIES:
+            raise ValueError(f"Невідома політика обмеження: {policy}")
+
+        self.rate = rate
+        self.burst = burst
+        self.policy = policy
+        self.max_delay = max_delay
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[Hashable, TokenBucket]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'allowed': 0, 'delayed': 0, 'dropped': 0, 'merged': 0}
+
+    def check(self, key: Hashable) -> Optional[float]:
+        """0 - дозволено, >0 - виконати із затримкою (delay), None - понад ліміт (drop/merge)"""
+        if self.rate <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        max_wait = self.max_delay if self.policy == 'delay' else 0.0
+        with self._lock:
+            bucket = self._bucket(key, now)
+            wait = bucket.reserve(now, max_wait)
+
+            if wait is None:
+                self.stats['merged' if self.policy == 'merge' else 'dropped'] += 1
+            elif wait > 0:
+                self.stats['delayed'] += 1
+            else:
+                self.stats['allowed'] += 1
+            return wait
+
+    def retry_after(self, key: Hashable) -> float:
+        """Через скільки секунд ключ знову отримає токен"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            return bucket.retry_after(now) if bucket else 0.0
+
+    def get_status(self) -> Dict[str, Any]:
+        """Отримання статусу обмежувача"""
+        return {'rate': self.rate, 'burst': self.burst, 'policy': self.policy,
+                'keys': len(self._buckets), **self.stats}
+
+    def _bucket(self, key: Hashable, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
@@ -0,0 +1,402 @@
+"""
+Робота з Arduino в окремому процесі: команди та відповіді через кільця в спільній пам'яті
+
+Запуск процесу виконує SerialWorkerClient; вручну (для діагностики):
+    python -m src.serial_worker --requests <ім'я> --replies <ім'я>
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import itertools
+import threading
+import subprocess
+from typing import Dict, Any, List, Optional
+
+from src.arduino_manager import ArduinoManager
+from src.shm_ring import ShmRing
+from common.tracing import TraceStore
+
+logger = logging.getLogger(__name__)
+
+# Методи ArduinoManager, доступні через кільце
+WORKER_METHODS = ('get_available_ports', 'connect', 'disconnect', 'disconnect_all', 'is_connected',
+                  'send_command', 'get_device_status', 'get_all_devices_status', 'sync_clock',
+                  'heartbeat_check')
+# Методи, прив'язані до одного порту: індекс аргументу з портом (None - перший підключений)
+PORT_METHODS = {'connect': 0, 'disconnect': 0, 'get_device_status': 0, 'sync_clock': 0, 'send_command': 1}
+STOP = 'stop'
+# Як часто процес без запитів перевіряє, що сервер ще працює (секунди)
+PARENT_CHECK_INTERVAL = 1.0
+# Процес запускається як python -m src.serial_worker з кореня проекту
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def encode(message: List[Any]) -> bytes:
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def decode(data: bytes) -> List[Any]:
+    return json.loads(data)
+
+
+class RequestLanes:
+    """Виконання запитів процесу: окремий потік (черга) на кожен порт
+
+    Запити одного порту виконуються по черзі, різних портів - паралельно, тож connect
+    чи heartbeat одного Arduino не затримують команди іншим. Методи без порту мають власні
+    черги за назвою методу. Відповіді з усіх потоків пишуться в кільце під блокуванням
+    (у кільця один записувач). Запит, чий термін (deadline, time.monotonic() сервера - той
+    самий годинник машини) минув у черзі, не виконується: клієнт уже повернув тайм-аут.
+    """
+
+    def __init__(self, replies: ShmRing, manager: ArduinoManager, tracer: TraceStore):
+        self.replies = replies
+        self.manager = manager
+        self.tracer = tracer
+        self._queues: Dict[str, 'queue.SimpleQueue'] = {}
+        self._threads: List[threading.Thread] = []
+        self._reply_lock = threading.Lock()
+
+    def lane(self, method: str, args: List[Any]) -> str:
+        """Черга запиту: порт або назва методу"""
+        index = PORT_METHODS.get(method)
+        if index is None:
+            return method
+        port = args[index] if len(args) > index else None
+        if port is None:
+            port = next(iter(self.manager.connected_devices), None)
+        return f"port:{port}"
+
+    def submit(self, request_id: int, method: str, args: List[Any], deadline: Optional[float]):
+        key = self.lane(method, args)
+        lane = self._queues.get(key)
+        if lane is None:
+            lane = self._queues[key] = queue.SimpleQueue()
+            thread = threading.Thread(target=self._run, args=(lane,), name=f"serial-{key}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        lane.put((request_id, method, args, deadline))
+
+    def stop(self, timeout: float = 5.0):
+        """Завершення черг після вже прийнятих запитів"""
+        for lane in self._queues.values():
+            lane.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def reply(self, message: List[Any], timeout: float = 5.0):
+        with self._reply_lock:
+            if not self.replies.put_wait(encode(message), timeout):
+                logger.error("Кільце відповідей заповнене, відповідь %s втрачено", message[0])
+
+    def _run(self, lane: 'queue.SimpleQueue'):
+        while True:
+            item = lane.get()
+            if item is None:
+                return
+            self.execute(*item)
+
+    def execute(self, request_id: int, method: str, args: List[Any], deadline: Optional[float]):
+        if deadline is not None and time.monotonic() > deadline:
+            logger.warning("Запит %s (%s) пропущено: сервер уже не чекає на відповідь", request_id, method)
+            return
+
+        spans = None
+        error = None
+        result = None
+        try:
+            if method not in WORKER_METHODS:
+                raise ValueError(f"Невідомий метод: {method}")
+            result = getattr(self.manager, method)(*args)
+            if method == 'send_command' and len(args) > 3:
+                # Відрізки serial_write / arduino_ack повертаються разом з відповіддю
+                spans = self.tracer.take(args[3])
+        except Exception as e:
+            logger.error(f"Помилка виконання {method}: {e}")
+            error = str(e)
+        self.reply([request_id, result, spans, error])
+
+
+def serve(requests: ShmRing, replies: ShmRing, manager: ArduinoManager, tracer: TraceStore,
+          parent_pid: Optional[int] = None):
+    """Цикл процесу-обробника: запит [id, метод, аргументи, термін] -> відповідь [id, результат, відрізки, помилка]
+
+    Процес завершується разом із сервером: якщо батьківський процес зник (SIGKILL, збій),
+    порти звільняються, а не лишаються зайнятими процесом-сиротою.
+    """
+    lanes = RequestLanes(replies, manager, tracer)
+    while True:
+        data = requests.get_wait(PARENT_CHECK_INTERVAL)
+        if data is None:
+            if parent_pid is not None and os.getppid() != parent_pid:
+                logger.warning("Сервер (pid %s) завершився, процес роботи з Arduino зупиняється", parent_pid)
+                return
+            continue
+        try:
+            request_id, method, args, *rest = decode(data)
+        except ValueError as e:
+            logger.error(f"Пошкоджений запит у кільці ({len(data)} байт): {e}")
+            continue
+        if method == STOP:
+            lanes.stop()
+            manager.disconnect_all()
+            lanes.reply([request_id, True, None, None], 1.0)
+            return
+        lanes.submit(request_id, method, args, rest[0] if rest else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Процес роботи з Arduino')
+    parser.add_argument('--requests', required=True, help="Ім'я спільної пам'яті кільця запитів")
+    parser.add_argument('--replies', required=True, help="Ім'я спільної пам'яті кільця відповідей")
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--timeout', type=int, default=5)
+    parser.add_argument('--trace-frames', action='store_true', help='Суфікс #<trace_id> у командах')
+    parser.add_argument('--log-file', default='logs/serial_worker.log')
+    parser.add_argument('--log-level', default='INFO')
+    parser.add_argument('--parent-pid', type=int, help='PID сервера: без нього процес завершується')
+    args = parser.parse_args()
+
+    from common.logging_config import setup_logging
+    setup_logging(args.log_level, args.log_file, sampled_loggers=('src.arduino_manager.commands',))
+
+    requests = ShmRing.attach(args.requests)
+    replies = ShmRing.attach(args.replies)
+    tracer = TraceStore(capacity=256)
+    manager = ArduinoManager(args.baudrate, args.timeout, tracer=tracer, trace_frames=args.trace_frames)
+    logger.info("Процес роботи з Arduino запущено")
+    try:
+        serve(requests, replies, manager, tracer, args.parent_pid)
+    finally:
+        manager.disconnect_all()
+        requests.close()
+        replies.close()
+    logger.info("Процес роботи з Arduino зупинено")
+
+
+class SerialWorkerClient:
+    """Той самий інтерфейс, що в ArduinoManager, але послідовні порти обслуговує окремий процес
+
+    Запис у порт та очікування відповіді Arduino не конкурують за GIL з Flask-SocketIO,
+    а запити й відповіді передаються кільцями в спільній пам'яті без pickle та каналів.
+    Якщо процес завершився, він перезапускається при наступному виклику і заново
+    підключає порти, підключені раніше.
+    """
+
+    def __init__(self, default_baudrate: int = 9600, timeout: int = 5, tracer: Optional[TraceStore] = None,
+                 trace_frames: bool = False, ring_size: int = 1 << 18, log_file: str = 'logs/serial_worker.log',
+                 log_level: str = 'INFO'):
+        self.default_baudrate = default_baudrate
+        self.timeout = timeout
+        self.tracer = tracer or TraceStore(enabled=False)
+        self.trace_frames = trace_frames
+        self.ring_size = ring_size
+        self.log_file = log_file
+        self.log_level = log_level
+
+        self._requests: Optional[ShmRing] = None
+        self._replies: Optional[ShmRing] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+        self._closing = False
+        # Потік відповідей спить, поки немає запитів, що чекають відповіді
+        self._wakeup = threading.Event()
+        # Кільце запитів має одного записувача: потоки цього процесу пишуть по черзі
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        # Підключені порти (порт -> швидкість) для відновлення після перезапуску процесу
+        self._ports: Dict[str, int] = {}
+        self.stats = {'calls': 0, 'timeouts': 0, 'late_replies': 0, 'restarts': 0, 'last_call_ms': None}
+
+    def start(self):
+        """Створення кілець та запуск процесу"""
+        with self._start_lock:
+            if self.alive:
+                return
+            self._shutdown()
+            self._closing = False
+            self._requests = ShmRing.create(self.ring_size)
+            self._replies = ShmRing.create(self.ring_size)
+            command = [sys.executable, '-m', 'src.serial_worker',
+                       '--requests', self._requests.name, '--replies', self._replies.name,
+                       '--baudrate', str(self.default_baudrate), '--timeout', str(self.timeout),
+                       '--log-file', os.path.abspath(self.log_file), '--log-level', self.log_level,
+                       '--parent-pid', str(os.getpid())]
+            if self.trace_frames:
+                command.append('--trace-frames')
+            self._process = subprocess.Popen(command, cwd=PROJECT_ROOT)
+            self._reader = threading.Thread(target=self._read_replies, args=(self._replies,),
+                                            name='serial-worker-replies', daemon=True)
+            self._reader.start()
+            logger.info("Процес роботи з Arduino запущено (pid %s)", self._process.pid)
+
+    def stop(self, timeout: float = 5.0):
+        """Відключення портів і зупинка процесу"""
+        with self._start_lock:
+            if self.alive:
+                self._request(STOP, [], timeout)
+                try:
+                    self._process.wait(timeout)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+            self._shutdown()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    # Інтерфейс ArduinoManager
+    def get_available_ports(self) -> List[Dict[str, str]]:
+        return self._call('get_available_ports', []) or []
+
+    def connect(self, port: str, baudrate: Optional[int] = None) -> bool:
+        baudrate = baudrate or self.default_baudrate
+        # Підключення чекає ініціалізації Arduino (близько 2 секунд)
+        connected = self._call('connect', [port, baudrate], self.timeout + 5)
+        if connected:
+            self._ports[port] = baudrate
+        elif connected is None:
+            # Тайм-аут: процес міг підключити порт уже після нього. disconnect стає в ту саму
+            # чергу порту після connect, тож порт у процесі гарантовано відключений, як і тут
+            self._call('disconnect', [port])
+        return bool(connected)
+
+    def disconnect(self, port: str) -> bool:
+        self._ports.pop(port, None)
+        return bool(self._call('disconnect', [port]))
+
+    def disconnect_all(self):
+        self._ports.clear()
+        self._call('disconnect_all', [])
+
+    def is_connected(self, port: Optional[str] = None) -> bool:
+        return bool(self._call('is_connected', [port]))
+
+    def send_command(self, command: str, port: Optional[str] = None,
+                     execute_at: Optional[float] = None, trace_id: Optional[str] = None) -> Optional[str]:
+        return self._call('send_command', [command, port, execute_at, trace_id], self.timeout + 1, trace_id)
+
+    def get_device_status(self, port: str) -> Optional[Dict[str, Any]]:
+        return self._call('get_device_status', [port])
+
+    def get_all_devices_status(self) -> Dict[str, Dict[str, Any]]:
+        return self._call('get_all_devices_status', []) or {}
+
+    def sync_clock(self, port: str) -> Optional[Dict[str, float]]:
+        return self._call('sync_clock', [port])
+
+    def heartbeat_check(self):
+        self._call('heartbeat_check', [], self.timeout * 3)
+
+    # Команди для компонентів будуються так само, як в ArduinoManager
+    send_gift_command = ArduinoManager.send_gift_command
+    send_led_command = ArduinoManager.send_led_command
+    send_servo_command = ArduinoManager.send_servo_command
+    send_sound_command = ArduinoManager.send_sound_command
+    send_display_command = ArduinoManager.send_display_command
+
+    def get_status(self) -> Dict[str, Any]:
+        """Стан процесу та кілець"""
+        return {
+            'alive': self.alive,
+            'pid': self._process.pid if self._process else None,
+            'pending': len(self._pending),
+            'ring_size': self.ring_size,
+            **self.stats
+        }
+
+    def _call(self, method: str, args: List[Any], timeout: Optional[float] = None,
+              trace_id: Optional[str] = None) -> Any:
+        """Виклик методу ArduinoManager у процесі (процес, що завершився, перезапускається)"""
+        if not self.alive:
+            self._restart()
+            if not self.alive:
+                logger.error("Процес роботи з Arduino не запущено")
+                return None
+        return self._request(method, args, timeout, trace_id)
+
+    def _request(self, method: str, args: List[Any], timeout: Optional[float] = None,
+                 trace_id: Optional[str] = None) -> Any:
+        """Запит до процесу та очікування відповіді (None - помилка або тайм-аут)"""
+        timeout = timeout or float(self.timeout)
+        request_id = next(self._ids)
+        waiter = {'event': threading.Event(), 'reply': None}
+        self._pending[request_id] = waiter
+        self._wakeup.set()
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        try:
+            with self._write_lock:
+                sent = self._requests.put_wait(encode([request_id, method, args, deadline]), timeout)
+            if not sent:
+                logger.error("Кільце запитів до процесу Arduino заповнене")
+                return None
+            if not waiter['event'].wait(timeout):
+                self.stats['timeouts'] += 1
+                logger.error(f"Процес Arduino не відповів на {method} за {timeout} с")
+                return None
+        finally:
+            self._pending.pop(request_id, None)
+
+        self.stats['calls'] += 1
+        self.stats['last_call_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        _, result, spans, error = waiter['reply']
+        if spans:
+            # Той самий годинник машини: відрізки процесу додаються без зсуву
+            self.tracer.merge(trace_id, spans, source='serial_worker')
+        if error:
+            logger.error(f"Помилка {method} у процесі Arduino: {error}")
+        return result
+
+    def _read_replies(self, replies: ShmRing):
+        """Потік розбору відповідей: відповідь передається потоку, що чекає на неї"""
+        while not self._closing:
+            if not self._pending:
+                self._wakeup.wait(0.5)
+                self._wakeup.clear()
+                continue
+            data = replies.get_wait(0.05, 0.001)
+            if data is None:
+                continue
+            reply = decode(data)
+            waiter = self._pending.get(reply[0])
+            if waiter is None:
+                # Запит уже завершився тайм-аутом: запізніла відповідь відкидається
+                self.stats['late_replies'] += 1
+                continue
+            waiter['reply'] = reply
+            waiter['event'].set()
+
+    def _restart(self):
+        """Перезапуск процесу, що завершився, з повторним підключенням портів"""
+        with self._start_lock:
+            if self.alive:
+                return
+            if self._process is not None:
+                self.stats['restarts'] += 1
+                logger.warning("Процес роботи з Arduino завершився (код %s), перезапуск", self._process.poll())
+            self.start()
+            for port, baudrate in list(self._ports.items()):
+                if not self._request('connect', [port, baudrate], self.timeout + 5):
+                    logger.error(f"Не вдалося повторно підключити Arduino на порту {port}")
+
+    def _shutdown(self):
+        self._closing = True
+        if self._reader:
+            self._reader.join(1.0)
+            self._reader = None
+        for ring in (self._requests, self._replies):
+            if ring:
+                ring.close()
+        self._requests = self._replies = None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Кільцевий буфер повідомлень у спільній пам'яті між двома процесами (один пише, один читає)
+"""
+
+import time
+import struct
+import platform
+from multiprocessing import shared_memory
+from typing import Optional
+
+# Заголовок: head - скільки байтів записано, tail - скільки прочитано (лічильники лише зростають)
+HEADER_SIZE = 16
+LENGTH = struct.Struct('<I')
+# Запис-заповнювач до кінця буфера, коли повідомлення не вміщується перед переходом на початок
+PADDING = 0xFFFFFFFF
+
+# Кільце покладається на те, що процесор не переставляє записи (TSO x86/x86-64): у Python
+# немає бар'єрів пам'яті, а на ARM (Raspberry Pi) читач міг би побачити head раніше за дані
+STRONG_ORDERING_MACHINES = ('x86_64', 'amd64', 'i386', 'i686', 'x86')
+STRONG_ORDERING = platform.machine().lower() in STRONG_ORDERING_MACHINES
+
+# Очікування нових повідомлень: спершу поступки процесору, потім сон, що зростає до MAX_BACKOFF
+SPIN_ROUNDS = 64
+MIN_BACKOFF = 0.00005
+MAX_BACKOFF = 0.002
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Підключення до спільної пам'яті, створеної іншим процесом
+
+    Без зняття з обліку resource_tracker (Python < 3.13) видалив би пам'ять при виході цього процесу.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def require_strong_ordering():
+    if not STRONG_ORDERING:
+        raise RuntimeError(f"Кільце в спільній пам'яті потребує x86/x86-64, а не {platform.machine()}")
+
+
+class ShmRing:
+    """Кільце без блокувань для одного процесу-записувача та одного процесу-читача
+
+    Записувач змінює лише head, читач - лише tail; індекс публікується після даних
+    одним вирівняним 8-байтовим записом (memoryview формату 'Q', а не побайтовий struct),
+    тож читач ніколи не бачить неповне повідомлення. Порядок записів гарантує лише модель
+    пам'яті x86/x86-64, тому на інших архітектурах кільце не створюється (RuntimeError).
+    Повідомлення - байти з 4-байтовою довжиною, без pickle.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        # index[0] - head, index[1] - tail
+        self.index = shm.buf[:HEADER_SIZE].cast('Q')
+        self.capacity = len(shm.buf) - HEADER_SIZE
+
+    @classmethod
+    def create(cls, size: int) -> 'ShmRing':
+        """Нове кільце (size - байтів під повідомлення)"""
+        require_strong_ordering()
+        shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + size)
+        ring = cls(shm, owner=True)
+        ring.index[0] = ring.index[1] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> 'ShmRing':
+        require_strong_ordering()
+        return cls(attach_shared_memory(name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def put(self, data: bytes) -> bool:
+        """Запис повідомлення; False - кільце заповнене"""
+        need = LENGTH.size + len(data)
+        if need > self.capacity:
+            raise ValueError(f"Повідомлення {len(data)} байт не вміщується в кільце {self.capacity} байт")
+
+        head, tail = self.index[0], self.index[1]
+        position = head % self.capacity
+        contiguous = self.capacity - position
+        skip = contiguous if need > contiguous else 0
+        if head - tail + skip + need > self.capacity:
+            return False
+
+        if skip:
+            if contiguous >= LENGTH.size:
+                LENGTH.pack_into(self.buf, HEADER_SIZE + position, PADDING)
+            head += skip
+            position = 0
+
+        offset = HEADER_SIZE + position
+        LENGTH.pack_into(self.buf, offset, len(data))
+        self.buf[offset + LENGTH.size:offset + need] = data
+        # Публікація: читач побачить повідомлення лише після оновлення head
+        self.index[0] = head + need
+        return True
+
+    def get(self) -> Optional[bytes]:
+        """Наступне повідомлення або None, якщо кільце порожнє"""
+        tail = self.index[1]
+        if tail == self.index[0]:
+            return None
+
+        position = tail % self.capacity
+        contiguous = self.capacity - position
+        if contiguous < LENGTH.size or LENGTH.unpack_from(self.buf, HEADER_SIZE + position)[0] == PADDING:
+            tail += contiguous
+            position = 0
+
+        offset = HEADER_SIZE + position
+        length = LENGTH.unpack_from(self.buf, offset)[0]
+        data = bytes(self.buf[offset + LENGTH.size:offset + LENGTH.size + length])
+        self.index[1] = tail + LENGTH.size + length
+        return data
+
+    def put_wait(self, data: bytes, timeout: float) -> bool:
+        """Запис з очікуванням вільного місця не довше timeout секунд"""
+        deadline = time.monotonic() + timeout
+        backoff = MIN_BACKOFF
+        while not self.put(data):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+        return True
+
+    def get_wait(self, timeout: Optional[float] = None, max_backoff: float = MAX_BACKOFF) -> Optional[bytes]:
+        """Очікування повідомлення (опитування зі зростаючою паузою); None - минув timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        rounds = 0
+        backoff = MIN_BACKOFF
+        while True:
+            data = self.get()
+            if data is not None:
+                return data
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            rounds += 1
+            if rounds < SPIN_ROUNDS:
+                time.sleep(0)
+            else:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+
+    def pending(self) -> int:
+        """Байтів, що очікують читання"""
+        return self.index[0] - self.index[1]
+
+    def close(self):
+        """Відключення (власник також видаляє спільну пам'ять)"""
+        self.index.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
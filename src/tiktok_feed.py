@@ -0,0 +1,136 @@
+"""
+Локальний потік подій TikTok LIVE: повторення записаних кадрів подарунків для TikTokMonitor
+
+Запуск:
+    python -m src.tiktok_feed
+    python -m src.tiktok_feed --file src/recorded_gifts.jsonl --port 8765 --speed 2 --loop
+"""
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, Any, List, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RECORDING = Path(__file__).with_name('recorded_gifts.jsonl')
+
+
+def load_recording(path) -> List[Dict[str, Any]]:
+    """Завантаження записаних кадрів (один JSON на рядок, offset - секунди від початку)"""
+    frames = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                frames.append(json.loads(line))
+    return sorted(frames, key=lambda frame: frame.get('offset', 0))
+
+
+class ReplayFeedServer:
+    """TCP сервер, що повторює записані кадри кожному підписаному клієнту"""
+
+    def __init__(self, frames: List[Dict[str, Any]], host: str = '127.0.0.1', port: int = 8765,
+                 speed: float = 1.0, loop: bool = False, heartbeat: float = 10.0):
+        self.frames = frames
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.loop = loop
+        self.heartbeat = heartbeat
+        self.server = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        """Відкриття порту"""
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Потік подій слухає tcp://{self.host}:{self.port} ({len(self.frames)} кадрів)")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """Закриття сервера та всіх з'єднань"""
+        for writer in list(self._writers):
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def publish(self, frame: Dict[str, Any]):
+        """Надсилання кадру всім підключеним клієнтам"""
+        for writer in list(self._writers):
+            await self._send(writer, frame)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            subscribe = json.loads(await reader.readline() or b'{}')
+            room = subscribe.get('room', '')
+            logger.info(f"Клієнт підписався на ефір @{room}")
+            await self._replay(writer, room)
+            # Після запису з'єднання тримається heartbeat'ами
+            while True:
+                await asyncio.sleep(self.heartbeat)
+                await self._send(writer, {'type': 'heartbeat'})
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _replay(self, writer: asyncio.StreamWriter, room: str):
+        """Надсилання записаних кадрів з оригінальними інтервалами"""
+        iteration = 0
+        while True:
+            started = time.monotonic()
+            last_heartbeat = started
+            for frame in self.frames:
+                delay = started + frame.get('offset', 0) / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if time.monotonic() - last_heartbeat >= self.heartbeat:
+                    await self._send(writer, {'type': 'heartbeat'})
+                    last_heartbeat = time.monotonic()
+                if frame.get('room', room) == room:
+                    data = {k: v for k, v in frame.items() if k != 'offset'}
+                    # Кожне коло запису - нові повідомлення, а не повтори
+                    if iteration and 'msg_id' in data:
+                        data['msg_id'] = f"{data['msg_id']}-{iteration}"
+                    await self._send(writer, data)
+            if not self.loop:
+                return
+            iteration += 1
+
+    async def _send(self, writer: asyncio.StreamWriter, frame: Dict[str, Any]):
+        # ts - момент відправки, за ним монітор рахує затримку доставки
+        data = {**frame, 'ts': time.time()}
+        writer.write(json.dumps(data, ensure_ascii=False).encode('utf-8') + b'\n')
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальний потік подій TikTok LIVE із запису')
+    parser.add_argument('--file', default=str(DEFAULT_RECORDING), help='Файл із записаними кадрами (JSONL)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--speed', type=float, default=1.0, help='Прискорення відтворення')
+    parser.add_argument('--loop', action='store_true', help='Повторювати запис по колу')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = ReplayFeedServer(load_recording(args.file), args.host, args.port, args.speed, args.loop)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
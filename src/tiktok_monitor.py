@@ -0,0 +1,260 @@
+"""
+Моніторинг TikTok LIVE через постійне з'єднання з потоком подій (asyncio)
+
+Монітор читає лише потік JSON кадрів (TIKTOK_FEED_URL): повторення записаних подарунків
+з src/tiktok_feed.py або зовнішній міст, що пише кадри того ж формату. Підключення
+до webcast протоколу TikTok (прямий прийом подарунків з ефіру) у проєкт не входить.
+"""
+
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from urllib.parse import urlsplit
+from typing import Callable, Dict, Any, Optional, Tuple
+
+from src.gift_catalog import GiftCatalog, gift_type_from_name
+from src.gift_event import GiftEvent
+
+logger = logging.getLogger(__name__)
+
+# Потік подій за замовчуванням - локальний сервер повторення (src/tiktok_feed.py)
+DEFAULT_FEED_URL = 'tcp://127.0.0.1:8765'
+
+
+def parse_frame(line: bytes) -> Optional[Dict[str, Any]]:
+    """Розбір одного кадру потоку (JSON рядок)"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        frame = json.loads(line)
+    except (ValueError, UnicodeDecodeError):
+        logger.warning(f"Некоректний кадр потоку: {line[:80]!r}")
+        return None
+    return frame if isinstance(frame, dict) else None
+
+
+class GiftFrameDecoder:
+    """Перетворення кадрів 'gift' на події подарунків з урахуванням серій (combo)
+
+    Серійний подарунок надходить кількома кадрами з наростаючим repeat_count;
+    подія створюється одразу для кожного приросту, а не лише в кінці серії.
+    Стан серій переживає перепідключення: кадр серії, надісланий повторно з новим msg_id,
+    дає лише приріст, а не всю кількість. Серія без repeat_end забувається через streak_ttl.
+    """
+
+    def __init__(self, catalog: Optional[GiftCatalog] = None, streak_ttl: float = 60.0):
+        self.catalog = catalog or GiftCatalog()
+        self.streak_ttl = streak_ttl
+        # (відправник, id подарунка, group_id) -> (вже оброблена кількість у серії, час останнього кадру)
+        self._streaks: Dict[Tuple[str, Any, Any], Tuple[int, float]] = {}
+        self._swept_at = time.monotonic()
+
+    def decode(self, frame: Dict[str, Any], stream: str) -> Optional[GiftEvent]:
+        """Подія подарунка з кадру або None, якщо нового подарунка немає"""
+        gift = frame.get('gift') or {}
+        user = frame.get('user') or {}
+        if not isinstance(gift, dict) or not isinstance(user, dict):
+            logger.warning("Некоректний кадр подарунка: %r", frame.get('msg_id'))
+            return None
+        try:
+            repeat_count = int(gift.get('repeat_count', 1))
+        except (TypeError, ValueError):
+            logger.warning("Некоректний repeat_count у кадрі %r", frame.get('msg_id'))
+            return None
+
+        sender = user.get('nickname') or user.get('unique_id') or 'Unknown'
+        gift_type = gift_type_from_name(gift.get('name', 'UNKNOWN'))
+        group_id = gift.get('group_id', '')
+        key = (user.get('unique_id', sender), gift.get('id', gift_type), group_id)
+
+        now = time.monotonic()
+        self._sweep(now)
+        handled, seen_at = self._streaks.get(key, (0, now))
+        if now - seen_at > self.streak_ttl:
+            handled = 0
+        count = repeat_count - handled
+
+        if gift.get('repeat_end', True):
+            self._streaks.pop(key, None)
+        elif repeat_count > handled:
+            self._streaks[key] = (repeat_count, now)
+
+        if count <= 0:
+            return None
+
+        # Стабільний ідентифікатор: з group_id той самий крок серії має той самий event_id
+        # незалежно від msg_id, тож дедуплікація ловить і кадри, надіслані повторно
+        if group_id:
+            message = f"{key[0]}:{key[1]}:{group_id}:{repeat_count}"
+        else:
+            message = frame.get('msg_id') or f"{key[0]}:{key[1]}::{repeat_count}"
+
+        return GiftEvent(f"{stream}:{message}", gift_type, sender,
+                         self.catalog.value(gift_type, gift.get('diamond_count', 1)), count, stream)
+
+    def _sweep(self, now: float):
+        """Видалення серій, що обірвалися без repeat_end (не частіше ніж раз на streak_ttl)"""
+        if now - self._swept_at < self.streak_ttl:
+            return
+        self._swept_at = now
+        for key, (_, seen_at) in list(self._streaks.items()):
+            if now - seen_at > self.streak_ttl:
+                del self._streaks[key]
+
+
+class TikTokMonitor:
+    """Подарунки з прямих ефірів через постійні з'єднання, без браузера та опитування
+
+    Усі ефіри обслуговує один цикл asyncio у фоновому потоці: кожен ефір - це одне
+    з'єднання та одна задача. Кадри розбираються по мірі надходження, після розриву
+    з'єднання - повторне підключення з backoff.
+    """
+
+    def __init__(self, feed_url: str = DEFAULT_FEED_URL, catalog: Optional[GiftCatalog] = None,
+                 timeout: float = 30.0, reconnect_max: float = 30.0):
+        self.feed_url = feed_url
+        self.catalog = catalog or GiftCatalog()
+        self.timeout = timeout
+        self.reconnect_max = reconnect_max
+
+        # username -> {'task', 'callback', 'stats'}
+        self.streams: Dict[str, Dict[str, Any]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start_monitoring(self, username: str, callback: Callable[[GiftEvent], None]) -> bool:
+        """Підключення до ефіру користувача (повертається одразу)"""
+        username = username.lstrip('@')
+        if self.is_monitoring(username):
+            self.streams[username]['callback'] = callback
+            return True
+
+        self._ensure_loop()
+        stream = {'task': None, 'callback': callback, 'stats': self._new_stats()}
+        self.streams[username] = stream
+        stream['task'] = asyncio.run_coroutine_threadsafe(self._create_task(username), self.loop).result(timeout=5)
+        logger.info(f"Моніторинг TikTok LIVE @{username} через {self.feed_url}")
+        return True
+
+    def stop_monitoring(self, username: Optional[str] = None):
+        """Закриття з'єднання з ефіром (без username - з усіма ефірами)"""
+        usernames = [username.lstrip('@')] if username else list(self.streams)
+        for name in usernames:
+            stream = self.streams.pop(name, None)
+            if stream and stream['task'] and self.loop:
+                self.loop.call_soon_threadsafe(stream['task'].cancel)
+
+    def is_monitoring(self, username: Optional[str] = None) -> bool:
+        """Чи активний моніторинг ефіру (без username - хоча б одного)"""
+        if username is None:
+            return any(self.is_monitoring(name) for name in list(self.streams))
+        stream = self.streams.get(username.lstrip('@'))
+        return stream is not None and stream['task'] is not None and not stream['task'].done()
+
+    def run_coroutine(self, coroutine):
+        """Виконання корутини в циклі монітора (для викликів з потоків Flask)"""
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика з'єднання кожного ефіру"""
+        return {name: {'monitoring': self.is_monitoring(name), **stream['stats']}
+                for name, stream in list(self.streams.items())}
+
+    @staticmethod
+    def _new_stats() -> Dict[str, Any]:
+        return {'connected': False, 'connects': 0, 'frames': 0, 'gifts': 0,
+                'last_gift_at': None, 'last_latency_ms': None}
+
+    def _ensure_loop(self):
+        """Запуск циклу asyncio у фоновому потоці"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, name='tiktok-monitor', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _create_task(self, username: str) -> asyncio.Task:
+        return asyncio.create_task(self._watch(username, self.streams[username]), name=f'tiktok-{username}')
+
+    async def _watch(self, username: str, stream: Dict[str, Any]):
+        """Утримання з'єднання: повторне підключення з експоненційною затримкою"""
+        decoder = GiftFrameDecoder(self.catalog)
+        delay = 1.0
+        while True:
+            try:
+                await self._consume(username, stream, decoder)
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"З'єднання з ефіром @{username} перервано: {e}")
+            finally:
+                # Декодер не скидається: серія, що триває під час розриву, продовжується з приросту
+                stream['stats']['connected'] = False
+
+            await asyncio.sleep(delay + random.uniform(0, delay / 4))
+            delay = min(delay * 2, self.reconnect_max)
+
+    async def _consume(self, username: str, stream: Dict[str, Any], decoder: GiftFrameDecoder):
+        """Одне з'єднання: підписка на ефір та читання кадрів по мірі надходження"""
+        address = urlsplit(self.feed_url)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(address.hostname, address.port), timeout=self.timeout)
+        try:
+            writer.write(json.dumps({'type': 'subscribe', 'room': username}).encode('utf-8') + b'\n')
+            await writer.drain()
+            stats = stream['stats']
+            stats['connected'] = True
+            stats['connects'] += 1
+            logger.info(f"Підключено до ефіру @{username}")
+
+            while True:
+                # Сервер надсилає heartbeat, тож тиша довше timeout означає мертве з'єднання
+                line = await asyncio.wait_for(reader.readline(), timeout=self.timeout)
+                if not line:
+                    raise ConnectionError("потік закрито сервером")
+                frame = parse_frame(line)
+                if frame is None:
+                    continue
+                stats['frames'] += 1
+
+                kind = frame.get('type')
+                if kind == 'gift':
+                    self._dispatch(stream, frame, decoder.decode(frame, username))
+                elif kind == 'live_end':
+                    logger.info(f"Ефір @{username} завершено")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    def _dispatch(self, stream: Dict[str, Any], frame: Dict[str, Any], gift_event: Optional[GiftEvent]):
+        """Передача події подарунка обробнику ефіру"""
+        if gift_event is None:
+            return
+        now = time.time()
+        stats = stream['stats']
+        stats['gifts'] += gift_event.count
+        stats['last_gift_at'] = now
+        if frame.get('ts'):
+            stats['last_latency_ms'] = round((now - frame['ts']) * 1000, 1)
+
+        try:
+            stream['callback'](gift_event)
+        except Exception as e:
+            logger.error(f"Помилка обробника подарунка: {e}")
@@ -0,0 +1,419 @@
+"""
+UDP транспорт команд для ESP32/ESP8266: компактні бінарні пакети з номерами, підтвердженнями та пакуванням
+
+Формат (little-endian):
+    пакет      = заголовок + записи
+    заголовок  = 'TF' (2 байти), версія (1), тип пакета (1), кількість записів (2)
+    команда    = seq (4), прапорці (1), код дії (1), затримка запуску мс (2), довжина параметрів (2), параметри
+    ACK        = seq (4) кожної отриманої команди з прапорцем FLAG_RELIABLE
+
+Параметри - компактний JSON (ArduinoJson на пристрої). Код дії 0 - дія поза таблицею ACTIONS,
+тоді її назва передається в параметрах як "action".
+"""
+
+import json
+import time
+import secrets
+import asyncio
+import socket
+import struct
+import logging
+import itertools
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from common.tracing import TraceStore, now_ns
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TF'
+VERSION = 1
+HEADER = struct.Struct('<2sBBH')
+RECORD = struct.Struct('<IBBHH')
+SEQ = struct.Struct('<I')
+KIND_COMMANDS = 1
+KIND_ACK = 2
+# Команда потребує підтвердження (одноразовий ефект); без прапорця - оновлення стану без ACK
+FLAG_RELIABLE = 0x01
+# Розмір пакета з запасом до MTU Wi-Fi (1472 байти корисного навантаження UDP)
+MAX_PACKET = 1200
+MAX_DELAY_MS = 0xFFFF
+
+# Коди дій у прошивці: порядок не змінювати, нові дії - лише в кінець
+ACTIONS = (
+    'turn_on', 'turn_off', 'toggle', 'set_color', 'set_brightness', 'set_volume', 'play_sound',
+    'move', 'rotate', 'show_text', 'servo_move', 'led_rainbow', 'led_clear', 'motor_start',
+    'motor_stop', 'buzzer_beep', 'display_message', 'gift_effect', 'neopixel_effect', 'pulse_effect'
+)
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS, 1)}
+# Дії, що задають стан: наступна команда все одно його перезапише, тож втрата пакета не страшна
+STATE_ACTIONS = ('turn_on', 'turn_off', 'set_color', 'set_brightness', 'set_volume', 'led_clear',
+                 'motor_stop', 'move', 'rotate', 'servo_move')
+
+Record = Tuple[int, int, int, int, bytes]
+
+
+def encode_params(action: str, params: Optional[Dict[str, Any]]) -> Tuple[int, bytes]:
+    """Код дії та параметри для запису команди"""
+    code = ACTION_CODES.get(action, 0)
+    params = dict(params or {})
+    params.pop('reliable', None)
+    if not code:
+        params['action'] = action
+    payload = json.dumps(params, separators=(',', ':'), ensure_ascii=False).encode('utf-8') if params else b''
+    return code, payload
+
+
+def decode_params(code: int, payload: bytes) -> Tuple[str, Dict[str, Any]]:
+    """Назва дії та параметри із запису команди"""
+    params = json.loads(payload) if payload else {}
+    if code:
+        if code > len(ACTIONS):
+            raise ValueError(f"Невідомий код дії: {code}")
+        return ACTIONS[code - 1], params
+    return params.pop('action', ''), params
+
+
+def encode_commands(records: List[Record]) -> bytes:
+    """Пакет команд: записи (seq, прапорці, код дії, затримка мс, параметри)"""
+    parts = [HEADER.pack(MAGIC, VERSION, KIND_COMMANDS, len(records))]
+    for seq, flags, code, delay_ms, payload in records:
+        parts.append(RECORD.pack(seq, flags, code, delay_ms, len(payload)))
+        parts.append(payload)
+    return b''.join(parts)
+
+
+def encode_ack(seqs: List[int]) -> bytes:
+    """Пакет підтверджень (вибіркових: лише отримані seq)"""
+    return HEADER.pack(MAGIC, VERSION, KIND_ACK, len(seqs)) + b''.join(SEQ.pack(seq) for seq in seqs)
+
+
+def decode_packet(data: bytes) -> Tuple[int, list]:
+    """Тип пакета та його записи (команди - кортежі Record, ACK - seq); ValueError - пошкоджений пакет"""
+    if len(data) < HEADER.size:
+        raise ValueError("Пакет коротший за заголовок")
+    magic, version, kind, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Невідомий формат пакета")
+
+    offset = HEADER.size
+    if kind == KIND_ACK:
+        if len(data) < offset + count * SEQ.size:
+            raise ValueError("Неповний пакет підтверджень")
+        return kind, [SEQ.unpack_from(data, offset + index * SEQ.size)[0] for index in range(count)]
+    if kind != KIND_COMMANDS:
+        raise ValueError(f"Невідомий тип пакета: {kind}")
+
+    records = []
+    for _ in range(count):
+        if len(data) < offset + RECORD.size:
+            raise ValueError("Неповний запис команди")
+        seq, flags, code, delay_ms, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if len(data) < offset + length:
+            raise ValueError("Неповні параметри команди")
+        records.append((seq, flags, code, delay_ms, data[offset:offset + length]))
+        offset += length
+    return kind, records
+
+
+def record_size(payload: bytes) -> int:
+    return RECORD.size + len(payload)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class UdpCommand:
+    """Команда в черзі відправки або в очікуванні підтвердження"""
+
+    __slots__ = ('seq', 'address', 'code', 'payload', 'execute_at', 'reliable', 'queued_at', 'last_sent',
+                 'sends', 'acked', 'event', 'future', 'loop')
+
+    def __init__(self, seq: int, address: Tuple[str, int], code: int, payload: bytes,
+                 execute_at: Optional[float], reliable: bool, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.seq = seq
+        self.address = address
+        self.code = code
+        self.payload = payload
+        self.execute_at = execute_at
+        self.reliable = reliable
+        self.queued_at = time.monotonic()
+        self.last_sent = self.queued_at
+        self.sends = 0
+        self.acked: Optional[float] = None
+        # Очікування ACK: future циклу asyncio (send_async) або Event потоку (send)
+        self.loop = loop if reliable else None
+        self.future = loop.create_future() if reliable and loop is not None else None
+        self.event = threading.Event() if reliable and loop is None else None
+
+    def finish(self):
+        """Підтвердження отримано або повтори вичерпано (викликається з потоків транспорту)"""
+        if self.event is not None:
+            self.event.set()
+        elif self.future is not None:
+            try:
+                self.loop.call_soon_threadsafe(_resolve, self.future)
+            except RuntimeError:
+                # Цикл уже закрито: чекати на результат нікому
+                pass
+
+    def record(self) -> Record:
+        """Запис для пакета; затримка рахується в момент відправки (і повторної теж)"""
+        delay_ms = 0
+        if self.execute_at is not None:
+            delay_ms = min(max(int((self.execute_at - time.time()) * 1000), 0), MAX_DELAY_MS)
+        return self.seq, FLAG_RELIABLE if self.reliable else 0, self.code, delay_ms, self.payload
+
+
+class UdpTransport:
+    """Відправка команд пристроям по UDP з одного сокета
+
+    Потік відправки забирає всі команди, що накопичилися, і пакує команди одного пристрою
+    в спільні пакети: без штучної затримки, але під навантаженням кілька команд ідуть однією
+    датаграмою. Одноразові ефекти повторюються з подвоєнням інтервалу до отримання ACK,
+    оновлення стану надсилаються один раз.
+    """
+
+    def __init__(self, bind_host: str = '0.0.0.0', bind_port: int = 0, retry_interval: float = 0.02,
+                 max_retries: int = 3, tracer: Optional[TraceStore] = None):
+        self.bind_host = bind_host
+        self.bind_port = bind_port
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.tracer = tracer or TraceStore(enabled=False)
+        self.sock: Optional[socket.socket] = None
+        # Випадковий початковий seq: після перезапуску сервера нові команди не збігаються з тими,
+        # що прошивка вже виконала і пам'ятає (інакше вона лише підтвердила б їх без виконання)
+        self._seqs = itertools.count(secrets.randbits(32))
+        self._cond = threading.Condition()
+        self._queue: List[UdpCommand] = []
+        self._unacked: Dict[int, UdpCommand] = {}
+        self._threads: List[threading.Thread] = []
+        self._closing = False
+        self.stats = {'commands': 0, 'packets': 0, 'max_batch': 0, 'retransmits': 0, 'acked': 0,
+                      'lost': 0, 'bad_packets': 0, 'foreign_acks': 0, 'rtt_ms': None}
+
+    def start(self):
+        """Відкриття сокета та запуск потоків відправки і прийому"""
+        with self._cond:
+            if self.sock is not None:
+                return
+            self._closing = False
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.bind_host, self.bind_port))
+            sock.settimeout(0.5)
+            self.bind_port = sock.getsockname()[1]
+            self.sock = sock
+            self._threads = [threading.Thread(target=self._run_sender, name='udp-sender', daemon=True),
+                             threading.Thread(target=self._run_receiver, name='udp-receiver', daemon=True)]
+            for thread in self._threads:
+                thread.start()
+        logger.info(f"UDP транспорт пристроїв на порту {self.bind_port}")
+
+    def stop(self):
+        """Зупинка потоків; команди без підтвердження вважаються втраченими"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+            for command in self._unacked.values():
+                command.finish()
+            self._unacked.clear()
+            self._queue.clear()
+        for thread in self._threads:
+            thread.join(1.0)
+        self._threads = []
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def send(self, address: Tuple[str, int], action: str, params: Optional[Dict[str, Any]] = None,
+             execute_at: Optional[float] = None, reliable: Optional[bool] = None,
+             trace_id: Optional[str] = None) -> Dict[str, Any]:
+        """Відправка команди пристрою (execute_at - час запуску за годинником сервера)
+
+        reliable=None: одноразові ефекти чекають ACK, дії STATE_ACTIONS надсилаються без нього
+        (params['reliable'] змінює вибір для окремого правила). Виклик з ACK блокує потік до
+        підтвердження або вичерпання повторів; з asyncio - send_async.
+        """
+        started = now_ns()
+        command = self._enqueue(address, action, params, execute_at, reliable)
+        if isinstance(command, dict) or not command.reliable:
+            return self._result(command, action, started, trace_id)
+        command.event.wait(self._ack_timeout())
+        return self._result(command, action, started, trace_id)
+
+    async def send_async(self, address: Tuple[str, int], action: str, params: Optional[Dict[str, Any]] = None,
+                         execute_at: Optional[float] = None, reliable: Optional[bool] = None,
+                         trace_id: Optional[str] = None) -> Dict[str, Any]:
+        """Те саме, що send, але очікування ACK не займає потік: future завершує потік прийому"""
+        started = now_ns()
+        command = self._enqueue(address, action, params, execute_at, reliable, asyncio.get_running_loop())
+        if not isinstance(command, dict) and command.reliable:
+            try:
+                await asyncio.wait_for(command.future, self._ack_timeout())
+            except asyncio.TimeoutError:
+                pass
+        return self._result(command, action, started, trace_id)
+
+    def _enqueue(self, address: Tuple[str, int], action: str, params: Optional[Dict[str, Any]],
+                 execute_at: Optional[float], reliable: Optional[bool],
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Команда в черзі відправки (або словник з помилкою)"""
+        if self.sock is None:
+            self.start()
+        if reliable is None:
+            reliable = (params or {}).get('reliable', action not in STATE_ACTIONS)
+        code, payload = encode_params(action, params)
+        if HEADER.size + record_size(payload) > MAX_PACKET:
+            return {'success': False, 'error': f"Параметри команди {action} не вміщуються в пакет"}
+
+        command = UdpCommand(next(self._seqs) & 0xFFFFFFFF, address, code, payload, execute_at, bool(reliable),
+                             loop)
+        with self._cond:
+            self._queue.append(command)
+            if command.reliable:
+                self._unacked[command.seq] = command
+            self.stats['commands'] += 1
+            self._cond.notify()
+        return command
+
+    def _ack_timeout(self) -> float:
+        """Запасна межа очікування: усі повтори з подвоєнням інтервалу плюс секунда"""
+        return self.retry_interval * (2 ** (self.max_retries + 1)) + 1.0
+
+    def _result(self, command, action: str, started: int, trace_id: Optional[str]) -> Dict[str, Any]:
+        if isinstance(command, dict):
+            return command
+        address = command.address
+        if not command.reliable:
+            self.tracer.record(trace_id, 'udp_send', started, device=f"{address[0]}:{address[1]}", seq=command.seq)
+            return {'success': True, 'seq': command.seq, 'reliable': False}
+
+        retries = max(command.sends - 1, 0)
+        self.tracer.record(trace_id, 'udp_command', started, device=f"{address[0]}:{address[1]}",
+                           seq=command.seq, retries=retries, acked=command.acked is not None)
+        if command.acked is None:
+            return {'success': False, 'seq': command.seq, 'retries': retries,
+                    'error': f"Пристрій {address[0]}:{address[1]} не підтвердив команду {action}"}
+        return {'success': True, 'seq': command.seq, 'retries': retries,
+                'rtt_ms': round((command.acked - command.last_sent) * 1000, 3)}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Лічильники транспорту"""
+        return {'port': self.bind_port, 'running': self.sock is not None, 'in_flight': len(self._unacked),
+                **self.stats}
+
+    def _run_sender(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    timeout = self._next_retry()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._closing:
+                    return
+                batch = self._queue
+                self._queue = []
+                batch.extend(self._due_retries())
+            if batch:
+                self._send_batch(batch)
+
+    def _next_retry(self) -> Optional[float]:
+        """Секунд до найближчого повтору (None - немає команд без ACK); під блокуванням"""
+        now = time.monotonic()
+        deadlines = [command.last_sent + self.retry_interval * 2 ** (command.sends - 1) - now
+                     for command in self._unacked.values() if command.sends]
+        return min(deadlines) if deadlines else None
+
+    def _due_retries(self) -> List[UdpCommand]:
+        """Команди, яким час повторити відправку; після max_retries повторів - втрачені"""
+        now = time.monotonic()
+        due = []
+        for command in list(self._unacked.values()):
+            if not command.sends or now < command.last_sent + self.retry_interval * 2 ** (command.sends - 1):
+                continue
+            if command.sends > self.max_retries:
+                del self._unacked[command.seq]
+                self.stats['lost'] += 1
+                logger.warning("Команду %s для %s:%s втрачено після %d спроб",
+                               command.seq, command.address[0], command.address[1], command.sends)
+                command.finish()
+                continue
+            self.stats['retransmits'] += 1
+            due.append(command)
+        return due
+
+    def _send_batch(self, batch: List[UdpCommand]):
+        """Пакування команд за адресою в пакети до MAX_PACKET байт"""
+        by_address: Dict[Tuple[str, int], List[UdpCommand]] = {}
+        for command in batch:
+            by_address.setdefault(command.address, []).append(command)
+
+        now = time.monotonic()
+        for address, commands in by_address.items():
+            records: List[Record] = []
+            size = HEADER.size
+            for command in commands:
+                # Відмітка до відправки: ACK може прийти раніше, ніж sendto поверне керування
+                command.sends += 1
+                command.last_sent = now
+                record = command.record()
+                if records and size + record_size(record[4]) > MAX_PACKET:
+                    self._send_packet(address, records)
+                    records, size = [], HEADER.size
+                records.append(record)
+                size += record_size(record[4])
+            self._send_packet(address, records)
+
+    def _send_packet(self, address: Tuple[str, int], records: List[Record]):
+        try:
+            self.sock.sendto(encode_commands(records), address)
+        except OSError as e:
+            logger.error(f"Помилка відправки UDP пакета на {address[0]}:{address[1]}: {e}")
+            return
+        self.stats['packets'] += 1
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(records))
+
+    def _run_receiver(self):
+        while not self._closing:
+            try:
+                data, address = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._closing:
+                    return
+                continue
+            try:
+                kind, items = decode_packet(data)
+            except ValueError as e:
+                self.stats['bad_packets'] += 1
+                logger.debug("Пошкоджений пакет від %s: %s", address, e)
+                continue
+            if kind == KIND_ACK:
+                self._ack(items, address)
+
+    def _ack(self, seqs: List[int], address: Tuple[str, int]):
+        now = time.monotonic()
+        with self._cond:
+            for seq in seqs:
+                command = self._unacked.get(seq)
+                if command is None:
+                    # Повторний ACK на вже підтверджену команду
+                    continue
+                if command.address != address:
+                    # ACK від іншого вузла не підтверджує команду цього пристрою
+                    self.stats['foreign_acks'] += 1
+                    continue
+                del self._unacked[seq]
+                command.acked = now
+                rtt = (now - command.last_sent) * 1000
+                previous = self.stats['rtt_ms']
+                # Ковзне середнє RTT
+                self.stats['rtt_ms'] = round(rtt if previous is None else previous * 0.875 + rtt * 0.125, 3)
+                self.stats['acked'] += 1
+                command.finish()
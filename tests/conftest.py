@@ -0,0 +1,8 @@
+"""
+Спільне оточення тестів: main.py вже при імпорті відкриває лог, тож він пишеться поза репозиторієм
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'tt-fizmehdia-tests', 'app.log'))
@@ -0,0 +1,64 @@
+"""
+Індекс подій: повтори в межах вікна, закінчення вікна та витіснення за розміром
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from common import dedup
+from common.dedup import DedupIndex
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Керований час для DedupIndex замість time.monotonic()"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(dedup, 'time', SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_duplicate_within_window(clock):
+    index = DedupIndex(window=10)
+    assert not index.seen('msg-1')
+    clock.value += 9.9
+    assert index.seen('msg-1')
+    assert index.get_status()['duplicates'] == 1
+
+
+def test_event_accepted_again_after_window(clock):
+    index = DedupIndex(window=10)
+    index.seen('msg-1')
+    clock.value += 10
+    assert not index.seen('msg-1')
+    # Повторний прийом запам'ятовує подію заново з новим часом
+    clock.value += 5
+    assert index.seen('msg-1')
+
+
+def test_expired_entries_leave_the_index(clock):
+    index = DedupIndex(window=10)
+    index.seen('old')
+    clock.value += 6
+    index.seen('recent')
+    clock.value += 5
+    index.seen('new')
+    assert index.get_status()['size'] == 2
+    assert index.seen('recent')
+    assert not index.seen('old')
+
+
+def test_capacity_evicts_oldest(clock):
+    index = DedupIndex(capacity=2, window=60)
+    for event_id in ('a', 'b', 'c'):
+        index.seen(event_id)
+    assert index.get_status()['evicted'] == 1
+    assert index.seen('c') and index.seen('b')
+    assert not index.seen('a')
+
+
+def test_events_without_id_are_never_duplicates():
+    index = DedupIndex()
+    assert not index.seen(None)
+    assert not index.seen('')
+    assert index.get_status()['checked'] == 0
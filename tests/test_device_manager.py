@@ -0,0 +1,104 @@
+"""
+Реєстр пристроїв: типи з Config.DEVICE_TYPES та виконання дії на HTTP пристрої
+"""
+
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import main
+from src.config import Config
+from src.device_manager import DeviceManager
+from src.gift_event import GiftEvent
+
+
+@pytest.fixture
+def http_device():
+    """Локальний HTTP пристрій, що запам'ятовує отримані команди"""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            body = json.dumps({'success': True}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1], received
+    server.shutdown()
+    server.server_close()
+
+
+def test_registers_every_configured_type():
+    manager = DeviceManager(max_devices=len(Config.DEVICE_TYPES), device_types=Config.DEVICE_TYPES)
+    for device_type in Config.DEVICE_TYPES:
+        manager.add_device({'id': device_type, 'type': device_type})
+    assert [device.id for device in manager.find(type='http')] == ['http']
+
+
+def test_rejects_unknown_type():
+    manager = DeviceManager(device_types=Config.DEVICE_TYPES)
+    with pytest.raises(ValueError):
+        manager.add_device({'type': 'toaster'})
+
+
+def test_dispatches_action_to_http_device(http_device):
+    port, received = http_device
+    device_id = main.device_manager.add_device({'type': 'http', 'name': 'Лампа', 'ip': '127.0.0.1', 'port': port})
+    device = main.device_manager.get(device_id)
+    try:
+        result = asyncio.run(main.execute_device_action(device, 'turn_on', {'value': 1},
+                                                        GiftEvent('1', 'ROSE', 'anna')))
+    finally:
+        main.device_manager.remove_device(device_id)
+
+    assert result == {'success': True}
+    assert received[0]['action'] == 'turn_on'
+    assert received[0]['params'] == {'value': 1}
+
+
+def test_rejects_unknown_status():
+    manager = DeviceManager(device_types=Config.DEVICE_TYPES)
+    with pytest.raises(ValueError):
+        manager.add_device({'type': 'light', 'status': 'asleep'})
+
+
+def test_version_changes_only_with_status():
+    manager = DeviceManager(device_types=Config.DEVICE_TYPES)
+    device_id = manager.add_device({'type': 'light'})
+    _, version = manager.view()
+    manager.set_status(device_id, 'connected')
+    assert manager.view()[1] == version
+    manager.set_status(device_id, 'offline')
+    assert manager.view()[1] == version + 1
+
+
+def test_negative_limit_returns_empty_page():
+    manager = DeviceManager(device_types=Config.DEVICE_TYPES)
+    manager.add_device({'type': 'light'})
+    manager.add_device({'type': 'light'})
+    page = json.loads(manager.view(limit=-1)[0])
+    assert (page['count'], page['total'], page['limit']) == (0, 2, 0)
+
+
+def test_conditional_get_returns_not_modified():
+    client = main.app.test_client()
+    response = client.get('/api/devices')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    response = client.get('/api/devices', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert not response.data
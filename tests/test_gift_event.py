@@ -0,0 +1,29 @@
+"""
+Подія подарунка: ISO рядок часу з кешованим префіксом секунди
+"""
+
+import time
+from datetime import datetime
+
+from src.gift_event import GiftEvent, isoformat
+from common.tracing import WALL_OFFSET_NS
+
+SECOND = 1_000_000_000
+
+
+def expected(monotonic_ns):
+    seconds, rest = divmod(monotonic_ns + WALL_OFFSET_NS, SECOND)
+    return datetime.fromtimestamp(seconds).replace(microsecond=rest // 1000).isoformat()
+
+
+def test_isoformat_matches_datetime_across_seconds():
+    started = time.monotonic_ns()
+    # Та сама секунда, наступна, рівно на межі (без мікросекунд, як у datetime) і назад у часі
+    for offset in (0, 1234, SECOND, 2 * SECOND - started % SECOND - WALL_OFFSET_NS % SECOND, -5 * SECOND):
+        assert isoformat(started + offset) == expected(started + offset)
+
+
+def test_timestamp_is_built_once():
+    gift = GiftEvent('1', 'ROSE', 'anna')
+    assert gift.timestamp is gift.timestamp
+    assert gift.to_dict()['timestamp'] is gift.timestamp
@@ -0,0 +1,72 @@
+"""
+Історія подарунків: запис у файли стовпців і запит по кошиках
+"""
+
+import time
+
+import pytest
+
+from src.gift_event import GiftEvent
+from src.gift_history import GiftHistory
+
+pytest.importorskip('numpy')
+
+SECOND = 1_000_000_000
+
+
+@pytest.fixture
+def history(tmp_path):
+    """Історія з кількома подарунками ефіру 'alpha' та одним ефіру 'beta', вже записана на диск"""
+    history = GiftHistory(root=str(tmp_path), flush_interval=0.05)
+    history.start()
+    started = time.monotonic_ns()
+    history.append(GiftEvent('1', 'ROSE', 'anna', 1, 3, 'alpha', started))
+    history.append(GiftEvent('2', 'DIAMOND', 'bohdan', 100, 1, 'alpha', started + 10 * SECOND))
+    history.append(GiftEvent('3', 'ROSE', 'anna', 1, 2, 'alpha', started + 70 * SECOND))
+    history.append(GiftEvent('4', 'ROSE', 'anna', 1, 1, 'beta', started + 5 * SECOND))
+    history.stop()
+    return history
+
+
+def test_round_trip_by_type(history):
+    result = history.query(bucket=60, by='type', metric='coins')
+    assert result['segments'] == 2
+    assert result['buckets'] == 2
+    assert result['series'] == {'ROSE': [4, 2], 'DIAMOND': [100, 0]}
+    assert result['totals'] == {'ROSE': 6, 'DIAMOND': 100}
+    assert history.get_status()['written'] == 4
+
+
+def test_round_trip_by_sender(history):
+    result = history.query(streams=['alpha'], bucket=60, by='sender', metric='gifts')
+    assert result['segments'] == 1
+    assert result['series'] == {'anna': [3, 2], 'bohdan': [1, 0]}
+
+
+def test_reopened_history_reads_same_data(history):
+    reopened = GiftHistory(root=str(history.root))
+    assert reopened.query(bucket=60) == history.query(bucket=60)
+    assert sorted(segment.stream for segment in reopened.list_segments()) == ['alpha', 'beta']
+
+
+def test_end_stream_starts_new_segment(tmp_path):
+    history = GiftHistory(root=str(tmp_path), flush_interval=0.05)
+    history.start()
+    history.append(GiftEvent('1', 'ROSE', 'anna', stream='alpha'))
+    history.end_stream('alpha')
+    history.append(GiftEvent('2', 'ROSE', 'anna', stream='alpha'))
+    history.stop()
+    segments = history.list_segments(['alpha'])
+    assert [segment.describe()['rows'] for segment in segments] == [1, 1]
+    assert history.query(last=1)['totals'] == {'ROSE': 1}
+
+
+def test_time_range_filter(history):
+    started_s = history.list_segments(['alpha'])[0].started_ns / 1e9
+    result = history.query(streams=['alpha'], by='type', metric='coins', start=started_s + 5, end=started_s + 60)
+    assert result['totals'] == {'ROSE': 0, 'DIAMOND': 100}
+
+
+def test_rejects_unknown_metric(history):
+    with pytest.raises(ValueError):
+        history.query(metric='likes')
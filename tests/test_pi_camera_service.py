@@ -0,0 +1,72 @@
+"""
+Камера Pi: кадри до моменту подарунка закріплюються при постановці фото в чергу, а ефект
+отримує час надходження подарунка
+"""
+
+import os
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from backends import EventRecorder, MockCamera
+from camera_service import CameraService
+from effects import EffectRegistry
+from gift_scheduler import GiftScheduler
+
+
+@pytest.fixture
+def camera_service(tmp_path):
+    camera = MockCamera(EventRecorder())
+    # Буфер на 1 секунду: коротший за post_roll, тож без закріплення кадри до подарунка зникають
+    service = CameraService(camera, photos_dir=str(tmp_path), fps=20, buffer_seconds=1.0)
+    service.start()
+    time.sleep(1.2)
+    yield service
+    service.stop()
+    camera.close()
+
+
+def wait_for_photos(service, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while service.stats['photos'] < count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return service.stats['photos'] >= count
+
+
+def test_pre_roll_survives_buffer_eviction(camera_service, tmp_path):
+    gift_at = time.time()
+    assert camera_service.snapshot('gift.jpg', timestamp=gift_at, pre_roll=0.5, post_roll=1.5)['success']
+    assert wait_for_photos(camera_service, 1)
+
+    clip = sorted(name for name in os.listdir(tmp_path) if name.startswith('gift_'))
+    # 0.5 с до подарунка та 1.5 с після при 20 к/с; буфер сам по собі тримає лише 20 кадрів
+    assert len(clip) > camera_service._frames.maxlen
+    assert (tmp_path / 'gift.jpg').exists()
+
+
+def test_scheduler_passes_submit_time(tmp_path):
+    calls = []
+    scheduler = GiftScheduler(lambda *args: calls.append(args), {'ROSE': 1}, threading.Event())
+    submitted = time.time()
+    time.sleep(0.05)
+    scheduler.submit('ROSE', 'anna')
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+    gift_type, sender, received_at = calls[0]
+    assert (gift_type, sender) == ('ROSE', 'anna')
+    assert submitted < received_at < submitted + 0.5
+
+
+def test_camera_step_after_other_steps_is_reported(caplog):
+    registry = EffectRegistry(SimpleNamespace(control_led_strip=None, take_photo=None), 'effects.json')
+    registry.compile({'UNICORN': [{'kind': 'camera', 'pre_roll': 1.0}, {'kind': 'led', 'action': 'unicorn'}]})
+    assert 'крок камери' not in caplog.text
+    registry.compile({'UNICORN': [{'kind': 'led', 'action': 'unicorn'}, {'kind': 'camera', 'pre_roll': 1.0}]})
+    assert 'крок камери не перший' in caplog.text
@@ -0,0 +1,102 @@
+"""
+Прийом подарунків Pi через MQTT: формати повідомлень, передача value та зворотний тиск черги
+"""
+
+import time
+import threading
+
+import pytest
+
+from mqtt_ingest import LocalMQTTClient, MQTTGiftIngest
+
+TOPIC = 'tt-fizmehdia/gift'
+
+
+class Handler:
+    """Замість submit_gift: запам'ятовує виклики та потік, у якому їх виконано"""
+
+    def __init__(self, block_sender=None):
+        self.calls = []
+        self.block_sender = block_sender
+        self.release = threading.Event()
+
+    def __call__(self, gift_type, sender, value=None, event_id=None, trace_id=None):
+        if sender == self.block_sender:
+            self.release.wait(5.0)
+        self.calls.append({'type': gift_type, 'sender': sender, 'value': value, 'event_id': event_id,
+                           'thread': threading.current_thread().name})
+
+
+def wait_until(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def make_ingest():
+    """Прийом через локальний клієнт замість брокера"""
+    ingests = []
+
+    def make(handler, **kwargs):
+        client = LocalMQTTClient()
+        ingest = MQTTGiftIngest(client, handler, topic=TOPIC, **kwargs)
+        ingest.connect('localhost')
+        ingests.append(ingest)
+        return client, ingest
+
+    yield make
+    for ingest in ingests:
+        ingest.stop()
+
+
+def publish(client, payload):
+    client.publish(TOPIC, payload, qos=1).join(5.0)
+
+
+def test_single_gift_keeps_value(make_ingest):
+    handler = Handler()
+    client, ingest = make_ingest(handler)
+    publish(client, {'type': 'DIAMOND', 'sender': 'anna', 'value': 100, 'event_id': 'e1'})
+    assert wait_until(lambda: ingest.stats['processed'] == 1)
+    call = handler.calls[0]
+    assert (call['type'], call['sender'], call['value'], call['event_id']) == ('DIAMOND', 'anna', 100, 'e1')
+
+
+@pytest.mark.parametrize('wrap', [lambda gifts: gifts, lambda gifts: {'gifts': gifts}], ids=['list', 'gifts'])
+def test_batch_payloads(make_ingest, wrap):
+    handler = Handler()
+    client, ingest = make_ingest(handler)
+    gifts = [{'type': 'ROSE', 'sender': 'anna', 'value': 1}, {'type': 'STAR', 'value': 10}, {'sender': 'no type'}]
+    publish(client, wrap(gifts))
+    assert wait_until(lambda: ingest.stats['processed'] == 2)
+    assert sorted((call['type'], call['sender'], call['value']) for call in handler.calls) == [
+        ('ROSE', 'anna', 1), ('STAR', 'Unknown', 10)]
+    assert (ingest.stats['messages'], ingest.stats['gifts']) == (1, 2)
+
+
+def test_malformed_payload_is_counted(make_ingest):
+    client, ingest = make_ingest(Handler())
+    publish(client, b'{"type": ')
+    assert ingest.stats['errors'] == 1
+    assert ingest.stats['gifts'] == 0
+
+
+def test_full_queue_processes_gift_in_network_thread(make_ingest):
+    # Один обробник зайнятий першим подарунком, у черзі місце лише для нього
+    handler = Handler(block_sender='slow')
+    client, ingest = make_ingest(handler, workers=1, max_pending=1, backpressure_timeout=0.05)
+    thread = client.publish(TOPIC, [{'type': 'ROSE', 'sender': 'slow'},
+                                    {'type': 'STAR', 'sender': 'anna', 'value': 10}], qos=1)
+    thread.join(5.0)
+    assert (ingest.stats['backpressure'], ingest.stats['inline']) == (1, 1)
+    # Другий подарунок не загубився: його виконав мережевий потік, поки пул зайнятий
+    assert [(call['type'], call['value']) for call in handler.calls] == [('STAR', 10)]
+    assert not handler.calls[0]['thread'].startswith('mqtt-gift')
+
+    handler.release.set()
+    assert wait_until(lambda: ingest.stats['processed'] == 2)
+    assert handler.calls[1]['thread'].startswith('mqtt-gift')
@@ -0,0 +1,93 @@
+"""
+Обмеження частоти: відро токенів та політики drop, delay і merge
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src import rate_limit
+from src.rate_limit import RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Керований час для RateLimiter замість time.monotonic()"""
+    now = SimpleNamespace(value=100.0)
+    monkeypatch.setattr(rate_limit, 'time', SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_bucket_spends_burst_then_refills():
+    bucket = TokenBucket(rate=2, burst=3, now=0.0)
+    assert [bucket.reserve(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(0.0) is None
+    assert bucket.retry_after(0.0) == pytest.approx(0.5)
+    # За 0.5 с при 2 токенах/с з'являється рівно один токен
+    assert bucket.reserve(0.5) == pytest.approx(0.0)
+    assert bucket.reserve(0.5) is None
+
+
+def test_bucket_never_exceeds_burst():
+    bucket = TokenBucket(rate=10, burst=2, now=0.0)
+    assert [bucket.reserve(60.0) for _ in range(3)] == [0.0, 0.0, None]
+
+
+def test_bucket_borrows_ahead_within_max_wait():
+    bucket = TokenBucket(rate=1, burst=1, now=0.0)
+    assert bucket.reserve(0.0, max_wait=2.0) == 0.0
+    assert bucket.reserve(0.0, max_wait=2.0) == pytest.approx(1.0)
+    assert bucket.reserve(0.0, max_wait=2.0) == pytest.approx(2.0)
+    assert bucket.reserve(0.0, max_wait=2.0) is None
+
+
+def test_drop_policy(clock):
+    limiter = RateLimiter(rate=1, burst=2, policy='drop')
+    assert [limiter.check('sender') for _ in range(3)] == [0.0, 0.0, None]
+    # Інший ключ має власне відро
+    assert limiter.check('other') == 0.0
+    clock.value += 1
+    assert limiter.check('sender') == pytest.approx(0.0)
+    assert limiter.get_status()['dropped'] == 1
+    assert limiter.get_status()['allowed'] == 4
+
+
+def test_delay_policy(clock):
+    limiter = RateLimiter(rate=2, burst=1, policy='delay', max_delay=1.0)
+    waits = [limiter.check('device') for _ in range(4)]
+    assert waits[:3] == [0.0, pytest.approx(0.5), pytest.approx(1.0)]
+    assert waits[3] is None
+    assert limiter.get_status()['delayed'] == 2
+    assert limiter.get_status()['dropped'] == 1
+
+
+def test_merge_policy(clock):
+    limiter = RateLimiter(rate=1, burst=1, policy='merge')
+    assert limiter.check('sender') == 0.0
+    assert limiter.check('sender') is None
+    assert limiter.check('sender') is None
+    # Об'єднані події чекають на наступний токен
+    assert limiter.retry_after('sender') == pytest.approx(1.0)
+    status = limiter.get_status()
+    assert (status['merged'], status['dropped']) == (2, 0)
+
+
+def test_disabled_limiter_allows_everything():
+    limiter = RateLimiter(rate=0, burst=0)
+    assert all(limiter.check('sender') == 0.0 for _ in range(100))
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=1, burst=1, policy='queue')
+
+
+def test_evicts_least_recently_used_keys(clock):
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    limiter.check('a')
+    limiter.check('b')
+    limiter.check('a')
+    limiter.check('c')
+    assert limiter.get_status()['keys'] == 2
+    # 'b' видалено: нове відро знову повне
+    assert limiter.check('b') == 0.0
@@ -0,0 +1,92 @@
+"""
+Процес роботи з Arduino: черги запитів за портами та пропуск запитів після тайм-ауту
+"""
+
+import time
+
+import pytest
+
+from src.serial_worker import RequestLanes, decode
+from src.shm_ring import STRONG_ORDERING, ShmRing
+from common.tracing import TraceStore
+
+pytestmark = pytest.mark.skipif(not STRONG_ORDERING, reason="кільце працює лише на x86/x86-64")
+
+
+class SlowManager:
+    """Замість ArduinoManager: connect триває, як ініціалізація Arduino, команди - миттєві"""
+
+    def __init__(self):
+        self.connected_devices = {'/dev/ttyUSB0': None}
+        self.calls = []
+
+    def connect(self, port, baudrate=None):
+        time.sleep(0.5)
+        self.connected_devices[port] = None
+        self.calls.append(('connect', port))
+        return True
+
+    def send_command(self, command, port=None, execute_at=None, trace_id=None):
+        self.calls.append(('send_command', port))
+        return 'OK'
+
+
+@pytest.fixture
+def lanes():
+    replies = ShmRing.create(1 << 16)
+    manager = SlowManager()
+    lanes = RequestLanes(replies, manager, TraceStore(enabled=False))
+    yield lanes
+    lanes.stop()
+    replies.close()
+
+
+def read_replies(lanes, count, timeout=2.0):
+    replies = []
+    deadline = time.monotonic() + timeout
+    while len(replies) < count and time.monotonic() < deadline:
+        data = lanes.replies.get_wait(0.05)
+        if data is not None:
+            replies.append(decode(data))
+    return replies
+
+
+def test_slow_connect_does_not_block_other_port(lanes):
+    started = time.monotonic()
+    lanes.submit(1, 'connect', ['/dev/ttyUSB1', 9600], None)
+    lanes.submit(2, 'send_command', ['LED:ON', '/dev/ttyUSB0', None, None], None)
+    first = read_replies(lanes, 1)[0]
+    assert first[:2] == [2, 'OK']
+    assert time.monotonic() - started < 0.4
+    assert read_replies(lanes, 1)[0][:2] == [1, True]
+
+
+def test_same_port_keeps_order(lanes):
+    lanes.submit(1, 'connect', ['/dev/ttyUSB1', 9600], None)
+    lanes.submit(2, 'send_command', ['LED:ON', '/dev/ttyUSB1', None, None], None)
+    assert [reply[0] for reply in read_replies(lanes, 2)] == [1, 2]
+    assert lanes.manager.calls == [('connect', '/dev/ttyUSB1'), ('send_command', '/dev/ttyUSB1')]
+
+
+def test_default_port_shares_lane_with_first_port(lanes):
+    assert lanes.lane('send_command', ['LED:ON', None]) == lanes.lane('sync_clock', ['/dev/ttyUSB0'])
+    assert lanes.lane('heartbeat_check', []) != lanes.lane('send_command', ['LED:ON', None])
+
+
+def test_expired_request_is_skipped(lanes):
+    # Команда чекає в черзі порту, поки триває connect, і її термін минає
+    lanes.submit(1, 'connect', ['/dev/ttyUSB1', 9600], None)
+    lanes.submit(2, 'send_command', ['LED:ON', '/dev/ttyUSB1', None, None], time.monotonic() + 0.1)
+    assert [reply[0] for reply in read_replies(lanes, 2, timeout=1.0)] == [1]
+    assert ('send_command', '/dev/ttyUSB1') not in lanes.manager.calls
+
+
+def test_replies_from_many_lanes_stay_intact(lanes):
+    ports = [f'/dev/ttyACM{i}' for i in range(8)]
+    for port in ports:
+        lanes.manager.connected_devices[port] = None
+    for n in range(50):
+        for i, port in enumerate(ports):
+            lanes.submit(i * 100 + n, 'send_command', ['PING', port, None, None], None)
+    replies = read_replies(lanes, 400, timeout=5.0)
+    assert sorted(reply[0] for reply in replies) == sorted(i * 100 + n for i in range(8) for n in range(50))
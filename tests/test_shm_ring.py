@@ -0,0 +1,122 @@
+"""
+Кільце в спільній пам'яті: порядок повідомлень, перехід через кінець буфера та заповнювач
+"""
+
+import os
+import sys
+import random
+import subprocess
+
+import pytest
+
+from src.shm_ring import LENGTH, STRONG_ORDERING, ShmRing
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not STRONG_ORDERING, reason="кільце працює лише на x86/x86-64")
+
+
+@pytest.fixture
+def make_ring():
+    """Кільця, що видаляються після тесту"""
+    rings = []
+
+    def make(size):
+        ring = ShmRing.create(size)
+        rings.append(ring)
+        return ring
+
+    yield make
+    for ring in rings:
+        ring.close()
+
+
+def test_round_trip(make_ring):
+    ring = make_ring(256)
+    assert ring.get() is None
+    for message in (b'first', b'', b'third'):
+        assert ring.put(message)
+    assert [ring.get(), ring.get(), ring.get(), ring.get()] == [b'first', b'', b'third', None]
+    assert ring.pending() == 0
+
+
+def test_reader_in_another_process(make_ring):
+    # Як серверний процес-обробник: окремий інтерпретатор підключається за ім'ям
+    writer = make_ring(256)
+    for message in (b'one', b'two', b'three'):
+        writer.put(message)
+    reader = (
+        "import sys; from src.shm_ring import ShmRing\n"
+        "ring = ShmRing.attach(sys.argv[1])\n"
+        "print(b','.join(iter(lambda: ring.get_wait(timeout=1.0), None)).decode())\n"
+        "ring.close()\n"
+    )
+    result = subprocess.run([sys.executable, '-c', reader, writer.name], capture_output=True, text=True,
+                            timeout=30, cwd=ROOT_DIR)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'one,two,three'
+    # Читач зсунув tail, записувач бачить звільнене місце
+    assert writer.pending() == 0
+
+
+def test_padding_before_wraparound(make_ring):
+    ring = make_ring(64)
+    assert ring.put(b'a' * 36)                      # 40 байт, позиція 40
+    assert ring.get() == b'a' * 36
+    # 4 + 30 не вміщується в 24 байти до кінця: заповнювач і запис з початку
+    assert ring.put(b'b' * 30)
+    assert ring.pending() == 24 + 34
+    assert ring.get() == b'b' * 30
+    assert ring.pending() == 0
+
+
+def test_wraparound_without_room_for_padding(make_ring):
+    ring = make_ring(65)
+    assert ring.put(b'a' * 58)                      # 62 байти, до кінця лишається 3 - менше за довжину
+    assert ring.get() == b'a' * 58
+    assert ring.put(b'b' * 8)
+    assert ring.get() == b'b' * 8
+    assert ring.pending() == 0
+
+
+def test_full_ring_rejects_until_read(make_ring):
+    ring = make_ring(32)
+    assert ring.put(b'x' * 12)
+    assert ring.put(b'y' * 12)
+    assert not ring.put(b'z')
+    assert ring.get() == b'x' * 12
+    # Місце в кінці зайняте, на початку звільнилося 16 байт: повідомлення піде після заповнювача
+    assert not ring.put(b'z' * 13)
+    assert ring.put(b'z' * 12)
+    assert [ring.get(), ring.get()] == [b'y' * 12, b'z' * 12]
+
+
+def test_too_large_message(make_ring):
+    ring = make_ring(32)
+    with pytest.raises(ValueError):
+        ring.put(b'x' * (32 - LENGTH.size + 1))
+    assert ring.put(b'x' * (32 - LENGTH.size))
+    assert ring.get() == b'x' * (32 - LENGTH.size)
+
+
+def test_many_wraparounds_keep_order(make_ring):
+    ring = make_ring(97)
+    rng = random.Random(49)
+    sent, received = [], []
+    for i in range(5000):
+        message = bytes([i % 256]) * rng.randint(0, 40)
+        while not ring.put(message):
+            received.append(ring.get())
+        sent.append(message)
+        if rng.random() < 0.5:
+            received.append(ring.get())
+    while ring.pending():
+        received.append(ring.get())
+    assert received == sent
+
+
+def test_get_wait_timeout(make_ring):
+    ring = make_ring(64)
+    assert ring.get_wait(timeout=0.01) is None
+    ring.put(b'ready')
+    assert ring.get_wait(timeout=0.01) == b'ready'
@@ -0,0 +1,42 @@
+"""
+Звіт про старт: облік імпортів увімкнений за замовчуванням і вимикається змінною середовища
+"""
+
+import sys
+import builtins
+
+import pytest
+
+from common.startup_report import StartupReport
+
+
+@pytest.fixture
+def fresh_module(tmp_path, monkeypatch):
+    """Ще не завантажений модуль для імпорту під час обліку"""
+    (tmp_path / 'startup_probe.py').write_text('VALUE = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield 'startup_probe'
+    sys.modules.pop('startup_probe', None)
+
+
+def track(module):
+    report = StartupReport()
+    report.track_imports()
+    try:
+        __import__(module)
+    finally:
+        report.stop_tracking()
+    return report
+
+
+def test_imports_are_tracked_by_default(fresh_module, monkeypatch):
+    monkeypatch.delenv('STARTUP_TRACK_IMPORTS', raising=False)
+    original = builtins.__import__
+    report = track(fresh_module)
+    assert fresh_module in report.get_report()['imports']
+    assert builtins.__import__ is original
+
+
+def test_tracking_can_be_disabled(fresh_module, monkeypatch):
+    monkeypatch.setenv('STARTUP_TRACK_IMPORTS', 'False')
+    assert track(fresh_module).get_report()['imports'] == {}
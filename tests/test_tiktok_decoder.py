@@ -0,0 +1,105 @@
+"""
+Кадри потоку TikTok: серії подарунків, кінець серії, перепідключення та некоректні кадри
+"""
+
+import time
+import json
+import socket
+import threading
+
+from src.tiktok_monitor import GiftFrameDecoder, TikTokMonitor, parse_frame
+
+
+def gift_frame(repeat_count, repeat_end=False, msg_id=None, group_id=None, unique_id='olena_k'):
+    gift = {'id': 5655, 'name': 'Rose', 'diamond_count': 1, 'repeat_count': repeat_count, 'repeat_end': repeat_end}
+    if group_id is not None:
+        gift['group_id'] = group_id
+    return {'type': 'gift', 'msg_id': msg_id or f"m{repeat_count}", 'gift': gift,
+            'user': {'unique_id': unique_id, 'nickname': 'Олена'}}
+
+
+def counts(decoder, frames):
+    events = [decoder.decode(frame, 'alpha') for frame in frames]
+    return [event.count if event else None for event in events]
+
+
+def test_streak_is_passed_as_increments():
+    decoder = GiftFrameDecoder()
+    assert counts(decoder, [gift_frame(1), gift_frame(3), gift_frame(5, repeat_end=True)]) == [1, 2, 2]
+
+
+def test_repeat_end_starts_new_streak():
+    decoder = GiftFrameDecoder()
+    assert counts(decoder, [gift_frame(2), gift_frame(2, repeat_end=True), gift_frame(1, msg_id='next')]) == [2, None, 1]
+
+
+def test_resent_streak_frame_gives_only_increment():
+    # Міст після розриву надсилає останній кадр серії ще раз, з новим msg_id
+    decoder = GiftFrameDecoder()
+    assert counts(decoder, [gift_frame(3), gift_frame(3, msg_id='resent'), gift_frame(4, msg_id='resent-4')]) == [3, None, 1]
+
+
+def test_group_id_gives_stable_event_id():
+    decoder = GiftFrameDecoder()
+    first = decoder.decode(gift_frame(2, msg_id='a', group_id=77), 'alpha')
+    assert first.event_id == 'alpha:olena_k:5655:77:2'
+    # Інша серія того ж подарунка від того ж відправника рахується окремо
+    assert decoder.decode(gift_frame(1, msg_id='b', group_id=78), 'alpha').count == 1
+
+
+def test_abandoned_streak_expires():
+    decoder = GiftFrameDecoder(streak_ttl=0.05)
+    assert counts(decoder, [gift_frame(5)]) == [5]
+    time.sleep(0.1)
+    assert counts(decoder, [gift_frame(1, msg_id='new')]) == [1]
+    assert decoder._streaks[('olena_k', 5655, '')][0] == 1
+
+
+def test_malformed_frames():
+    assert parse_frame(b'') is None
+    assert parse_frame(b'{"type": "gift"') is None
+    assert parse_frame(b'[1, 2]') is None
+    assert parse_frame(b'\xff\xfe') is None
+    decoder = GiftFrameDecoder()
+    assert decoder.decode({'type': 'gift', 'gift': 'Rose'}, 'alpha') is None
+    assert decoder.decode({'type': 'gift', 'gift': {'name': 'Rose', 'repeat_count': 'x'}}, 'alpha') is None
+    # Кадр без user та repeat_count - один подарунок від Unknown
+    event = decoder.decode({'type': 'gift', 'msg_id': '1', 'gift': {'name': 'Rose'}}, 'alpha')
+    assert (event.sender, event.count) == ('Unknown', 1)
+
+
+def test_reconnect_mid_streak_counts_only_increments():
+    """Потік обривається посеред серії; після перепідключення кадри серії надходять знову"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    connections = [
+        [gift_frame(1), gift_frame(3)],
+        [gift_frame(3, msg_id='again-3'), gift_frame(5, repeat_end=True, msg_id='again-5')],
+    ]
+
+    def serve():
+        for n, frames in enumerate(connections):
+            conn, _ = server.accept()
+            conn.recv(1024)
+            conn.sendall(b''.join(json.dumps(frame).encode('utf-8') + b'\n' for frame in frames))
+            # Перше з'єднання рветься одразу після кадрів, друге живе до кінця тесту
+            if n == len(connections) - 1:
+                time.sleep(1.0)
+            conn.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    received = []
+    monitor = TikTokMonitor(f"tcp://127.0.0.1:{server.getsockname()[1]}", timeout=5.0)
+    try:
+        monitor.start_monitoring('alpha', received.append)
+        deadline = time.monotonic() + 5.0
+        while sum(event.count for event in received) < 5 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert [event.count for event in received] == [1, 2, 2]
+        assert monitor.get_status()['alpha']['connects'] == 2
+    finally:
+        monitor.stop_monitoring()
+        thread.join(2.0)
+        server.close()
@@ -0,0 +1,171 @@
+"""
+UDP транспорт з імітацією ESP: підтвердження, повтори, втрата та пакування команд
+"""
+
+import time
+import socket
+import asyncio
+import threading
+
+import pytest
+
+from src.esp_simulator import EspSimulator
+from src.udp_transport import (HEADER, MAX_PACKET, UdpTransport, decode_params, encode_ack, encode_params,
+                               record_size)
+
+
+def wait_until(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def esp():
+    """Імітація ESP у фоновому потоці на вільному порту"""
+    simulator = EspSimulator('127.0.0.1', 0)
+    simulator.open()
+    simulator.sock.settimeout(0.05)
+    stopped = threading.Event()
+
+    def serve():
+        while not stopped.is_set():
+            try:
+                data, address = simulator.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            simulator.handle_packet(data, address)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield simulator
+    stopped.set()
+    thread.join(1.0)
+    simulator.sock.close()
+
+
+@pytest.fixture
+def transport():
+    transport = UdpTransport('127.0.0.1', 0, retry_interval=0.01, max_retries=3)
+    transport.start()
+    yield transport
+    transport.stop()
+
+
+def script_loss(simulator, losses):
+    """Втрата пакетів за сценарієм: по одному значенню на кожен вхідний пакет і ACK"""
+    losses = iter(losses)
+    simulator._lost = lambda: next(losses, False)
+
+
+def test_reliable_command_is_acked(esp, transport):
+    result = transport.send(('127.0.0.1', esp.port), 'gift_effect', {'gift': 'ROSE'})
+    assert result['success'] and result['retries'] == 0
+    # Імітація рахує ACK після sendto, тож транспорт може отримати його раніше
+    assert wait_until(lambda: esp.stats['acks'] == 1)
+    assert esp.stats['commands'] == 1
+    assert transport.get_status()['in_flight'] == 0
+
+
+def test_state_action_is_sent_once_without_ack(esp, transport):
+    result = transport.send(('127.0.0.1', esp.port), 'set_color', {'color': '#ff0000'})
+    assert result == {'success': True, 'seq': result['seq'], 'reliable': False}
+    assert wait_until(lambda: esp.stats['commands'] == 1)
+    assert esp.stats['acks'] == 0
+
+
+def test_retransmits_until_acked(esp, transport):
+    # Перший пакет губиться, другий доходить, але губиться його ACK; третій - дублікат з ACK
+    script_loss(esp, [True, False, True])
+    result = transport.send(('127.0.0.1', esp.port), 'gift_effect', {'gift': 'ROSE'})
+    assert result['success'] and result['retries'] == 2
+    assert esp.stats['commands'] == 1
+    assert esp.stats['duplicates'] == 1
+    assert transport.get_status()['retransmits'] == 2
+
+
+def test_lost_after_max_retries(esp, transport):
+    esp.loss = 1.0
+    result = transport.send(('127.0.0.1', esp.port), 'gift_effect', {'gift': 'ROSE'})
+    assert not result['success'] and result['retries'] == 3
+    status = transport.get_status()
+    assert (status['lost'], status['in_flight']) == (1, 0)
+
+
+def test_commands_are_batched_up_to_max_packet(esp, transport):
+    address = ('127.0.0.1', esp.port)
+    params = {'color': '#00ff00'}
+    count = 100
+    # Потік відправки чекає на той самий Condition: поки він утримується, команди лише накопичуються
+    with transport._cond:
+        for _ in range(count):
+            transport.send(address, 'set_color', params)
+    per_packet = (MAX_PACKET - HEADER.size) // record_size(encode_params('set_color', params)[1])
+    assert wait_until(lambda: esp.stats['commands'] == count)
+    assert esp.stats['packets'] == -(-count // per_packet)
+    assert transport.get_status()['max_batch'] == per_packet
+
+
+def test_send_async_does_not_park_threads(esp, transport):
+    address = ('127.0.0.1', esp.port)
+
+    async def burst():
+        threads = threading.active_count()
+        sends = [transport.send_async(address, 'gift_effect', {'gift': 'ROSE', 'n': i}) for i in range(50)]
+        results = await asyncio.gather(*sends)
+        return results, threading.active_count() - threads
+
+    results, extra_threads = asyncio.run(burst())
+    assert all(result['success'] for result in results)
+    assert extra_threads == 0
+    assert esp.stats['commands'] == 50
+
+
+def test_unknown_action_travels_in_params():
+    code, payload = encode_params('fireworks', {'duration': 3, 'reliable': True})
+    assert code == 0
+    assert decode_params(code, payload) == ('fireworks', {'duration': 3})
+
+
+def test_commands_after_restart_are_executed(esp):
+    # Той самий порт сервера: для прошивки це та сама адреса, що й до перезапуску
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    for _ in range(2):
+        transport = UdpTransport('127.0.0.1', port, retry_interval=0.01, max_retries=3)
+        transport.start()
+        try:
+            assert transport.send(('127.0.0.1', esp.port), 'gift_effect', {'gift': 'ROSE'})['success']
+        finally:
+            transport.stop()
+    assert esp.stats['commands'] == 2
+    assert esp.stats['duplicates'] == 0
+
+
+def test_ack_from_other_address_is_ignored(esp):
+    esp.loss = 1.0
+    # Довші повтори: підроблений ACK має прийти, поки команда ще чекає підтвердження
+    transport = UdpTransport('127.0.0.1', 0, retry_interval=0.1, max_retries=2)
+    transport.start()
+    results = []
+    sender = threading.Thread(target=lambda: results.append(
+        transport.send(('127.0.0.1', esp.port), 'gift_effect', {'gift': 'ROSE'})))
+    sender.start()
+    assert wait_until(lambda: transport.get_status()['in_flight'] == 1)
+    seq = next(iter(transport._unacked))
+
+    forger = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        forger.sendto(encode_ack([seq]), ('127.0.0.1', transport.bind_port))
+        sender.join(5.0)
+    finally:
+        forger.close()
+        transport.stop()
+    assert not results[0]['success']
+    assert transport.get_status()['foreign_acks'] >= 1